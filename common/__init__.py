@@ -0,0 +1,5 @@
+"""Modules shared by the agents' servers and clients
+
+Each agent directory's entry points add the repository root to sys.path,
+then import from `common`.
+"""
@@ -0,0 +1,57 @@
+import hashlib
+
+from a2a.server.apps import A2AStarletteApplication
+from a2a.types import AgentCard
+from starlette.requests import Request
+from starlette.responses import Response
+
+
+class SerializedCard:
+    """An agent card serialized once, with a strong ETag"""
+    __slots__ = ('body', 'etag', 'cache_control')
+
+    def __init__(self, card: AgentCard, cache_control: str):
+        self.body = card.model_dump_json(exclude_none=True).encode()
+        self.etag = f'"{hashlib.sha256(self.body).hexdigest()[:32]}"'
+        self.cache_control = cache_control
+
+    def response(self, request: Request) -> Response:
+        headers = {'ETag': self.etag, 'Cache-Control': self.cache_control}
+        if self.etag in request.headers.get('if-none-match', ''):
+            return Response(status_code=304, headers=headers)
+        return Response(self.body, media_type='application/json', headers=headers)
+
+
+class CachedCardA2AApplication(A2AStarletteApplication):
+    """A2AStarletteApplication serving its cards as pre-serialized bytes
+
+    Cards are sent with an ETag and Cache-Control, so clients can keep them
+    for `card_max_age` seconds and then revalidate with If-None-Match,
+    which is answered with an empty 304.
+    """
+    def __init__(self, *args, card_max_age: int = 300, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._card = SerializedCard(
+            self.agent_card, f'public, max-age={card_max_age}'
+        )
+        self._extended_card = None
+        if self.extended_agent_card:
+            # Varies with the caller's credentials: no shared caches.
+            self._extended_card = SerializedCard(
+                self.extended_agent_card, f'private, max-age={card_max_age}'
+            )
+
+    async def _handle_get_agent_card(self, request: Request) -> Response:
+        return self._card.response(request)
+
+    async def _handle_get_authenticated_extended_agent_card(
+        self, request: Request
+    ) -> Response:
+        if (
+            self._extended_card is None
+            or not self.agent_card.supportsAuthenticatedExtendedCard
+        ):
+            return await super()._handle_get_authenticated_extended_agent_card(
+                request
+            )
+        return self._extended_card.response(request)
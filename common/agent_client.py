@@ -0,0 +1,194 @@
+import asyncio
+import importlib.util
+import logging
+import re
+import time
+
+import httpx
+from a2a.client import A2AClient
+from a2a.types import AgentCard
+
+logger = logging.getLogger(__name__)
+
+PUBLIC_AGENT_CARD_PATH = '/.well-known/agent.json'
+EXTENDED_AGENT_CARD_PATH = '/agent/authenticatedExtendedCard'
+MAX_AGE_PATTERN = re.compile(r'max-age=(\d+)')
+# HTTP/2 needs the optional h2 package, and a TLS endpoint to negotiate it.
+HTTP2_AVAILABLE = importlib.util.find_spec('h2') is not None
+
+
+class CachedCard:
+    __slots__ = ('card', 'etag', 'expires_at')
+
+    def __init__(self, card: AgentCard, etag: str | None, expires_at: float):
+        self.card = card
+        self.etag = etag
+        self.expires_at = expires_at
+
+
+class CardCache:
+    """Agent cards by URL and credentials, kept until they go stale
+
+    A card is fresh for the server's Cache-Control max-age, capped at
+    `ttl` seconds. A stale card is revalidated with If-None-Match,
+    so an unchanged card costs one empty 304 response. Concurrent lookups
+    of the same card share one request.
+    """
+    def __init__(self, ttl: float = 300.0):
+        self.ttl = ttl
+        self._entries: dict[tuple, CachedCard] = {}
+        self._inflight: dict[tuple, asyncio.Future] = {}
+        self.hits = 0
+        self.revalidated = 0
+        self.fetched = 0
+
+    async def get(
+        self,
+        http: httpx.AsyncClient,
+        url: str,
+        headers: dict | None = None
+    ) -> AgentCard:
+        key = (url, (headers or {}).get('Authorization'))
+        entry = self._entries.get(key)
+        if entry is not None and time.monotonic() < entry.expires_at:
+            self.hits += 1
+            return entry.card
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            return await asyncio.shield(inflight)
+        inflight = self._inflight[key] = asyncio.ensure_future(
+            self._fetch(http, key, url, headers, entry)
+        )
+        inflight.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(inflight)
+
+    async def _fetch(
+        self,
+        http: httpx.AsyncClient,
+        key: tuple,
+        url: str,
+        headers: dict | None,
+        entry: CachedCard | None
+    ) -> AgentCard:
+        headers = dict(headers or {})
+        if entry is not None and entry.etag:
+            headers['If-None-Match'] = entry.etag
+        response = await http.get(url, headers=headers)
+        expires_at = time.monotonic() + self._max_age(response)
+        if response.status_code == 304 and entry is not None:
+            self.revalidated += 1
+            entry.expires_at = expires_at
+            return entry.card
+        response.raise_for_status()
+        self.fetched += 1
+        card = AgentCard.model_validate_json(response.content)
+        self._entries[key] = CachedCard(card, response.headers.get('ETag'), expires_at)
+        return card
+
+    def _max_age(self, response: httpx.Response) -> float:
+        cache_control = response.headers.get('Cache-Control', '')
+        if 'no-cache' in cache_control or 'no-store' in cache_control:
+            return 0.0
+        match = MAX_AGE_PATTERN.search(cache_control)
+        return min(float(match.group(1)), self.ttl) if match else self.ttl
+
+    def invalidate(self, url: str) -> None:
+        for key in [key for key in self._entries if key[0] == url]:
+            del self._entries[key]
+
+    def stats(self) -> dict:
+        return {
+            'hits': self.hits,
+            'revalidated': self.revalidated,
+            'fetched': self.fetched,
+            'size': len(self._entries),
+        }
+
+
+class AgentConnections:
+    """Shared client side of A2A calls to many agents
+
+    Keeps one pooled `httpx.AsyncClient` per agent base URL, using HTTP/2
+    where available, and one `CardCache` for all of them. Meant to live as
+    long as the calling process; `prewarm` resolves cards and opens
+    connections ahead of the first request.
+    """
+    def __init__(
+        self,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 30.0,
+        connect_timeout: float = 3.0,
+        read_timeout: float = 60.0,
+        http2: bool = HTTP2_AVAILABLE,
+        card_ttl: float = 300.0
+    ):
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry
+        )
+        self.timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        self.http2 = http2 and HTTP2_AVAILABLE
+        self.cards = CardCache(card_ttl)
+        self._clients: dict[str, httpx.AsyncClient] = {}
+
+    def http(self, base_url: str) -> httpx.AsyncClient:
+        base_url = base_url.rstrip('/')
+        client = self._clients.get(base_url)
+        if client is None:
+            client = self._clients[base_url] = httpx.AsyncClient(
+                base_url=base_url,
+                limits=self.limits,
+                timeout=self.timeout,
+                http2=self.http2
+            )
+        return client
+
+    async def card(
+        self,
+        base_url: str,
+        extended: bool = False,
+        headers: dict | None = None
+    ) -> AgentCard:
+        """The agent's public card, or its extended card when `extended`
+        and the agent supports one"""
+        http = self.http(base_url)
+        url = f'{base_url.rstrip("/")}{PUBLIC_AGENT_CARD_PATH}'
+        card = await self.cards.get(http, url)
+        if extended and card.supportsAuthenticatedExtendedCard:
+            url = f'{base_url.rstrip("/")}{EXTENDED_AGENT_CARD_PATH}'
+            card = await self.cards.get(http, url, headers)
+        return card
+
+    async def client(
+        self,
+        base_url: str,
+        extended: bool = False,
+        headers: dict | None = None
+    ) -> A2AClient:
+        card = await self.card(base_url, extended, headers)
+        return A2AClient(httpx_client=self.http(base_url), agent_card=card)
+
+    async def prewarm(self, base_urls: list[str], connections: int = 1) -> None:
+        """Resolves each agent's card and opens `connections` keep-alive
+        connections to it. Unreachable agents are logged, not raised."""
+        async def warm(base_url: str) -> None:
+            try:
+                await self.card(base_url)
+                if connections > 1:
+                    # Concurrent requests each hold their own connection,
+                    # which then stays in the pool.
+                    url = f'{base_url.rstrip("/")}{PUBLIC_AGENT_CARD_PATH}'
+                    http = self.http(base_url)
+                    await asyncio.gather(*(
+                        http.head(url) for _ in range(connections)
+                    ))
+            except httpx.HTTPError as e:
+                logger.warning(f'Could not prewarm {base_url}: {e}')
+
+        await asyncio.gather(*(warm(base_url) for base_url in base_urls))
+
+    async def aclose(self) -> None:
+        clients, self._clients = self._clients, {}
+        await asyncio.gather(*(client.aclose() for client in clients.values()))
@@ -0,0 +1,249 @@
+import asyncio
+import collections
+import contextvars
+import logging
+import os
+import random
+import signal
+import sys
+import time
+import uuid
+from types import CodeType
+
+from starlette.requests import Request
+from starlette.responses import JSONResponse, PlainTextResponse, Response
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = 'x-profile'
+PROFILE_ID_HEADER = b'x-profile-id'
+# Distinct stacks kept in the aggregate; later ones are counted as OTHER.
+MAX_STACKS = 20_000
+OTHER = ('[other stacks]',)
+
+# The profile of the request the running code belongs to. Tasks the
+# request starts (the agent executor, say) inherit it.
+CURRENT_PROFILE: contextvars.ContextVar['RequestProfile | None'] = contextvars.ContextVar(
+    'current_profile', default=None
+)
+
+
+class RequestProfile:
+    """Stack samples taken while one request's code was running"""
+    __slots__ = ('id', 'path', 'started', 'samples', 'open')
+
+    def __init__(self, path: str):
+        self.id = uuid.uuid4().hex
+        self.path = path
+        self.started = time.time()
+        # Innermost frame first
+        self.samples: list[tuple[CodeType, ...]] = []
+        self.open = True
+
+
+def frame_label(code: CodeType) -> str:
+    """module:function, with the module path relative to sys.path"""
+    path = code.co_filename
+    # Longest first: site-packages lies within the standard library's path.
+    for prefix in sorted(filter(None, sys.path), key=len, reverse=True):
+        if path.startswith(prefix + os.sep):
+            path = path[len(prefix) + 1:]
+            break
+    module = path.removesuffix('.py').replace(os.sep, '.')
+    return f'{module}:{code.co_name}'
+
+
+class RequestProfiler:
+    """Sampling CPU profiler for individual requests
+
+    Once the first request is profiled, SIGPROF fires every `interval`
+    seconds of process CPU time and the signal handler records the main
+    thread's stack, if the code running belongs to a profiled request.
+    The event loop runs in the main thread, so a request's samples cover
+    routing, JSON-RPC parsing, pydantic validation and dumping, the event
+    queue and the agent, and nothing of the requests running beside it.
+
+    Requests are profiled when they carry `X-Profile: 1` (if `header` is
+    set) and otherwise with probability `rate`. Each profile is added to
+    an aggregate served as a top-N report or as collapsed stacks, and with
+    a `directory`, written there as one collapsed stack file per request,
+    ready for flamegraph.pl or speedscope.
+    """
+    def __init__(
+        self,
+        rate: float = 0.0,
+        header: bool = True,
+        directory: str | None = None,
+        interval: float = 0.001
+    ):
+        self.rate = rate
+        self.header = header
+        self.directory = directory
+        self.interval = interval
+        self.requests = 0
+        self.samples = 0
+        self.stacks: collections.Counter[tuple[str, ...]] = collections.Counter()
+        self._labels: dict[CodeType, str] = {}
+        self._installed = False
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def wants(self, headers: dict[bytes, bytes]) -> bool:
+        if self.header and headers.get(PROFILE_HEADER.encode()) in (b'1', b'true'):
+            return True
+        return self.rate > 0 and random.random() < self.rate
+
+    def begin(self, path: str) -> RequestProfile | None:
+        """Starts sampling for a request; None if signals are unavailable"""
+        if not self._installed:
+            try:
+                signal.signal(signal.SIGPROF, self._sample)
+            except (ValueError, AttributeError) as e:
+                # Not the main thread, or no SIGPROF on this platform.
+                logger.warning(f'Request profiling unavailable: {e}')
+                self.rate, self.header = 0.0, False
+                return None
+            # Left running: restarting it per request would reset its
+            # countdown, and requests shorter than `interval` would never
+            # be sampled. Between profiled requests a sample is one
+            # context variable lookup.
+            signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+            self._installed = True
+        return RequestProfile(path)
+
+    def end(self, profile: RequestProfile) -> collections.Counter[tuple[str, ...]]:
+        """Stops sampling for `profile`; returns its stacks, outermost
+        frame first, and adds them to the aggregate"""
+        profile.open = False
+        stacks = collections.Counter(
+            tuple(self._label(code) for code in reversed(sample))
+            for sample in profile.samples
+        )
+        self.requests += 1
+        self.samples += len(profile.samples)
+        for stack, count in stacks.items():
+            if stack in self.stacks or len(self.stacks) < MAX_STACKS:
+                self.stacks[stack] += count
+            else:
+                self.stacks[OTHER] += count
+        return stacks
+
+    def _sample(self, signum, frame) -> None:
+        profile = CURRENT_PROFILE.get()
+        if profile is None or not profile.open:
+            return
+        stack = []
+        while frame is not None:
+            stack.append(frame.f_code)
+            frame = frame.f_back
+        profile.samples.append(tuple(stack))
+
+    def _label(self, code: CodeType) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            label = self._labels[code] = frame_label(code)
+        return label
+
+    def write(self, profile: RequestProfile, stacks: collections.Counter) -> str:
+        started = time.strftime('%Y%m%dT%H%M%S', time.localtime(profile.started))
+        path = os.path.join(self.directory, f'{started}-{profile.id}.folded')
+        with open(path, 'w') as file:
+            file.write(collapsed(stacks))
+        return path
+
+    def top(self, count: int = 25) -> dict:
+        """The functions with the most samples, on the stack (total) and
+        running themselves (self)"""
+        own: collections.Counter[str] = collections.Counter()
+        total: collections.Counter[str] = collections.Counter()
+        for stack, samples in self.stacks.items():
+            own[stack[-1]] += samples
+            for label in set(stack):
+                total[label] += samples
+
+        def share(samples: int) -> float:
+            return round(100 * samples / self.samples, 2) if self.samples else 0.0
+
+        return {
+            'requests': self.requests,
+            'samples': self.samples,
+            'interval_ms': self.interval * 1000,
+            'cpu_ms_per_request': round(
+                self.samples * self.interval * 1000 / self.requests, 3
+            ) if self.requests else None,
+            'self': [
+                {'function': label, 'samples': samples, 'percent': share(samples)}
+                for label, samples in own.most_common(count)
+            ],
+            'total': [
+                {'function': label, 'samples': samples, 'percent': share(samples)}
+                for label, samples in total.most_common(count)
+            ],
+        }
+
+    def reset(self) -> None:
+        self.requests = 0
+        self.samples = 0
+        self.stacks.clear()
+
+    async def endpoint(self, request: Request) -> Response:
+        """GET: top-N report (?top=N), or the aggregate as collapsed stacks
+        (?format=collapsed). DELETE: clears the aggregate."""
+        if request.method == 'DELETE':
+            self.reset()
+            return Response(status_code=204)
+        if request.query_params.get('format') == 'collapsed':
+            return PlainTextResponse(collapsed(self.stacks))
+        try:
+            count = int(request.query_params.get('top', 25))
+        except ValueError:
+            return JSONResponse({'error': 'top must be an integer'}, status_code=400)
+        return JSONResponse(self.top(count))
+
+
+def collapsed(stacks: collections.Counter) -> str:
+    """One line per stack: frames outermost first, separated by ';',
+    then the sample count"""
+    return ''.join(f'{";".join(stack)} {count}\n' for stack, count in stacks.items())
+
+
+class ProfilingMiddleware:
+    """ASGI middleware profiling the requests `profiler` selects
+
+    A profiled response carries the profile's id in X-Profile-Id, which
+    is also the name of its file in the profiler's directory.
+    """
+    def __init__(self, app, profiler: RequestProfiler, exclude: tuple[str, ...] = ('/profile',)):
+        self.app = app
+        self.profiler = profiler
+        self.exclude = exclude
+
+    async def __call__(self, scope, receive, send) -> None:
+        if (
+            scope['type'] != 'http'
+            or scope['path'] in self.exclude
+            or not self.profiler.wants(dict(scope['headers']))
+        ):
+            await self.app(scope, receive, send)
+            return
+        profile = self.profiler.begin(scope['path'])
+        if profile is None:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_id(message) -> None:
+            if message['type'] == 'http.response.start':
+                message['headers'] = [
+                    *message.get('headers', []), (PROFILE_ID_HEADER, profile.id.encode())
+                ]
+            await send(message)
+
+        token = CURRENT_PROFILE.set(profile)
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            CURRENT_PROFILE.reset(token)
+            stacks = self.profiler.end(profile)
+            if self.profiler.directory:
+                # After the response was sent; off the event loop.
+                await asyncio.to_thread(self.profiler.write, profile, stacks)
@@ -1,6 +1,8 @@
 from a2a.server.agent_execution import AgentExecutor, RequestContext
 from a2a.server.events import EventQueue
+from a2a.types import TaskNotCancelableError
 from a2a.utils import new_agent_text_message
+from a2a.utils.errors import ServerError
 
 
 class HelloWorldAgent:
@@ -27,5 +29,7 @@ class HelloWorldAgentExecutor(AgentExecutor):
             context: RequestContext,
             event_queue: EventQueue
     ) -> None:
-        raise Exception("Cancel not supported")
+        # Replies are a single message sent as soon as the request arrives,
+        # so there is never a running task to cancel.
+        raise ServerError(error=TaskNotCancelableError())
 
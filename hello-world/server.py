@@ -1,6 +1,8 @@
+import click
 import uvicorn
+from starlette.middleware import Middleware
+from starlette.routing import Route
 
-from a2a.server.apps import A2AStarletteApplication
 from a2a.server.request_handlers import DefaultRequestHandler
 from a2a.server.tasks import InMemoryTaskStore
 from a2a.types import (
@@ -10,8 +12,36 @@ from a2a.types import (
 )
 
 from agent_executor import HelloWorldAgentExecutor
+from common.agent_card import CachedCardA2AApplication
+from common.profiling import ProfilingMiddleware, RequestProfiler
 
-if __name__ == "__main__":
+@click.command()
+@click.option('--host', 'host', default='0.0.0.0')
+@click.option('--port', 'port', default=9999)
+@click.option('--card-max-age', 'card_max_age', default=300,
+              help='Seconds clients may cache the agent card before revalidating')
+@click.option('--profile-rate', 'profile_rate', default=0.0,
+              help='Share of requests profiled, served on /profile')
+@click.option('--profile-header', 'profile_header', is_flag=True, default=False,
+              help='Profile requests sent with "X-Profile: 1"')
+@click.option('--profile-dir', 'profile_dir', default=None,
+              help='Directory for the collapsed stacks of each profiled request')
+@click.option('--profile-interval', 'profile_interval', default=0.001,
+              help='CPU seconds between stack samples of profiled requests')
+@click.option('--drain-timeout', 'drain_timeout', default=30.0,
+              help='Seconds in-flight requests get to finish on SIGTERM before '
+                   'they are cancelled')
+def main(
+    host,
+    port,
+    card_max_age,
+    profile_rate,
+    profile_header,
+    profile_dir,
+    profile_interval,
+    drain_timeout
+):
+    """Start the Hello World Agent server"""
     # Step 1: Agent Skills
     skill = AgentSkill(
         id='hello_world',
@@ -32,7 +62,7 @@ if __name__ == "__main__":
     public_agent_card = AgentCard(
         name='hello world agent',
         description='just a hello world agent',
-        url='http://localhost:9999/',
+        url=f'http://localhost:{port}/',
         version='1.0.0',
         defaultInputModes=['text'],
         defaultOutputModes=['text'],
@@ -59,10 +89,34 @@ if __name__ == "__main__":
     )
 
     # Step 4: Server
-    server = A2AStarletteApplication(
+    server = CachedCardA2AApplication(
         http_handler=request_handler,
         agent_card=public_agent_card,
-        extended_agent_card=extended_agent_card
+        extended_agent_card=extended_agent_card,
+        card_max_age=card_max_age
+    )
+
+    # Step 5: Profiling. With an agent that does nothing, the profiles
+    # show the framework's own cost per request.
+    routes = []
+    middleware = []
+    if profile_rate or profile_header:
+        profiler = RequestProfiler(
+            rate=profile_rate,
+            header=profile_header,
+            directory=profile_dir,
+            interval=profile_interval
+        )
+        routes.append(Route('/profile', profiler.endpoint, methods=['GET', 'DELETE']))
+        middleware.append(Middleware(ProfilingMiddleware, profiler=profiler))
+
+    uvicorn.run(
+        server.build(routes=routes, middleware=middleware),
+        host=host,
+        port=port,
+        timeout_graceful_shutdown=drain_timeout
     )
 
-    uvicorn.run(server.build(), host='0.0.0.0', port=9999)
\ No newline at end of file
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+import asyncio
+import collections
+import contextlib
+import time
+
+from a2a.types import JSONRPCError
+
+from metrics import METRICS, Metrics
+
+# JSON-RPC implementation-defined server error returned when a request is
+# not admitted (-32000 to -32099; A2A uses -32001 to -32007).
+SERVER_BUSY = -32029
+
+
+class Overloaded(Exception):
+    """Raised when a request cannot be admitted in time"""
+
+
+def busy_error(error: Overloaded) -> JSONRPCError:
+    return JSONRPCError(
+        code=SERVER_BUSY,
+        message='Server busy, retry later',
+        data={'reason': str(error)}
+    )
+
+
+class FifoGate:
+    """Lets at most `limit` holders in, strictly in arrival order"""
+    __slots__ = ('limit', 'holders', '_waiters')
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.holders = 0
+        self._waiters: collections.deque[asyncio.Future] = collections.deque()
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    def is_idle(self) -> bool:
+        return not self.holders and not self._waiters
+
+    async def acquire(self, timeout: float) -> None:
+        """Raises asyncio.TimeoutError if not let in within `timeout`"""
+        if self.holders < self.limit and not self._waiters:
+            self.holders += 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, max(timeout, 0))
+        except BaseException:
+            if waiter.done() and not waiter.cancelled():
+                # Handed a place just as we gave up: pass it on.
+                self.release()
+            else:
+                with contextlib.suppress(ValueError):
+                    self._waiters.remove(waiter)
+            raise
+
+    def release(self) -> None:
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                # The place moves to the waiter; `holders` is unchanged.
+                waiter.set_result(None)
+                return
+        self.holders -= 1
+
+
+class Admission:
+    """One admitted request; holds a model slot once `acquire_slot` returns"""
+    __slots__ = ('controller', 'deadline', 'holds_slot')
+
+    def __init__(self, controller: 'AdmissionController', deadline: float):
+        self.controller = controller
+        self.deadline = deadline
+        self.holds_slot = False
+
+    async def acquire_slot(self) -> None:
+        await self.controller._wait(
+            self.controller.slots, self.deadline, 'slot_wait'
+        )
+        self.holds_slot = True
+
+
+class AdmissionController:
+    """Bounds concurrent model work and orders messages per context
+
+    Messages of one context are admitted one at a time, in arrival order,
+    so turns never race on the same conversation checkpoint. Requests that
+    call the model also take one of `max_running` slots. At most
+    `max_queued` requests wait, across both stages, for no longer than
+    `timeout` seconds in total; beyond that they are rejected with
+    `Overloaded`.
+    """
+    def __init__(
+        self,
+        max_running: int = 32,
+        max_queued: int = 128,
+        timeout: float = 30.0,
+        metrics: Metrics = METRICS
+    ):
+        self.slots = FifoGate(max_running)
+        self.max_queued = max_queued
+        self.timeout = timeout
+        self.metrics = metrics
+        self.queued = 0
+        self.arrived = 0
+        self.rejected = 0
+        self._contexts: dict[str, FifoGate] = {}
+        metrics.gauge('admission_running', lambda: self.slots.holders,
+                      'Requests holding a model slot.')
+        metrics.gauge('admission_queued', lambda: self.queued,
+                      'Requests waiting to be admitted.')
+
+    @contextlib.asynccontextmanager
+    async def admit(self, context_id: str):
+        """Waits for the context's turn; raises Overloaded if rejected"""
+        admission = Admission(self, asyncio.get_running_loop().time() + self.timeout)
+        gate = self._contexts.get(context_id)
+        if gate is None:
+            gate = self._contexts[context_id] = FifoGate(1)
+        try:
+            await self._wait(gate, admission.deadline, 'context_wait')
+        except BaseException:
+            self._forget(context_id, gate)
+            raise
+        try:
+            yield admission
+        finally:
+            if admission.holds_slot:
+                self.slots.release()
+            gate.release()
+            self._forget(context_id, gate)
+
+    def arrive(self) -> None:
+        """Counts a request from the moment it reaches the server
+
+        Rejects it up front when more requests are in flight than can run
+        and wait. The request handler calls this before the executor starts,
+        since the SDK only notices a failed executor on its next 0.5s poll.
+        """
+        if self.arrived >= self.slots.limit + self.max_queued:
+            self._reject('queue full')
+        self.arrived += 1
+
+    def depart(self) -> None:
+        self.arrived -= 1
+
+    async def _wait(self, gate: FifoGate, deadline: float, stage: str) -> None:
+        if self.queued >= self.max_queued and (
+            gate.holders >= gate.limit or gate.waiting
+        ):
+            self._reject('queue full')
+        started = time.perf_counter()
+        self.queued += 1
+        try:
+            await gate.acquire(deadline - asyncio.get_running_loop().time())
+        except asyncio.TimeoutError:
+            self._reject('queue timeout')
+        finally:
+            self.queued -= 1
+            self.metrics.observe(stage, time.perf_counter() - started)
+
+    def _reject(self, reason: str):
+        self.rejected += 1
+        self.metrics.count_task('rejected')
+        raise Overloaded(reason)
+
+    def _forget(self, context_id: str, gate: FifoGate) -> None:
+        if gate.is_idle() and self._contexts.get(context_id) is gate:
+            del self._contexts[context_id]
+
+    def stats(self) -> dict:
+        return {
+            'running': self.slots.holders,
+            'queued': self.queued,
+            'rejected': self.rejected,
+            'contexts': len(self._contexts),
+        }
@@ -1,30 +1,60 @@
+import datetime
 import httpx
+import json
 from collections.abc import AsyncIterable
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError
 from typing import Literal
 
 from langchain_core.tools import tool
-from langchain_core.messages import HumanMessage, AIMessage, ToolMessage
+from langchain_core.messages import HumanMessage, AIMessage, AIMessageChunk, ToolMessage
 from langchain_google_genai import ChatGoogleGenerativeAI
 
 from langgraph.prebuilt import create_react_agent
-from langgraph.checkpoint.memory import MemorySaver
+
+from agent_spec import AGENT_MODES
+from checkpointer import BoundedCheckpointSaver
+from metrics import METRICS, ModelCallCounter, ModelTimer
+from rate_cache import RateCache, utc_today
+from rate_series import EPOCH, RateSeries, parse_date
+from rate_table import RateTable
+from rates_client import RatesClient
 
 API_ADDRESS = 'https://api.frankfurter.app/'
-SYSTEM_INSTRUCTIONS = (
+# What the agent does, in both modes
+BASE_INSTRUCTIONS = (
     "You are a specialised agent for currency conversion. "
     "Your sole purpose is to use the 'get_exchange_rate' tool to answer the questions. "
+    "When the user asks for several target currencies, amounts or dates at once, "
+    "use a single 'get_exchange_rates' call instead. "
+    "For how rates moved over a period (lowest, highest, average or change), "
+    "use a single 'get_rate_history' call. "
     "If the user asks anything that is not about currency conversion or exchange rate "
     "then, politely state that you can not help with the topic and can only assist in currency related queries. "
+)
+SYSTEM_INSTRUCTIONS = BASE_INSTRUCTIONS + (
     "Set the response status to input required if the user need to provide more information. "
     "Set the response status to error if there is an error while processing the request. "
     "Set the response status to complete if the request is complete."
 )
-MEMORY = MemorySaver()
-SUPPORTED_CONTENT_TYPES = ['text', 'text/plain']
+# Single-pass mode: the final answer is a `respond` tool call instead of a
+# separate structured-output model call after the ReAct loop.
+SINGLE_PASS_INSTRUCTIONS = BASE_INSTRUCTIONS + (
+    "Always reply to the user by calling the 'respond' tool, never with plain text. "
+    "Use status input_required if the user need to provide more information, "
+    "error if there is an error while processing the request "
+    "and complete if the request is complete."
+)
+MEMORY = BoundedCheckpointSaver()
+MODEL_TIMER = ModelTimer()
+RATE_CACHE = RateCache()
+RATES_CLIENT = RatesClient(API_ADDRESS)
+RATE_TABLE = RateTable(RATES_CLIENT, RATE_CACHE)
+RATE_SERIES = RateSeries(RATES_CLIENT)
+# Upper bound on amounts x targets x dates in one get_exchange_rates call
+MAX_CONVERSIONS = 500
 
 @tool
-def get_exchange_rate(
+async def get_exchange_rate(
     currency_from: str = 'USD',
     currency_to: str = 'EUR',
     currency_date: str = 'latest'
@@ -42,27 +72,133 @@ def get_exchange_rate(
         error message in case of an error.
     """
     try:
-        address = API_ADDRESS + f"{currency_date}"
-        params = {
-            "from": currency_from,
-            "to": currency_to
-        }
+        with METRICS.time('tool'):
+            return await RATE_TABLE.get_exchange_rate(
+                currency_from.upper(),
+                currency_to.upper(),
+                currency_date.strip()
+            )
+    except httpx.HTTPError as e:
+        return {'error': f'API request failed: {e}'}
+    except LookupError as e:
+        return {'error': str(e)}
+    except ValueError:
+        return {'error': 'Invalid JSON response from API'}
+
+
+@tool
+async def get_exchange_rates(
+    currency_from: str = 'USD',
+    currencies_to: list[str] | None = None,
+    amounts: list[float] | None = None,
+    currency_dates: list[str] | None = None
+):
+    """This tool converts amounts into several currencies, on several dates,
+    in one call
+
+    Args:
+        currency_from: The currency to convert from (e.g., USD)
+        currencies_to: The currencies to convert to (e.g., ["EUR", "GBP"])
+        amounts: The amounts to convert. Default is [1]
+        currency_dates: The dates on which the exchange is sought.
+                        Default is ["latest"]
+
+    Returns:
+        A dictionary with one entry per amount, currency and date in
+        "conversions", and the lookups that failed in "errors".
+    """
+    currencies_to = [code.upper() for code in currencies_to or ['EUR']]
+    amounts = amounts or [1.0]
+    currency_dates = [date.strip() for date in currency_dates or ['latest']]
+    if len(currencies_to) * len(amounts) * len(currency_dates) > MAX_CONVERSIONS:
+        return {'error': f'At most {MAX_CONVERSIONS} conversions per request'}
+    with METRICS.time('tool'):
+        return await RATE_TABLE.convert_many(
+            currency_from.upper(),
+            currencies_to,
+            amounts,
+            currency_dates
+        )
 
-        response = httpx.get(address, params=params)
-        response.raise_for_status()
 
-        data = response.json()
+@tool
+async def get_rate_history(
+    currency_from: str = 'USD',
+    currencies_to: list[str] | None = None,
+    start_date: str | None = None,
+    end_date: str | None = None,
+    days: int = 30
+):
+    """This tool summarises how exchange rates moved over a period
 
-        if 'rates' not in data:
-            return {'error': 'Invalid API response format'}
-        return data
+    Args:
+        currency_from: The currency to convert from (e.g., USD)
+        currencies_to: The currencies to convert to (e.g., ["EUR", "INR"])
+        start_date: First day, as YYYY-MM-DD. Default is `days` before
+                    the end date
+        end_date: Last day, as YYYY-MM-DD. Default is today
+        days: Length of the period when start_date is not given
 
+    Returns:
+        A dictionary with the lowest, highest, first and last rates and
+        their dates, the average rate and the percent change of each
+        currency in "series", and unsupported currencies in "errors".
+    """
+    currencies_to = [code.upper() for code in currencies_to or ['EUR']]
+    today = utc_today()
+    try:
+        end = min(
+            parse_date(end_date) if end_date and end_date != 'latest' else today,
+            today
+        )
+        start = parse_date(start_date) if start_date else end - datetime.timedelta(days=days)
+    except ValueError:
+        return {'error': 'Dates must be given as YYYY-MM-DD'}
+    if start > end:
+        return {'error': 'The start date must not be after the end date'}
+    if start < EPOCH:
+        return {'error': f'Rates are available from {EPOCH.isoformat()} on'}
+    try:
+        with METRICS.time('tool'):
+            await RATE_SERIES.ensure(start, end)
+            return RATE_SERIES.summarize(
+                currency_from.upper(), currencies_to, start, end
+            )
     except httpx.HTTPError as e:
         return {'error': f'API request failed: {e}'}
+    except LookupError as e:
+        return {'error': str(e)}
     except ValueError:
         return {'error': 'Invalid JSON response from API'}
 
 
+@tool(return_direct=True)
+def respond(
+    status: Literal['input_required', 'complete', 'error'],
+    message: str
+):
+    """Sends the final reply to the user and ends the turn
+
+    Args:
+        status: input_required, complete or error
+        message: The reply shown to the user
+    """
+    return message
+
+
+def load_model(name: str = 'gemini-2.0-flash'):
+    """Creates the chat model
+
+    "fake" selects the benchmark stub model, "fake:<seconds>" the stub model
+    with that much latency per call.
+    """
+    if name == 'fake' or name.startswith('fake:'):
+        from fake_model import FakeCurrencyModel
+        _, _, latency = name.partition(':')
+        return FakeCurrencyModel(latency=float(latency or 0))
+    return ChatGoogleGenerativeAI(model=name)
+
+
 class ResponseFormat(BaseModel):
     """Respond to the user in this format
     """
@@ -71,51 +207,196 @@ class ResponseFormat(BaseModel):
 
 class CurrencyAgent:
     """Its a specialised agent for currency conversion
+
+    In the default 'structured' mode the final answer is turned into a
+    ResponseFormat by an extra model call. In 'single-pass' mode the model
+    must answer through the `respond` tool, which ends the run, so the
+    answer is read from that call.
+
+    With a `compactor`, the thread's history is compacted before each model
+    call once it outgrows the compactor's budget.
     """
-    def __init__(self):
-        self.model = ChatGoogleGenerativeAI(model='gemini-2.0-flash')
-        self.tools = [get_exchange_rate]
-        self.graph = create_react_agent(
-            model=self.model,
-            tools=self.tools,
-            prompt=SYSTEM_INSTRUCTIONS,
-            checkpointer=MEMORY,
-            response_format=ResponseFormat
-        )
+    def __init__(self, checkpointer=None, model=None, mode='structured', compactor=None):
+        if mode not in AGENT_MODES:
+            raise ValueError(f'Unknown agent mode: {mode}')
+        self.model = model or load_model()
+        self.mode = mode
+        self.checkpointer = checkpointer or MEMORY
+        if mode == 'single-pass':
+            self.tools = [
+                get_exchange_rate, get_exchange_rates, get_rate_history, respond
+            ]
+            self.graph = create_react_agent(
+                # Every turn must call a tool, so it always ends in `respond`.
+                model=self.model.bind_tools(self.tools, tool_choice='any'),
+                tools=self.tools,
+                prompt=SINGLE_PASS_INSTRUCTIONS,
+                checkpointer=self.checkpointer,
+                pre_model_hook=compactor
+            )
+            # Node whose updates end a run, for writing turns into the thread
+            self.final_node = 'agent'
+        else:
+            self.tools = [get_exchange_rate, get_exchange_rates, get_rate_history]
+            self.graph = create_react_agent(
+                model=self.model,
+                tools=self.tools,
+                prompt=SYSTEM_INSTRUCTIONS,
+                checkpointer=self.checkpointer,
+                response_format=ResponseFormat,
+                pre_model_hook=compactor
+            )
+            self.final_node = 'generate_structured_response'
 
-    def invoke(self, query, context_id) -> str:
+    async def invoke(self, query, context_id) -> dict:
         inputs = {'messages': [HumanMessage(query)]}
-        config = {'configurable': {'thread_id': context_id}}
-        self.graph.invoke(inputs, config=config)
-        return self.get_agent_response(config)
+        counter = ModelCallCounter()
+        config = {
+            'configurable': {'thread_id': context_id},
+            'callbacks': [MODEL_TIMER, counter]
+        }
+        await self.graph.ainvoke(inputs, config=config)
+        return {
+            **await self.get_agent_response(config),
+            'model_calls': counter.calls,
+            'prompt_tokens': counter.prompt_tokens
+        }
+
+    async def stream(self, query, context_id, stream_tokens=False) -> AsyncIterable:
+        """Yields progress updates, then the final response
 
-    async def stream(self, query, context_id) -> AsyncIterable:
+        With `stream_tokens`, the text of the agent's replies is also
+        yielded as it is generated, in items marked `is_partial`.
+        """
         inputs = {'messages': [HumanMessage(query)]}
-        config = {'configurable': {'thread_id': context_id}}
-        for item in self.graph.stream(inputs, config=config, stream_mode='values'):
+        counter = ModelCallCounter()
+        config = {
+            'configurable': {'thread_id': context_id},
+            'callbacks': [MODEL_TIMER, counter]
+        }
+        stream_mode = ['values', 'messages'] if stream_tokens else ['values']
+        async for mode, item in self.graph.astream(inputs, config=config, stream_mode=stream_mode):
+            if mode == 'messages':
+                chunk, metadata = item
+                # Only the agent node: the structured response is sent
+                # whole once it is complete.
+                if (
+                    metadata.get('langgraph_node') == 'agent'
+                    and isinstance(chunk, AIMessageChunk)
+                    and chunk.text()
+                ):
+                    yield {
+                        'is_task_complete': False,
+                        'require_user_input': False,
+                        'is_partial': True,
+                        'content': chunk.text()
+                    }
+                continue
             message = item['messages'][-1]
             if (
                 isinstance(message, AIMessage)
                 and message.tool_calls
-                and len(message.tool_calls) > 0
+                and any(call['name'] != 'respond' for call in message.tool_calls)
             ):
                 yield {
                     'is_task_complete': False,
                     'require_user_input': False,
                     'content': 'Looking up the exchange rates...'
                 }
-            elif isinstance(message, ToolMessage):
+            elif isinstance(message, ToolMessage) and message.name != 'respond':
                 yield {
                     'is_task_complete': False,
                     'require_user_input': False,
                     'content': 'Processing the exchange rates...'
                 }
-        yield self.get_agent_response(config)
+        yield {
+            **await self.get_agent_response(config),
+            'model_calls': counter.calls,
+            'prompt_tokens': counter.prompt_tokens
+        }
+
+    async def warm_up(self) -> None:
+        """Runs the cold paths of a first request that do not call the
+        model: checkpoint reads, the tool and the rates API connection"""
+        await self.has_history('warm-up')
+        await get_exchange_rate.ainvoke(
+            {'currency_from': 'USD', 'currency_to': 'EUR'}
+        )
 
+    async def has_history(self, context_id) -> bool:
+        config = {'configurable': {'thread_id': context_id}}
+        current_state = await self.graph.aget_state(config)
+        return bool(current_state.values.get('messages'))
+
+    async def record_exchange(self, query, answer, context_id) -> None:
+        """Appends a turn answered outside the graph to the thread history"""
+        config = {'configurable': {'thread_id': context_id}}
+        await self.graph.aupdate_state(
+            config,
+            {'messages': [HumanMessage(query), AIMessage(answer)]},
+            as_node=self.final_node
+        )
 
-    def get_agent_response(self, config):
-        current_state = self.graph.get_state(config)
-        structured_response = current_state.values.get('structured_response')
+    async def close_pending_tool_calls(self, context_id) -> None:
+        """Answers tool calls left open by a cancelled run
+
+        Gemini rejects a history where a function call is not followed by
+        its response, so the next turn in this context would fail.
+        """
+        config = {'configurable': {'thread_id': context_id}}
+        current_state = await self.graph.aget_state(config)
+        messages = current_state.values.get('messages', [])
+        answered = {m.tool_call_id for m in messages if isinstance(m, ToolMessage)}
+        pending = [
+            ToolMessage(
+                content='Cancelled before the tool returned.',
+                name=call['name'],
+                tool_call_id=call['id']
+            )
+            for message in messages if isinstance(message, AIMessage)
+            for call in message.tool_calls if call['id'] not in answered
+        ]
+        if pending:
+            await self.graph.aupdate_state(
+                config,
+                {'messages': pending},
+                as_node=self.final_node
+            )
+
+    @staticmethod
+    def _responded(values) -> ResponseFormat | None:
+        """The `respond` call that ended the last run, if it did"""
+        for message in reversed(values.get('messages', [])):
+            if isinstance(message, AIMessage):
+                for call in message.tool_calls:
+                    if call['name'] == 'respond':
+                        try:
+                            return ResponseFormat(**call['args'])
+                        except ValidationError:
+                            return None
+                return None
+        return None
+
+    @staticmethod
+    def _batch_results(values) -> dict | None:
+        """Conversions made by get_exchange_rates in the last run"""
+        conversions = []
+        for message in reversed(values.get('messages', [])):
+            if isinstance(message, HumanMessage):
+                break
+            if isinstance(message, ToolMessage) and message.name == 'get_exchange_rates':
+                try:
+                    conversions[:0] = json.loads(message.content)['conversions']
+                except (ValueError, KeyError, TypeError):
+                    continue
+        return {'conversions': conversions} if conversions else None
+
+    async def get_agent_response(self, config):
+        current_state = await self.graph.aget_state(config)
+        if self.mode == 'single-pass':
+            structured_response = self._responded(current_state.values)
+        else:
+            structured_response = current_state.values.get('structured_response')
         if (
             structured_response
             and isinstance(structured_response, ResponseFormat)
@@ -130,11 +411,16 @@ class CurrencyAgent:
                     'content': structured_response.message
                 }
             if structured_response.status == 'complete':
-                return {
+                response = {
                     'is_task_complete': True,
                     'require_user_input': False,
                     'content': structured_response.message
                 }
+                data = self._batch_results(current_state.values)
+                if data:
+                    # Sent as a DataPart next to the text answer.
+                    response['data'] = data
+                return response
         return {
             'is_task_complete': False,
             'require_user_input': True,
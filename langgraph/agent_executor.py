@@ -1,11 +1,21 @@
+import asyncio
+import math
+import time
+import uuid
+from collections.abc import AsyncIterable
+
 from a2a.server.agent_execution import AgentExecutor, RequestContext
 from a2a.server.events import EventQueue
 from a2a.server.tasks import TaskUpdater
 from a2a.types import (
     InvalidParamsError,
     InternalError,
-    UnsupportedOperationError, 
+    Artifact,
+    DataPart,
+    Message,
     Task,
+    TaskArtifactUpdateEvent,
+    TaskNotCancelableError,
     TaskState,
     Part,
     TextPart,
@@ -17,14 +27,96 @@ from a2a.utils import (
 )
 from a2a.utils.errors import ServerError
 
+from admission import AdmissionController, Overloaded, busy_error
 from agent import CurrencyAgent
+from fast_path import FastPath
+from metrics import METRICS
+from request_handler import STREAMING_KEY
+
+class WorkingUpdates:
+    """Working status updates of one task, at most one per `interval`
+
+    An update that comes sooner is held and sent once the interval is
+    over, unless a newer update replaces it first or the task finishes.
+    """
+    def __init__(self, updater: TaskUpdater, interval: float):
+        self.updater = updater
+        self.interval = interval
+        self.coalesced = 0
+        self._sent_at = -math.inf
+        self._pending: Message | None = None
+        self._timer: asyncio.TimerHandle | None = None
+
+    def update(self, message: Message) -> None:
+        wait = self._sent_at + self.interval - time.monotonic()
+        if wait <= 0:
+            self._send(message)
+            return
+        if self._pending is not None:
+            self.coalesced += 1
+        self._pending = message
+        if self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(wait, self._flush)
+
+    def close(self) -> None:
+        """Drops the held update: the task's next state supersedes it"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._pending is not None:
+            self.coalesced += 1
+            self._pending = None
+
+    def _flush(self) -> None:
+        self._timer = None
+        message, self._pending = self._pending, None
+        if message is not None:
+            self._send(message)
+
+    def _send(self, message: Message) -> None:
+        self._sent_at = time.monotonic()
+        self.updater.update_status(TaskState.working, message)
 
 
 class CurrencyAgentExecutor(AgentExecutor):
     """Agent executor for Currency Agent"""
-    def __init__(self):
-        self.agent = CurrencyAgent()
+    def __init__(
+            self,
+            checkpointer=None,
+            model=None,
+            stream_tokens=False,
+            agent_mode='structured',
+            admission=None,
+            compactor=None,
+            response_cache=None,
+            working_interval=0.0,
+            send_progress=False
+    ):
+        self.agent = CurrencyAgent(checkpointer, model, agent_mode, compactor)
+        self.admission = admission or AdmissionController()
+        # Answers to first-turn questions; None disables caching.
+        self.response_cache = response_cache
+        # Forward answer tokens as artifact chunks as they are generated.
+        self.stream_tokens = stream_tokens
+        # Minimum seconds between working updates to streaming clients;
+        # updates in between are coalesced into the next one.
+        self.working_interval = working_interval
+        # Working updates for message/send too, which only adds them to
+        # the task's history.
+        self.send_progress = send_progress
+        self.updates_skipped = 0
+        self.updates_coalesced = 0
+        METRICS.gauge('working_updates_skipped', lambda: self.updates_skipped,
+                      'Working updates and answer chunks not sent to message/send clients.')
+        METRICS.gauge('working_updates_coalesced', lambda: self.updates_coalesced,
+                      'Working updates replaced by a newer state before being sent.')
+        self.fast_path = FastPath()
+        # asyncio tasks running `execute`, by A2A task id
+        self._running: dict[str, asyncio.Task] = {}
     
+    async def warm_up(self) -> None:
+        await self.agent.warm_up()
+
     async def execute(
             self,
             context: RequestContext,
@@ -34,46 +126,233 @@ class CurrencyAgentExecutor(AgentExecutor):
         if error:
             raise ServerError(error=InvalidParamsError())
         query = context.get_user_input()
+        try:
+            # One message per context at a time, in arrival order.
+            async with self.admission.admit(context.context_id) as admission:
+                first_turn = (
+                    not context.current_task
+                    and not await self.agent.has_history(context.context_id)
+                )
+                answer = await self._fast_answer(query, first_turn)
+                if answer is None:
+                    # Only turns that call the model take a slot.
+                    await admission.acquire_slot()
+                await self._run(context, event_queue, query, answer, first_turn)
+        except Overloaded as e:
+            raise ServerError(error=busy_error(e)) from e
+
+    async def _run(
+            self,
+            context: RequestContext,
+            event_queue: EventQueue,
+            query: str,
+            answer: dict | None,
+            first_turn: bool = False
+    ) -> None:
+        started = time.perf_counter()
         task = context.current_task
         if not task:
             task = new_task(context.message)
             event_queue.enqueue_event(task)
         updater = TaskUpdater(event_queue, task.id, task.contextId)
+        # message/send clients get only the final task: no progress
+        # messages or answer chunks, which would only grow its history.
+        streaming = self._streaming(context)
+        progress = streaming or self.send_progress
+        working = WorkingUpdates(updater, self.working_interval if streaming else 0.0)
+        self._running[task.id] = asyncio.current_task()
+        # Set once answer tokens have been streamed into an artifact.
+        artifact_id = None
+        # Intent and rates expiry of a first-turn question the model answers
+        window = None
         try:
-            async for item in self.agent.stream(query, task.contextId):
+            if answer:
+                await self.agent.record_exchange(query, answer['content'], task.contextId)
+                if answer.get('cached'):
+                    stream = self._replay(answer)
+                else:
+                    stream = self.fast_path.stream(answer['content'])
+            else:
+                if first_turn and self.response_cache is not None:
+                    window = self.response_cache.window(query)
+                stream = self.agent.stream(
+                    query, task.contextId, self.stream_tokens and streaming
+                )
+            async for item in stream:
+                if item.get('is_partial'):
+                    if not streaming:
+                        self.updates_skipped += 1
+                        continue
+                    append = artifact_id is not None
+                    artifact_id = artifact_id or str(uuid.uuid4())
+                    event_queue.enqueue_event(self._artifact_chunk(
+                        task, artifact_id, self._answer_parts(item), append=append
+                    ))
+                    continue
                 is_task_complete = item['is_task_complete']
                 require_user_input = item['require_user_input']
 
                 if not is_task_complete and not require_user_input:
-                    updater.update_status(
-                        TaskState.working,
-                        new_agent_text_message(
-                            item['content'],
-                            task.contextId,
-                            task.id
-                        )
+                    if not progress:
+                        self.updates_skipped += 1
+                        continue
+                    working.update(new_agent_text_message(
+                        item['content'],
+                        task.contextId,
+                        task.id
+                    ))
+                    continue
+                working.close()
+                if require_user_input:
+                    if artifact_id:
+                        # Close the streamed artifact with the question.
+                        event_queue.enqueue_event(self._artifact_chunk(
+                            task, artifact_id, self._answer_parts(item),
+                            last_chunk=True, metadata=self._usage(item)
+                        ))
+                    message = new_agent_text_message(
+                        item['content'],
+                        task.contextId,
+                        task.id
                     )
-                elif require_user_input:
+                    message.metadata = self._usage(item)
                     updater.update_status(
                         TaskState.input_required,
-                        new_agent_text_message(
-                            item['content'],
-                            task.contextId,
-                            task.id
-                        ),
+                        message,
                         final=True
                     )
+                    METRICS.count_task(TaskState.input_required.value)
                     break
                 else:
-                    updater.add_artifact(
-                        [Part(root=TextPart(text=item['content']))],
-                        name='conversion_result'
-                    )
+                    if artifact_id:
+                        # Replace the streamed text with the final answer.
+                        event_queue.enqueue_event(self._artifact_chunk(
+                            task, artifact_id, self._answer_parts(item),
+                            last_chunk=True, metadata=self._usage(item)
+                        ))
+                    else:
+                        updater.add_artifact(
+                            self._answer_parts(item),
+                            # The SDK's default id is fixed at import time.
+                            artifact_id=str(uuid.uuid4()),
+                            name='conversion_result',
+                            metadata=self._usage(item)
+                        )
                     updater.complete()
+                    if window is not None:
+                        self.response_cache.put(*window, {
+                            key: item[key] for key in (
+                                'is_task_complete', 'require_user_input',
+                                'content', 'data'
+                            ) if key in item
+                        })
+                    METRICS.count_task(TaskState.completed.value)
                     break
+        except asyncio.CancelledError:
+            # Cancelled by `cancel` (or the request handler) at an await
+            # point; model and rates requests were cancelled with us.
+            working.close()
+            updater.update_status(TaskState.canceled, final=True)
+            METRICS.count_task(TaskState.canceled.value)
+            # A second cancel (e.g. the client also disconnected) must not
+            # leave the conversation half repaired.
+            await asyncio.shield(
+                self.agent.close_pending_tool_calls(task.contextId)
+            )
+            # So `drain` and the SDK's producer task see it was cancelled.
+            raise
         except Exception as e:
+            METRICS.count_task(TaskState.failed.value)
             raise ServerError(error=InternalError()) from e
-        
+        finally:
+            working.close()
+            self.updates_coalesced += working.coalesced
+            self._running.pop(task.id, None)
+            METRICS.observe('execute', time.perf_counter() - started)
+
+    async def drain(self, timeout: float) -> int:
+        """Waits up to `timeout` seconds for running tasks, then cancels
+        the rest; returns how many were cancelled"""
+        deadline = time.monotonic() + timeout
+        while self._running and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        running = list(self._running.values())
+        for task in running:
+            task.cancel()
+        await asyncio.gather(*running, return_exceptions=True)
+        return len(running)
+
+    async def _fast_answer(self, query: str, first_turn: bool) -> dict | None:
+        """Answers first-turn questions without the graph, if it can:
+        from the response cache, or on the fast path for conversions"""
+        if first_turn and self.response_cache is not None:
+            cached = self.response_cache.get(query)
+            if cached is not None:
+                return {**cached, 'cached': True}
+        answer = await self.fast_path.answer(query, first_turn)
+        if answer is None:
+            return None
+        return {
+            'is_task_complete': True,
+            'require_user_input': False,
+            'content': answer
+        }
+
+    @staticmethod
+    def _streaming(context: RequestContext) -> bool:
+        """Whether the request came in over message/stream; assumed so
+        when the request handler did not say"""
+        call_context = context.call_context
+        if call_context is None:
+            return True
+        return call_context.state.get(STREAMING_KEY, True)
+
+    @staticmethod
+    async def _replay(item: dict) -> AsyncIterable[dict]:
+        yield item
+
+    def _artifact_chunk(
+            self,
+            task: Task,
+            artifact_id: str,
+            parts: list[Part],
+            append: bool = False,
+            last_chunk: bool = False,
+            metadata: dict | None = None
+    ) -> TaskArtifactUpdateEvent:
+        return TaskArtifactUpdateEvent(
+            taskId=task.id,
+            contextId=task.contextId,
+            artifact=Artifact(
+                artifactId=artifact_id,
+                name='conversion_result',
+                parts=parts,
+                metadata=metadata
+            ),
+            append=append,
+            lastChunk=last_chunk
+        )
+
+    @staticmethod
+    def _answer_parts(item: dict) -> list[Part]:
+        """The answer text, plus batch conversions as structured data"""
+        parts = [Part(root=TextPart(text=item['content']))]
+        if item.get('data'):
+            parts.append(Part(root=DataPart(data=item['data'])))
+        return parts
+
+    @staticmethod
+    def _usage(item: dict) -> dict:
+        """Metadata for the final answer: model calls the turn needed,
+        their approximate prompt tokens, and whether it came from the cache"""
+        usage = {
+            'model_calls': item.get('model_calls', 0),
+            'prompt_tokens': item.get('prompt_tokens', 0)
+        }
+        if item.get('cached'):
+            usage['cached'] = True
+        return usage
+
     def _validate_request(self, context: RequestContext) -> bool:
         return False
     
@@ -82,4 +361,19 @@ class CurrencyAgentExecutor(AgentExecutor):
             context: RequestContext, 
             event_queue: EventQueue
     ) -> Task | None:
-        raise ServerError(error=UnsupportedOperationError())
+        running = self._running.get(context.task_id)
+        if running is not None:
+            # `execute` emits the canceled status on the task's own queue.
+            # No awaits here: the handler cancels the same asyncio task
+            # right after this returns.
+            running.cancel()
+            return None
+        task = context.current_task
+        # Waiting for user input: nothing runs, so it is canceled here. Any
+        # other task is finished, or running on another worker, which would
+        # overwrite a canceled state when it completes.
+        if task is None or task.status.state != TaskState.input_required:
+            raise ServerError(error=TaskNotCancelableError())
+        updater = TaskUpdater(event_queue, task.id, task.contextId)
+        updater.update_status(TaskState.canceled, final=True)
+        return None
@@ -0,0 +1,4 @@
+# What the currency agent accepts, importable without loading the model
+# stack, so the server can describe the agent before the agent is built.
+AGENT_MODES = ('structured', 'single-pass')
+SUPPORTED_CONTENT_TYPES = ['text', 'text/plain']
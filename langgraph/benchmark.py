@@ -0,0 +1,1965 @@
+import asyncio
+import collections
+import datetime
+import json
+import math
+import multiprocessing
+import os
+import random
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+import click
+import httpx
+import uvicorn
+from rich import print
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+from a2a.client import A2ACardResolver, A2AClient
+from a2a.server.tasks import InMemoryTaskStore
+from a2a.types import (
+    JSONRPCErrorResponse,
+    Message,
+    MessageSendParams,
+    Part,
+    Role,
+    SendMessageRequest,
+    SendStreamingMessageRequest,
+    Task,
+    TaskArtifactUpdateEvent,
+    TaskState,
+    TaskStatus,
+    TaskStatusUpdateEvent,
+    TextPart,
+)
+
+from checkpointer import BoundedCheckpointSaver
+from metrics import Metrics, ModelTimer
+from task_store import SQLiteTaskStore
+
+
+def percentiles(samples: list[float]) -> dict:
+    """p50/p95/p99 of `samples` in milliseconds"""
+    if not samples:
+        return {'p50': None, 'p95': None, 'p99': None}
+    ordered = sorted(samples)
+    def pick(q):
+        return round(ordered[min(int(q * len(ordered)), len(ordered) - 1)] * 1000, 3)
+    return {'p50': pick(0.50), 'p95': pick(0.95), 'p99': pick(0.99)}
+
+
+def rss_mb() -> float:
+    with open('/proc/self/statm') as statm:
+        return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+
+
+def make_task(index: int) -> Task:
+    context_id = str(uuid.uuid4())
+    task_id = str(uuid.uuid4())
+    message = Message(
+        role=Role.user,
+        messageId=uuid.uuid4().hex,
+        contextId=context_id,
+        taskId=task_id,
+        parts=[Part(root=TextPart(text=f'How much is {index} USD in INR?'))]
+    )
+    return Task(
+        id=task_id,
+        contextId=context_id,
+        status=TaskStatus(state=TaskState.completed),
+        history=[message]
+    )
+
+
+def _task_store_run(kind: str, tasks: int, gets: int, queue) -> None:
+    async def run():
+        if kind == 'sqlite':
+            directory = tempfile.mkdtemp()
+            store = SQLiteTaskStore(os.path.join(directory, 'tasks.db'))
+        else:
+            store = InMemoryTaskStore()
+        rss_before = rss_mb()
+        ids = []
+        started = time.perf_counter()
+        for start in range(0, tasks, 1000):
+            batch = [make_task(i) for i in range(start, min(start + 1000, tasks))]
+            await asyncio.gather(*(store.save(task) for task in batch))
+            ids.extend(task.id for task in batch)
+        save_seconds = time.perf_counter() - started
+        latencies = []
+        for task_id in random.sample(ids, min(gets, len(ids))):
+            started = time.perf_counter()
+            await store.get(task_id)
+            latencies.append(time.perf_counter() - started)
+        queue.put({
+            'store': kind,
+            'tasks': tasks,
+            'saves_per_second': round(tasks / save_seconds),
+            'get_ms': percentiles(latencies),
+            'get_mean_ms': round(statistics.mean(latencies) * 1000, 4),
+            'rss_delta_mb': round(rss_mb() - rss_before, 1),
+        })
+    asyncio.run(run())
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+HELLO_WORLD = os.path.join(os.path.dirname(HERE), 'hello-world')
+# Deterministic EUR based rates served by the stub rates API.
+STUB_RATES = {
+    'AUD': 1.64, 'CAD': 1.47, 'CHF': 0.96, 'CNY': 7.83, 'GBP': 0.85,
+    'INR': 90.12, 'JPY': 168.45, 'SEK': 11.43, 'SGD': 1.46, 'USD': 1.08,
+    # Weak against EUR: its rates need significant digits, not decimals.
+    'IDR': 17650.0,
+}
+
+
+def rates_stub_app(latency: float = 0.0, calls: list | None = None) -> Starlette:
+    """Local stand-in for the frankfurter API, answering after `latency`
+    seconds. Requested paths are appended to `calls`, if given."""
+    async def rates(request: Request):
+        if calls is not None:
+            calls.append(request.url.path)
+        if latency:
+            await asyncio.sleep(latency)
+        base = request.query_params.get('from', 'EUR')
+        symbols = request.query_params.get('to')
+        table = {'EUR': 1.0, **STUB_RATES}
+        if base not in table:
+            return JSONResponse({'message': 'not found'}, status_code=404)
+        quoted = {
+            code: round(rate / table[base], 5)
+            for code, rate in table.items()
+            if code != base and (not symbols or code in symbols.split(','))
+        }
+        date = request.path_params['date']
+        if '..' in date:
+            # Range endpoint: weekdays only, drifting a little day by day.
+            start, end = (datetime.date.fromisoformat(day) for day in date.split('..'))
+            days = [
+                start + datetime.timedelta(days=offset)
+                for offset in range((end - start).days + 1)
+            ]
+            return JSONResponse({
+                'amount': 1.0,
+                'base': base,
+                'start_date': start.isoformat(),
+                'end_date': end.isoformat(),
+                'rates': {
+                    day.isoformat(): {
+                        code: round(rate * (1 + 0.02 * math.sin(day.toordinal() / 20)), 5)
+                        for code, rate in quoted.items()
+                    }
+                    for day in days if day.weekday() < 5
+                }
+            })
+        return JSONResponse({
+            'amount': 1.0,
+            'base': base,
+            'date': '2025-01-02' if date == 'latest' else date,
+            'rates': quoted
+        })
+    return Starlette(routes=[Route('/{date}', rates)])
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def serve_in_thread(app, port: int) -> uvicorn.Server:
+    server = uvicorn.Server(
+        uvicorn.Config(app, host='127.0.0.1', port=port, log_level='warning')
+    )
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return server
+
+
+def start_agent_server(
+    port: int,
+    *args: str,
+    directory: str = HERE
+) -> subprocess.Popen:
+    """Starts an agent's server.py and waits until it serves the agent card"""
+    process = subprocess.Popen(
+        [sys.executable, 'server.py', '--host', '127.0.0.1', '--port', str(port), *args],
+        cwd=directory,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(f'http://127.0.0.1:{port}/.well-known/agent.json').raise_for_status()
+            return process
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError('Agent server did not start')
+
+
+def send_message_body(text: str, method: str = 'message/send') -> dict:
+    return {
+        'jsonrpc': '2.0',
+        'id': str(uuid.uuid4()),
+        'method': method,
+        'params': {
+            'message': {
+                'role': 'user',
+                'parts': [{'kind': 'text', 'text': text}],
+                'messageId': uuid.uuid4().hex
+            }
+        }
+    }
+
+
+async def _drive_send(url: str, concurrency: int, duration: float) -> dict:
+    latencies = []
+    errors = 0
+    deadline = time.monotonic() + duration
+
+    async def worker(client: httpx.AsyncClient, index: int):
+        nonlocal errors
+        while time.monotonic() < deadline:
+            # Not matched by the fast path, so every request runs the graph.
+            body = send_message_body(f'Please convert {index + 1} USD to INR')
+            started = time.perf_counter()
+            try:
+                response = await client.post(url, json=body)
+                if 'error' in response.json():
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=30) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(client, i) for i in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'throughput': round(len(latencies) / elapsed, 1),
+        'latency_ms': percentiles(latencies),
+    }
+
+
+async def _drive_stream(url: str, requests: int) -> dict:
+    """Times message/stream events: first event, first artifact, final"""
+    first_event, first_artifact, total = [], [], []
+    async with httpx.AsyncClient(timeout=60) as client:
+        for index in range(requests):
+            body = send_message_body(
+                f'Please convert {index + 1} USD to INR', 'message/stream'
+            )
+            started = time.perf_counter()
+            seen_artifact = False
+            async with client.stream('POST', url, json=body) as response:
+                async for line in response.aiter_lines():
+                    if not line.startswith('data:'):
+                        continue
+                    elapsed = time.perf_counter() - started
+                    if len(first_event) <= index:
+                        first_event.append(elapsed)
+                    kind = json.loads(line[5:]).get('result', {}).get('kind')
+                    if kind == 'artifact-update' and not seen_artifact:
+                        seen_artifact = True
+                        first_artifact.append(elapsed)
+            total.append(time.perf_counter() - started)
+    return {
+        'first_event_ms': percentiles(first_event),
+        'first_answer_byte_ms': percentiles(first_artifact),
+        'total_ms': percentiles(total),
+    }
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'],
+            cwd=HERE, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class LoadRecorder:
+    """Latency samples and errors of one load run"""
+    def __init__(self):
+        self.turns: list[float] = []
+        self.first_events: list[float] = []
+        self.conversations: list[float] = []
+        # Model calls per turn, as reported in the final answer's metadata
+        self.model_calls: list[int] = []
+        self.errors: dict[str, int] = {}
+
+    def error(self, reason: str) -> None:
+        self.errors[reason] = self.errors.get(reason, 0) + 1
+
+    def report(self, elapsed: float) -> dict:
+        return {
+            'conversations': len(self.conversations),
+            'turns': len(self.turns),
+            'errors': sum(self.errors.values()),
+            'error_reasons': self.errors,
+            'turns_per_second': round(len(self.turns) / elapsed, 1),
+            'conversations_per_second': round(len(self.conversations) / elapsed, 1),
+            'latency_ms': percentiles(self.turns),
+            'first_event_ms': percentiles(self.first_events),
+            'conversation_ms': percentiles(self.conversations),
+            'model_calls_per_turn': (
+                round(statistics.mean(self.model_calls), 2)
+                if self.model_calls else None
+            ),
+        }
+
+
+def model_calls(event) -> int | None:
+    """Model calls reported by a final artifact or status message"""
+    if isinstance(event, TaskArtifactUpdateEvent):
+        sources = [event.artifact]
+    elif isinstance(event, Task):
+        sources = [*(event.artifacts or []), event.status.message]
+    elif isinstance(event, TaskStatusUpdateEvent):
+        sources = [event.status.message]
+    else:
+        return None
+    for source in sources:
+        if source is not None and source.metadata and 'model_calls' in source.metadata:
+            return source.metadata['model_calls']
+    return None
+
+
+def user_message(text: str, context_id=None, task_id=None) -> MessageSendParams:
+    return MessageSendParams(message=Message(
+        role=Role.user,
+        parts=[Part(root=TextPart(text=text))],
+        messageId=uuid.uuid4().hex,
+        contextId=context_id,
+        taskId=task_id
+    ))
+
+
+async def _turn(
+    client: A2AClient,
+    method: str,
+    params: MessageSendParams,
+    recorder: LoadRecorder
+) -> Task | Message | None:
+    """Sends one message and returns the final Task or Message"""
+    started = time.perf_counter()
+    result = None
+    calls = None
+    try:
+        if method == 'send':
+            response = await client.send_message(
+                SendMessageRequest(id=str(uuid.uuid4()), params=params)
+            )
+            recorder.first_events.append(time.perf_counter() - started)
+            if isinstance(response.root, JSONRPCErrorResponse):
+                recorder.error(f'jsonrpc {response.root.error.code}')
+                return None
+            result = response.root.result
+            calls = model_calls(result)
+        else:
+            first = True
+            stream = client.send_message_streaming(
+                SendStreamingMessageRequest(id=str(uuid.uuid4()), params=params)
+            )
+            async for response in stream:
+                if first:
+                    recorder.first_events.append(time.perf_counter() - started)
+                    first = False
+                if isinstance(response.root, JSONRPCErrorResponse):
+                    recorder.error(f'jsonrpc {response.root.error.code}')
+                    return None
+                event = response.root.result
+                calls = model_calls(event) if calls is None else calls
+                if isinstance(event, (Task, Message)):
+                    result = event
+                elif isinstance(event, TaskStatusUpdateEvent):
+                    # Follow-up turns only send updates for the existing task.
+                    if result is None:
+                        result = Task(
+                            id=event.taskId,
+                            contextId=event.contextId,
+                            status=event.status
+                        )
+                    result.status = event.status
+    except Exception as e:
+        recorder.error(type(e).__name__)
+        return None
+    recorder.turns.append(time.perf_counter() - started)
+    if calls is not None:
+        recorder.model_calls.append(calls)
+    if result is None:
+        recorder.error('no result')
+    return result
+
+
+async def _conversation(
+    client: A2AClient,
+    method: str,
+    index: int,
+    multi_turn: bool,
+    recorder: LoadRecorder
+) -> None:
+    started = time.perf_counter()
+    if not multi_turn:
+        # Not matched by the fast path, so every request runs the graph.
+        result = await _turn(
+            client, method, user_message(f'Please convert {index + 1} USD to INR'),
+            recorder
+        )
+        if result is None:
+            return
+        if isinstance(result, Task) and result.status.state != TaskState.completed:
+            recorder.error(f'ended {result.status.state.value}')
+            return
+    else:
+        result = await _turn(
+            client, method, user_message(f'Please convert {index + 1} USD'), recorder
+        )
+        if result is None:
+            return
+        if not isinstance(result, Task) or result.status.state != TaskState.input_required:
+            recorder.error('no input-required turn')
+            return
+        result = await _turn(
+            client, method, user_message('INR', result.contextId, result.id), recorder
+        )
+        if result is None:
+            return
+        if result.status.state != TaskState.completed:
+            recorder.error(f'ended {result.status.state.value}')
+            return
+    recorder.conversations.append(time.perf_counter() - started)
+
+
+async def _drive_load(
+    url: str,
+    method: str,
+    conversations: int,
+    concurrency: int,
+    multi_turn_ratio: float
+) -> dict:
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=120) as httpx_client:
+        card = await A2ACardResolver(httpx_client, url).get_agent_card()
+        client = A2AClient(httpx_client, agent_card=card)
+        recorder = LoadRecorder()
+        semaphore = asyncio.Semaphore(concurrency)
+        # Every n-th conversation is multi-turn, so runs are reproducible.
+        every = round(1 / multi_turn_ratio) if multi_turn_ratio else 0
+
+        async def run(index: int):
+            async with semaphore:
+                multi_turn = bool(every) and index % every == 0
+                await _conversation(client, method, index, multi_turn, recorder)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(run(i) for i in range(conversations)))
+        return recorder.report(time.perf_counter() - started)
+
+
+async def _drive_hello_world(
+    url: str,
+    method: str,
+    conversations: int,
+    concurrency: int
+) -> dict:
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=120) as httpx_client:
+        card = await A2ACardResolver(httpx_client, url).get_agent_card()
+        client = A2AClient(httpx_client, agent_card=card)
+        recorder = LoadRecorder()
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def run():
+            async with semaphore:
+                started = time.perf_counter()
+                result = await _turn(client, method, user_message('hi'), recorder)
+                if isinstance(result, Message):
+                    recorder.conversations.append(time.perf_counter() - started)
+                elif result is not None:
+                    recorder.error('no message')
+
+        started = time.perf_counter()
+        await asyncio.gather(*(run() for _ in range(conversations)))
+        return recorder.report(time.perf_counter() - started)
+
+
+@click.group()
+def cli():
+    """Benchmarks for the Currency Agent"""
+
+
+@cli.command('task-store')
+@click.option('--tasks', 'tasks', default=1_000_000)
+@click.option('--gets', 'gets', default=10_000)
+@click.option('--output', 'output', default=None, help='Write results as JSON')
+def task_store(tasks, gets, output):
+    """Compare tasks/get latency and memory of the task stores"""
+    results = []
+    for kind in ('memory', 'sqlite'):
+        # Each store runs in a fresh process so RSS is not shared.
+        queue = multiprocessing.Queue()
+        process = multiprocessing.Process(
+            target=_task_store_run, args=(kind, tasks, gets, queue)
+        )
+        process.start()
+        results.append(queue.get())
+        process.join()
+    print(results)
+    if output:
+        with open(output, 'w') as f:
+            json.dump({'benchmark': 'task-store', 'results': results}, f, indent=2)
+
+
+def conversation_checkpoint(index: int) -> dict:
+    """A checkpoint holding one answered conversion question"""
+    from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+    from langgraph.checkpoint.base import empty_checkpoint
+
+    call_id = uuid.uuid4().hex
+    checkpoint = empty_checkpoint()
+    checkpoint['channel_values'] = {'messages': [
+        HumanMessage(f'How much is {index} USD in INR?'),
+        AIMessage('', tool_calls=[{
+            'name': 'get_exchange_rate',
+            'args': {'currency_from': 'USD', 'currency_to': 'INR'},
+            'id': call_id
+        }]),
+        ToolMessage(
+            json.dumps({'amount': 1.0, 'base': 'USD', 'rates': {'INR': 83.44}}),
+            tool_call_id=call_id
+        ),
+        AIMessage(f'{index} USD is {index * 83.44:.2f} INR.'),
+    ]}
+    return checkpoint
+
+
+async def _drive_checkpoints(
+    saver: BoundedCheckpointSaver,
+    contexts: int,
+    concurrency: int,
+    resume_ratio: float
+) -> dict:
+    lag = []
+
+    async def ticker():
+        # How late a 1ms sleep wakes up: the longest the loop was blocked.
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(0.001)
+            lag.append(time.perf_counter() - started - 0.001)
+
+    async def turn(thread_id: str, index: int) -> None:
+        config = {'configurable': {'thread_id': thread_id, 'checkpoint_ns': ''}}
+        current = await saver.aget_tuple(config)
+        if current is not None:
+            config = current.config
+        config = await saver.aput(config, conversation_checkpoint(index), {}, {})
+        await saver.aput_writes(config, [('messages', 'done')], uuid.uuid4().hex)
+
+    ticking = asyncio.create_task(ticker())
+    resumed = []
+    started = time.perf_counter()
+    for start in range(0, contexts, concurrency):
+        batch = range(start, min(start + concurrency, contexts))
+        await asyncio.gather(*(turn(f'context-{i}', i) for i in batch))
+        # Follow-ups to older conversations, most of them evicted by now
+        for _ in range(int(len(batch) * resume_ratio)):
+            index = random.randrange(start + len(batch))
+            resume_started = time.perf_counter()
+            await turn(f'context-{index}', index)
+            resumed.append(time.perf_counter() - resume_started)
+    elapsed = time.perf_counter() - started
+    ticking.cancel()
+    return {
+        'turns_per_second': round((contexts + len(resumed)) / elapsed),
+        'resume_ms': percentiles(resumed),
+        'loop_lag_ms': percentiles(lag),
+        'max_loop_lag_ms': round(max(lag) * 1000, 3),
+    }
+
+
+@cli.command('checkpoints')
+@click.option('--contexts', 'contexts', default=100_000)
+@click.option('--concurrency', 'concurrency', default=100)
+@click.option('--max-threads', 'max_threads', default=10_000,
+              help='Conversations kept in memory')
+@click.option('--max-mb', 'max_mb', default=256)
+@click.option('--resume-ratio', 'resume_ratio', default=0.1,
+              help='Follow-up turns to earlier conversations per new one')
+@click.option('--output', 'output', default=None, help='Write results as JSON')
+def checkpoints(contexts, concurrency, max_threads, max_mb, resume_ratio, output):
+    """Soak test of the checkpointer: RSS and hot/cold tiers after
+    `--contexts` conversations, and how long the event loop was blocked"""
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, 'checkpoints.db')
+    rss_before = rss_mb()
+    saver = BoundedCheckpointSaver(
+        max_threads=max_threads, max_bytes=max_mb * 1024 * 1024, path=path
+    )
+    result = asyncio.run(_drive_checkpoints(saver, contexts, concurrency, resume_ratio))
+    result = {
+        'contexts': contexts,
+        **result,
+        'rss_mb': round(rss_mb(), 1),
+        'rss_delta_mb': round(rss_mb() - rss_before, 1),
+        **saver.stats(),
+        'db_mb': round(os.path.getsize(path) / 2 ** 20, 1),
+    }
+    saver.close()
+    print(result)
+    if output:
+        with open(output, 'w') as f:
+            json.dump({'benchmark': 'checkpoints', 'results': [result]}, f, indent=2)
+
+
+@cli.command('throughput')
+@click.option('--workers', 'workers', default='1,2,4',
+              help='Comma separated worker counts to compare')
+@click.option('--concurrency', 'concurrency', default=16)
+@click.option('--duration', 'duration', default=10.0)
+@click.option('--output', 'output', default=None, help='Write results as JSON')
+def throughput(workers, concurrency, duration, output):
+    """message/send throughput of --workers 1..N with the stub model"""
+    rates_port = free_port()
+    serve_in_thread(rates_stub_app(), rates_port)
+    results = []
+    for count in [int(n) for n in workers.split(',')]:
+        directory = tempfile.mkdtemp()
+        port = free_port()
+        process = start_agent_server(
+            port,
+            '--model', 'fake',
+            '--rates-api', f'http://127.0.0.1:{rates_port}/',
+            '--workers', str(count),
+            '--task-store', 'sqlite',
+            '--task-store-db', os.path.join(directory, 'tasks.db'),
+            '--checkpoint-db', os.path.join(directory, 'checkpoints.db')
+        )
+        try:
+            result = asyncio.run(
+                _drive_send(f'http://127.0.0.1:{port}/', concurrency, duration)
+            )
+        finally:
+            process.terminate()
+            process.wait()
+        results.append({'workers': count, **result})
+        print(results[-1])
+    if output:
+        with open(output, 'w') as f:
+            json.dump({'benchmark': 'throughput', 'results': results}, f, indent=2)
+
+
+async def _drive_concurrency(url: str, calls: int) -> dict:
+    """Wall time of one message/send, then of `calls` sent at once"""
+    async with httpx.AsyncClient(timeout=60) as client:
+        async def send(index: int) -> None:
+            # Distinct amounts: neither the fast path nor the response
+            # cache answers them, so every call runs the graph.
+            body = send_message_body(f'Please convert {index} USD to INR')
+            response = (await client.post(url, json=body)).json()
+            if response.get('result', {}).get('status', {}).get('state') != 'completed':
+                raise click.ClickException(f'Unexpected response: {response}')
+
+        # Warm up: loads the rates and opens the connection.
+        await send(1)
+        started = time.perf_counter()
+        await send(2)
+        single = time.perf_counter() - started
+        started = time.perf_counter()
+        await asyncio.gather(*(send(index) for index in range(3, calls + 3)))
+        concurrent = time.perf_counter() - started
+    return {
+        'calls': calls,
+        'single_ms': round(single * 1000, 1),
+        'concurrent_ms': round(concurrent * 1000, 1),
+        'ratio': round(concurrent / single, 2),
+    }
+
+
+@cli.command('concurrency')
+@click.option('--calls', 'calls', default=16,
+              help='message/send calls sent at once; at most --max-running')
+@click.option('--latency', 'latency', default=0.5,
+              help='Seconds the stub model takes per call')
+@click.option('--max-ratio', 'max_ratio', default=1.5,
+              help='Fail if the concurrent calls take longer than this many '
+                   'single calls')
+def concurrency(calls, latency, max_ratio):
+    """Checks that concurrent message/send calls to one worker overlap
+
+    Model calls, rate lookups and checkpoints are awaited on the event
+    loop, so N calls should take about as long as one.
+    """
+    rates_port = free_port()
+    serve_in_thread(rates_stub_app(), rates_port)
+    port = free_port()
+    process = start_agent_server(
+        port,
+        '--model', f'fake:{latency}',
+        '--rates-api', f'http://127.0.0.1:{rates_port}/'
+    )
+    try:
+        result = asyncio.run(_drive_concurrency(f'http://127.0.0.1:{port}/', calls))
+    finally:
+        process.terminate()
+        process.wait()
+    print(result)
+    if result['ratio'] > max_ratio:
+        raise click.ClickException(
+            f'{calls} concurrent calls took {result["ratio"]}x a single call'
+        )
+
+
+@cli.command('ttft')
+@click.option('--requests', 'requests', default=20)
+@click.option('--latency', 'latency', default=1.0,
+              help='Seconds the stub model takes per call')
+@click.option('--output', 'output', default=None, help='Write results as JSON')
+def ttft(requests, latency, output):
+    """Time to the first answer byte over message/stream, with and without
+    --stream-tokens"""
+    rates_port = free_port()
+    serve_in_thread(rates_stub_app(), rates_port)
+    results = []
+    for stream_tokens in (False, True):
+        port = free_port()
+        args = [
+            '--model', f'fake:{latency}',
+            '--rates-api', f'http://127.0.0.1:{rates_port}/',
+        ]
+        if stream_tokens:
+            args.append('--stream-tokens')
+        process = start_agent_server(port, *args)
+        try:
+            result = asyncio.run(_drive_stream(f'http://127.0.0.1:{port}/', requests))
+        finally:
+            process.terminate()
+            process.wait()
+        results.append({'stream_tokens': stream_tokens, **result})
+        print(results[-1])
+    if output:
+        with open(output, 'w') as f:
+            json.dump({'benchmark': 'ttft', 'results': results}, f, indent=2)
+
+
+@cli.command('load')
+@click.option('--agent', 'agents', default='currency,hello-world',
+              help='Comma separated agents to drive: currency, hello-world')
+@click.option('--method', 'methods', default='send,stream',
+              help='Comma separated: send (message/send), stream (message/stream)')
+@click.option('--conversations', 'conversations', default=1000)
+@click.option('--concurrency', 'concurrency', default=100)
+@click.option('--multi-turn-ratio', 'multi_turn_ratio', default=0.5,
+              help='Share of currency conversations that go through '
+                   'input-required and a follow-up')
+@click.option('--latency', 'latency', default=0.1,
+              help='Seconds the stub model takes per call')
+@click.option('--agent-mode', 'agent_modes', default='structured',
+              help='Comma separated currency agent modes: structured, single-pass')
+@click.option('--output', 'output', default=None, help='Write results as JSON')
+def load(
+        agents,
+        methods,
+        conversations,
+        concurrency,
+        multi_turn_ratio,
+        latency,
+        agent_modes,
+        output
+):
+    """Concurrent conversations against the agents, with no network access
+
+    The currency agent runs with the stub model and a local stub of the
+    rates API. The hello world agent replies with a single message, so it
+    only has single-turn conversations.
+    """
+    rates_port = free_port()
+    serve_in_thread(rates_stub_app(), rates_port)
+    results = []
+    runs = [
+        (agent, mode)
+        for agent in agents.split(',')
+        for mode in (agent_modes.split(',') if agent == 'currency' else [None])
+    ]
+    for agent, mode in runs:
+        port = free_port()
+        if agent == 'currency':
+            process = start_agent_server(
+                port,
+                '--model', f'fake:{latency}',
+                '--agent-mode', mode,
+                '--rates-api', f'http://127.0.0.1:{rates_port}/'
+            )
+        elif agent == 'hello-world':
+            process = start_agent_server(port, directory=HELLO_WORLD)
+        else:
+            raise click.BadParameter(f'Unknown agent {agent}')
+        try:
+            for method in methods.split(','):
+                url = f'http://127.0.0.1:{port}'
+                if agent == 'currency':
+                    run = _drive_load(
+                        url, method, conversations, concurrency, multi_turn_ratio
+                    )
+                else:
+                    run = _drive_hello_world(url, method, conversations, concurrency)
+                results.append({
+                    'agent': agent,
+                    'agent_mode': mode,
+                    'method': method,
+                    **asyncio.run(run)
+                })
+                print(results[-1])
+        finally:
+            process.terminate()
+            process.wait()
+    if output:
+        with open(output, 'w') as f:
+            json.dump({
+                'benchmark': 'load',
+                'commit': git_commit(),
+                'config': {
+                    'conversations': conversations,
+                    'concurrency': concurrency,
+                    'multi_turn_ratio': multi_turn_ratio,
+                    'model_latency': latency,
+                },
+                'results': results
+            }, f, indent=2)
+
+
+async def _check_rates(calls: list, lookups: int) -> list[str]:
+    """Checks the rate table against the stub rates API; returns failures"""
+    from agent import RATE_CACHE, get_exchange_rate
+
+    failures = []
+    table = {'EUR': 1.0, **STUB_RATES}
+    pairs = [(a, b) for a in table for b in table if a != b]
+    for currency_date in ('latest', '2024-01-02'):
+        RATE_CACHE.clear()
+        calls.clear()
+        answers = await asyncio.gather(*(
+            get_exchange_rate.ainvoke({
+                'currency_from': a,
+                'currency_to': b,
+                'currency_date': currency_date
+            })
+            for a, b in random.choices(pairs, k=lookups)
+        ))
+        if len(calls) != 1:
+            failures.append(
+                f'{lookups} concurrent misses for {currency_date}: '
+                f'{len(calls)} upstream calls'
+            )
+        failures += [
+            f'{currency_date}: {answer["error"]}' for answer in answers if 'error' in answer
+        ]
+
+    for a, b in pairs:
+        answer = await get_exchange_rate.ainvoke({'currency_from': a, 'currency_to': b})
+        rate = answer['rates'][b]
+        expected = table[b] / table[a]
+        if abs(rate - expected) > expected * 1e-5:
+            failures.append(f'{a} -> {b}: {rate}, expected {expected:.6g}')
+
+    answer = await get_exchange_rate.ainvoke({'currency_from': 'USD', 'currency_to': 'XYZ'})
+    if answer != {'error': 'Unsupported currency: XYZ'}:
+        failures.append(f'USD -> XYZ: {answer}')
+    return failures
+
+
+@cli.command('rates')
+@click.option('--lookups', 'lookups', default=50,
+              help='Concurrent lookups of one date with nothing cached')
+@click.option('--rates-latency', 'rates_latency', default=0.05,
+              help='Seconds the stub rates API takes per request')
+def rates(lookups, rates_latency):
+    """Checks get_exchange_rate against the stub rates API
+
+    Concurrent misses for one date make a single upstream call, cross
+    rates match the stub's table to six significant digits, and an
+    unsupported currency is reported as an error dict.
+    """
+    from agent import RATES_CLIENT
+
+    calls = []
+    rates_port = free_port()
+    serve_in_thread(rates_stub_app(rates_latency, calls), rates_port)
+    RATES_CLIENT.configure(base_url=f'http://127.0.0.1:{rates_port}/')
+    failures = asyncio.run(_check_rates(calls, lookups))
+    for failure in failures:
+        print(failure)
+    if failures:
+        raise click.ClickException(f'{len(failures)} rate checks failed')
+    print('All rate checks passed')
+
+
+async def _drive_batch(
+    targets: int,
+    dates: int,
+    repeats: int,
+    latency: float
+) -> dict:
+    from langgraph.checkpoint.memory import InMemorySaver
+    from langgraph.prebuilt import create_react_agent
+
+    from agent import (
+        RATE_CACHE,
+        RATE_TABLE,
+        SYSTEM_INSTRUCTIONS,
+        CurrencyAgent,
+        ResponseFormat,
+        get_exchange_rate,
+        load_model,
+    )
+    from metrics import ModelCallCounter
+
+    codes = list(STUB_RATES)[1:targets + 1]
+    query = f'Please convert 100 USD to {", ".join(codes)}'
+    batch = CurrencyAgent(InMemorySaver(), load_model(f'fake:{latency}'))
+    # The agent as it was before get_exchange_rates: one pair per call.
+    sequential = create_react_agent(
+        model=batch.model,
+        tools=[get_exchange_rate],
+        prompt=SYSTEM_INSTRUCTIONS,
+        checkpointer=InMemorySaver(),
+        response_format=ResponseFormat
+    )
+    result = {'targets': len(codes)}
+    for name, graph in (('sequential', sequential), ('batch', batch.graph)):
+        samples = []
+        counter = ModelCallCounter()
+        for _ in range(repeats):
+            RATE_CACHE.clear()
+            started = time.perf_counter()
+            await graph.ainvoke(
+                {'messages': [('user', query)]},
+                config={
+                    'configurable': {'thread_id': uuid.uuid4().hex},
+                    'callbacks': [counter]
+                }
+            )
+            samples.append(time.perf_counter() - started)
+        result[name] = {
+            'latency_ms': round(statistics.median(samples) * 1000, 1),
+            'model_calls': counter.calls / repeats,
+        }
+
+    # Upstream lookups of a multi-date request: one after another, or
+    # fanned out by convert_many.
+    days = [f'2024-01-{day:02d}' for day in range(1, dates + 1)]
+    RATE_CACHE.clear()
+    started = time.perf_counter()
+    for day in days:
+        await RATE_TABLE.get_rates(day)
+    sequential_ms = (time.perf_counter() - started) * 1000
+    RATE_CACHE.clear()
+    started = time.perf_counter()
+    await RATE_TABLE.convert_many('USD', codes, [100.0], days)
+    result['dates'] = {
+        'dates': dates,
+        'sequential_ms': round(sequential_ms, 1),
+        'fan_out_ms': round((time.perf_counter() - started) * 1000, 1),
+    }
+    return result
+
+
+@cli.command('batch')
+@click.option('--targets', 'targets', default='1,2,4,8',
+              help='Comma separated numbers of target currencies')
+@click.option('--dates', 'dates', default=8,
+              help='Dates in the fan-out comparison')
+@click.option('--repeats', 'repeats', default=5)
+@click.option('--latency', 'latency', default=0.2,
+              help='Seconds the stub model takes per call')
+@click.option('--rates-latency', 'rates_latency', default=0.05,
+              help='Seconds the stub rates API takes per request')
+def batch(targets, dates, repeats, latency, rates_latency):
+    """Multi-target conversions with and without get_exchange_rates"""
+    from agent import RATES_CLIENT
+
+    rates_port = free_port()
+    serve_in_thread(rates_stub_app(rates_latency), rates_port)
+    RATES_CLIENT.configure(base_url=f'http://127.0.0.1:{rates_port}/')
+    for count in targets.split(','):
+        print(asyncio.run(_drive_batch(int(count), dates, repeats, latency)))
+
+
+async def _drive_history(
+    turns: int,
+    checkpoints: list[int],
+    max_tokens: int,
+    max_messages: int,
+    latency: float,
+    mode: str
+) -> dict:
+    from langgraph.checkpoint.memory import InMemorySaver
+
+    from agent import CurrencyAgent, load_model
+    from compaction import HistoryCompactor, prompt_tokens
+
+    codes = [code for code in STUB_RATES if code != 'USD']
+    # Alternating single and multi-target questions, so the history holds
+    # both get_exchange_rate and get_exchange_rates results.
+    queries = [
+        f'Convert {100 + turn} USD to {codes[turn % len(codes)]}'
+        if turn % 2 else
+        f'Convert {100 + turn} USD to {", ".join(codes[:8])}'
+        for turn in range(turns)
+    ]
+    model = load_model(f'fake:{latency}')
+    result = {'agent_mode': mode}
+    for name, compactor in (
+        ('full', None),
+        ('compacted', HistoryCompactor(max_tokens, max_messages)),
+    ):
+        agent = CurrencyAgent(InMemorySaver(), model, mode, compactor)
+        context_id = uuid.uuid4().hex
+        config = {'configurable': {'thread_id': context_id}}
+        rows = []
+        for turn, query in enumerate(queries, start=1):
+            started = time.perf_counter()
+            response = await agent.invoke(query, context_id)
+            elapsed = time.perf_counter() - started
+            if turn in checkpoints:
+                state = await agent.graph.aget_state(config)
+                rows.append({
+                    'turn': turn,
+                    'prompt_tokens': response['prompt_tokens'],
+                    'history_messages': len(state.values['messages']),
+                    'history_tokens': prompt_tokens(state.values['messages']),
+                    'overhead_ms': round(
+                        (elapsed - latency * response['model_calls']) * 1000, 1
+                    ),
+                    'complete': response['is_task_complete'],
+                })
+        result[name] = rows
+    for full, compacted in zip(result['full'], result['compacted']):
+        compacted['prompt_reduction'] = round(
+            1 - compacted['prompt_tokens'] / full['prompt_tokens'], 3
+        )
+    return result
+
+
+@cli.command('history')
+@click.option('--turns', 'turns', default=100)
+@click.option('--at', 'at', default='1,10,25,50,100',
+              help='Comma separated turns to report')
+@click.option('--max-tokens', 'max_tokens', default=4000,
+              help='History budget in approximate tokens for the compacted run')
+@click.option('--max-messages', 'max_messages', default=60,
+              help='History budget in messages for the compacted run')
+@click.option('--latency', 'latency', default=0.05,
+              help='Seconds the stub model takes per call')
+@click.option('--agent-mode', 'agent_modes', default='structured,single-pass',
+              help='Comma separated agent modes')
+@click.option('--output', 'output', default=None, help='Write results as JSON')
+def history(turns, at, max_tokens, max_messages, latency, agent_modes, output):
+    """Prompt size and turn latency of a long conversation, with and
+    without history compaction"""
+    from agent import RATES_CLIENT
+
+    rates_port = free_port()
+    serve_in_thread(rates_stub_app(), rates_port)
+    RATES_CLIENT.configure(base_url=f'http://127.0.0.1:{rates_port}/')
+    checkpoints = [int(turn) for turn in at.split(',')]
+    results = []
+    for mode in agent_modes.split(','):
+        result = asyncio.run(_drive_history(
+            turns, checkpoints, max_tokens, max_messages, latency, mode
+        ))
+        print(result)
+        results.append(result)
+    if output:
+        with open(output, 'w') as f:
+            json.dump({
+                'benchmark': 'history',
+                'commit': git_commit(),
+                'config': {
+                    'turns': turns,
+                    'max_tokens': max_tokens,
+                    'max_messages': max_messages,
+                    'model_latency': latency,
+                },
+                'results': results
+            }, f, indent=2)
+
+
+def webhook_stub_app(latency: float, status: int, received: list) -> Starlette:
+    """Push notification subscriber answering `status` after `latency`
+    seconds, recording (arrival time, task id, state) of every POST it
+    accepts"""
+    async def notify(request: Request):
+        task = await request.json()
+        await asyncio.sleep(latency)
+        if status < 400:
+            received.append((time.perf_counter(), task['id'], task['status']['state']))
+        return JSONResponse({}, status_code=status)
+    return Starlette(routes=[Route('/notify', notify, methods=['POST'])])
+
+
+async def _push_gauges(client: httpx.AsyncClient, url: str) -> dict:
+    metrics = (await client.get(f'{url}metrics')).text
+    return {
+        line.split()[0].removeprefix('currency_agent_'): float(line.split()[1])
+        for line in metrics.splitlines() if line.startswith('currency_agent_push_')
+    }
+
+
+async def _drive_push(url: str, webhook: str, streams: int, received: list) -> dict:
+    """Concurrent message/stream requests subscribed to `webhook`"""
+    durations, finished_at = [], {}
+
+    async def stream(client: httpx.AsyncClient, index: int):
+        body = send_message_body(
+            f'Please convert {index + 1} USD to INR', 'message/stream'
+        )
+        body['params']['configuration'] = {
+            'acceptedOutputModes': ['text'],
+            'pushNotificationConfig': {'url': webhook, 'token': 'benchmark'},
+        }
+        started = time.perf_counter()
+        task_id = None
+        async with client.stream('POST', url, json=body) as response:
+            async for line in response.aiter_lines():
+                if line.startswith('data:'):
+                    result = json.loads(line[5:]).get('result', {})
+                    task_id = task_id or result.get('taskId') or result.get('id')
+        finished_at[task_id] = time.perf_counter()
+        durations.append(finished_at[task_id] - started)
+
+    async with httpx.AsyncClient(timeout=120) as client:
+        await asyncio.gather(*(stream(client, index) for index in range(streams)))
+        # Inline delivery is over with the streams; queued delivery once
+        # nothing is pending, delivered or given up on.
+        gauges = await _push_gauges(client, url)
+        deadline = time.monotonic() + 60
+        while gauges.get('push_pending') and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+            gauges = await _push_gauges(client, url)
+    final_after = [
+        at - finished_at[task_id] for at, task_id, state in received
+        if state == 'completed' and task_id in finished_at
+    ]
+    return {
+        'stream_ms': percentiles(durations),
+        'notifications': len(received),
+        'final_delivered': f'{len(final_after)}/{streams}',
+        # Negative: delivered before the stream ended.
+        'final_after_stream_ms': percentiles(final_after),
+        **gauges,
+    }
+
+
+@cli.command('push')
+@click.option('--streams', 'streams', default=50)
+@click.option('--webhook-latency', 'webhook_latency', default=0.5,
+              help='Seconds the stub subscriber takes per notification')
+@click.option('--latency', 'latency', default=0.1,
+              help='Seconds the stub model takes per call')
+@click.option('--push-workers', 'push_workers', default='0,4',
+              help='Comma separated --push-workers settings; 0 is inline delivery')
+@click.option('--output', 'output', default=None, help='Write results as JSON')
+def push(streams, webhook_latency, latency, push_workers, output):
+    """Streamed requests with a slow, then a failing, webhook subscriber"""
+    rates_port = free_port()
+    serve_in_thread(rates_stub_app(), rates_port)
+    results = []
+    for subscriber, status in (('slow', 200), ('failing', 503)):
+        received = []
+        webhook_port = free_port()
+        webhook = serve_in_thread(
+            webhook_stub_app(webhook_latency, status, received), webhook_port
+        )
+        for workers in push_workers.split(','):
+            received.clear()
+            port = free_port()
+            process = start_agent_server(
+                port,
+                '--model', f'fake:{latency}',
+                '--rates-api', f'http://127.0.0.1:{rates_port}/',
+                '--push-workers', workers
+            )
+            try:
+                result = {
+                    'subscriber': subscriber,
+                    'push_workers': int(workers),
+                    **asyncio.run(_drive_push(
+                        f'http://127.0.0.1:{port}/',
+                        f'http://127.0.0.1:{webhook_port}/notify',
+                        streams,
+                        received
+                    ))
+                }
+                print(result)
+                results.append(result)
+            finally:
+                process.terminate()
+                process.wait()
+        webhook.should_exit = True
+    if output:
+        with open(output, 'w') as f:
+            json.dump({
+                'benchmark': 'push',
+                'commit': git_commit(),
+                'config': {
+                    'streams': streams,
+                    'webhook_latency': webhook_latency,
+                    'model_latency': latency,
+                },
+                'results': results
+            }, f, indent=2)
+
+
+def _check_series(series, start: datetime.date, end: datetime.date) -> list[str]:
+    """Checks weak-currency summaries against the stored rates; returns
+    failures"""
+    from rate_table import CURRENCY_INDEX
+
+    failures = []
+    summary = series.summarize('IDR', ['USD'], start, end)['series']['USD']
+    for name in ('min', 'max', 'first', 'last'):
+        point = summary[name]
+        row = series.values[series._row(datetime.date.fromisoformat(point['date']))]
+        expected = row[CURRENCY_INDEX['USD']] / row[CURRENCY_INDEX['IDR']]
+        if abs(point['rate'] - expected) > expected * 1e-5:
+            failures.append(f'IDR -> USD {name}: {point["rate"]}, expected {expected:.6g}')
+    return failures
+
+
+async def _drive_series(days: int, queries: int) -> dict:
+    from agent import RATE_CACHE, RATE_SERIES, RATE_TABLE, get_rate_history
+    from rate_cache import utc_today
+    from rate_series import EPOCH, RateSeries
+
+    end = utc_today() - datetime.timedelta(days=1)
+    start = end - datetime.timedelta(days=days - 1)
+    codes = [code for code in STUB_RATES if code != 'USD']
+    result = {'days': days}
+
+    # One lookup per date, as sequential get_exchange_rate calls would.
+    RATE_CACHE.clear()
+    started = time.perf_counter()
+    for offset in range(days):
+        await RATE_TABLE.get_rates((start + datetime.timedelta(days=offset)).isoformat())
+    result['per_date'] = {
+        'requests': days,
+        'fetch_ms': round((time.perf_counter() - started) * 1000, 1),
+    }
+
+    series = RateSeries(RATE_TABLE.client)
+    started = time.perf_counter()
+    await series.ensure(start, end)
+    result['range'] = {
+        'requests': series.fetches,
+        'fetch_ms': round((time.perf_counter() - started) * 1000, 1),
+    }
+    failures = _check_series(series, start, end)
+    if failures:
+        raise click.ClickException(f'Summaries lost precision: {failures}')
+
+    def timed(body) -> float:
+        samples = []
+        for _ in range(queries):
+            started = time.perf_counter()
+            body()
+            samples.append(time.perf_counter() - started)
+        return round(statistics.median(samples) * 1000, 3)
+
+    result['summary_ms'] = {
+        'one_pair': timed(lambda: series.summarize('USD', ['INR'], start, end)),
+        'all_currencies': timed(lambda: series.summarize('USD', codes, start, end)),
+    }
+    # The tool, first with an empty store, then from stored rates.
+    arguments = {
+        'currency_from': 'USD',
+        'currencies_to': codes,
+        'start_date': start.isoformat(),
+        'end_date': end.isoformat()
+    }
+    for run in ('tool_cold', 'tool_warm'):
+        fetches = RATE_SERIES.fetches
+        started = time.perf_counter()
+        await get_rate_history.ainvoke(arguments)
+        result[run] = {
+            'requests': RATE_SERIES.fetches - fetches,
+            'ms': round((time.perf_counter() - started) * 1000, 3),
+        }
+
+    # Every day since 1999 for 32 currencies, filled in directly.
+    full = RateSeries(RATE_TABLE.client)
+    synthetic = [f'X{index:02d}' for index in range(32)]
+    full._store({
+        (EPOCH + datetime.timedelta(days=offset)).isoformat(): {
+            code: 1.0 + index / 10 + 0.02 * math.sin(offset / 20)
+            for index, code in enumerate(synthetic)
+        }
+        for offset in range((end - EPOCH).days + 1)
+    })
+    year = end - datetime.timedelta(days=364)
+    result['full_store'] = {
+        'rows': full.values.shape[0],
+        'mb': round(full.nbytes / 2 ** 20, 2),
+        'year_all_currencies_ms': timed(
+            lambda: full.summarize('X00', synthetic, year, end)
+        ),
+        'all_years_all_currencies_ms': timed(
+            lambda: full.summarize('X00', synthetic, EPOCH, end)
+        ),
+    }
+    return result
+
+
+@cli.command('series')
+@click.option('--days', 'days', default=365)
+@click.option('--queries', 'queries', default=200,
+              help='Summaries timed per measurement')
+@click.option('--rates-latency', 'rates_latency', default=0.02,
+              help='Seconds the stub rates API takes per request')
+def series(days, queries, rates_latency):
+    """Rate history from the range endpoint and the array store"""
+    from agent import RATES_CLIENT
+
+    rates_port = free_port()
+    serve_in_thread(rates_stub_app(rates_latency), rates_port)
+    RATES_CLIENT.configure(base_url=f'http://127.0.0.1:{rates_port}/')
+    print(asyncio.run(_drive_series(days, queries)))
+
+
+# Phrasings of one conversion the fast path does not parse; the stub model
+# reads the ISO codes.
+PARAPHRASES = (
+    'Please convert {amount} USD to {code}',
+    'Could you tell me what {amount} USD is in {code}?',
+    '{amount} USD in {code} please',
+    'What is {amount} USD worth in {code}?',
+    'convert {amount} USD into {code} for me',
+)
+
+
+# Pairs of questions, and whether they must share a response cache entry
+INTENT_CHECKS = (
+    ('convert 10 USD to EUR', 'How much is 10 USD in EUR?', True),
+    ('convert 10 USD to EUR', '$10 in euros', True),
+    ('convert 10 USD to EUR', 'convert 10 EUR to USD', False),
+    # The amount is in EUR: not the same question, whichever way it is read
+    ('convert 10 USD to EUR', '10 EUR from USD', False),
+    ('convert 10 EUR to USD', '10 EUR from USD', False),
+    ('convert 10 USD to INR', 'convert 10 USD from EUR', False),
+    ('convert 10 INR to USD', 'How much is 10 INR in USD?', True),
+    ('convert 10 USD to INR', 'convert from USD to INR: 10', True),
+    # No currency follows the amount and none follows "from": never cached
+    ('Convert USD to INR 10', 'Convert USD to INR 10', False),
+    ('Convert USD to INR 10', 'USD to INR: 10', False),
+    ('Convert USD to INR 10', 'How much is 10 INR in USD?', False),
+    ('USD to INR: 10', 'How much is 10 INR in USD?', False),
+)
+
+
+def _check_intents() -> list[str]:
+    from response_cache import query_intent
+
+    # Uncacheable questions (None) share no entry, not even with themselves.
+    return [
+        f'{first!r} and {second!r}: {query_intent(first)} vs {query_intent(second)}'
+        for first, second, same in INTENT_CHECKS
+        if (
+            query_intent(first) is not None
+            and query_intent(first) == query_intent(second)
+        ) != same
+    ]
+
+
+async def _drive_response_cache(url: str, questions: int, intents: int) -> dict:
+    codes = [code for code in STUB_RATES if code != 'USD']
+    pool = [
+        phrasing.format(amount=10 * (index + 1), code=codes[index % len(codes)])
+        for index in range(intents) for phrasing in PARAPHRASES
+    ]
+    random.seed(7)
+    latencies = {'hit': [], 'miss': []}
+    async with httpx.AsyncClient(timeout=60) as client:
+        for _ in range(questions):
+            started = time.perf_counter()
+            response = (await client.post(
+                url, json=send_message_body(random.choice(pool))
+            )).json()
+            elapsed = time.perf_counter() - started
+            metadata = response['result']['artifacts'][0].get('metadata') or {}
+            latencies['hit' if metadata.get('cached') else 'miss'].append(elapsed)
+        metrics = (await client.get(f'{url}metrics')).text
+    gauges = {
+        line.split()[0].removeprefix('currency_agent_'): float(line.split()[1])
+        for line in metrics.splitlines()
+        if line.startswith('currency_agent_response_cache_')
+    }
+    samples = latencies['hit'] + latencies['miss']
+    return {
+        'questions': questions,
+        'hits': len(latencies['hit']),
+        'mean_ms': round(statistics.mean(samples) * 1000, 1),
+        'hit_ms': percentiles(latencies['hit']),
+        'miss_ms': percentiles(latencies['miss']),
+        **gauges,
+    }
+
+
+async def _drive_cache_expiry(url: str, rates_ttl: float) -> list[bool]:
+    """Whether the same question is answered from the cache: right after
+    it was first answered, and after the rates it quoted expired"""
+    cached = []
+    async with httpx.AsyncClient(timeout=60) as client:
+        for wait in (0, 0, rates_ttl + 0.5, 0):
+            await asyncio.sleep(wait)
+            response = (await client.post(
+                url, json=send_message_body('Please convert 25 USD to GBP')
+            )).json()
+            metadata = response['result']['artifacts'][0].get('metadata') or {}
+            cached.append(bool(metadata.get('cached')))
+    return cached
+
+
+@cli.command('response-cache')
+@click.option('--questions', 'questions', default=200)
+@click.option('--intents', 'intents', default=10,
+              help='Distinct conversions, each asked in several phrasings')
+@click.option('--latency', 'latency', default=0.2,
+              help='Seconds the stub model takes per call')
+@click.option('--rates-ttl', 'rates_ttl', default=5.0,
+              help='Seconds the latest rates stay fresh in the expiry check')
+def response_cache(questions, intents, latency, rates_ttl):
+    """Repeated first-turn questions with and without the response cache"""
+    failures = _check_intents()
+    if failures:
+        raise click.ClickException(f'Questions keyed wrongly: {failures}')
+    rates_port = free_port()
+    serve_in_thread(rates_stub_app(), rates_port)
+    for size in ('0', '4096'):
+        port = free_port()
+        process = start_agent_server(
+            port,
+            '--model', f'fake:{latency}',
+            '--rates-api', f'http://127.0.0.1:{rates_port}/',
+            '--response-cache-size', size
+        )
+        try:
+            print({'response_cache_size': int(size), **asyncio.run(
+                _drive_response_cache(f'http://127.0.0.1:{port}/', questions, intents)
+            )})
+        finally:
+            process.terminate()
+            process.wait()
+    port = free_port()
+    # A quick model, so the background refresh rarely lands mid-answer.
+    process = start_agent_server(
+        port,
+        '--model', 'fake:0.01',
+        '--rates-api', f'http://127.0.0.1:{rates_port}/',
+        '--rates-ttl', str(rates_ttl),
+        '--response-cache-size', '4096'
+    )
+    try:
+        print({'cached_before_and_after_rates_expire': asyncio.run(
+            _drive_cache_expiry(f'http://127.0.0.1:{port}/', rates_ttl)
+        )})
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def _queue_events(metrics: str) -> int:
+    """Events dequeued so far, from the queue stage histogram"""
+    for line in metrics.splitlines():
+        if line.startswith('currency_agent_stage_seconds_count{stage="queue"}'):
+            return int(line.split()[1])
+    return 0
+
+
+async def _drive_events(url: str, requests: int, method: str) -> dict:
+    """Events and response bytes per task over message/send or message/stream"""
+    response_bytes, history = [], []
+    sse_events = 0
+    async with httpx.AsyncClient(timeout=60) as client:
+        events_before = _queue_events((await client.get(f'{url}metrics')).text)
+        for index in range(requests):
+            # Not matched by the fast path or the response cache.
+            body = send_message_body(f'Please convert {index + 1} USD to INR', method)
+            if method == 'message/send':
+                response = await client.post(url, json=body)
+                response_bytes.append(len(response.content))
+                history.append(len(response.json()['result'].get('history', [])))
+                continue
+            received = 0
+            async with client.stream('POST', url, json=body) as response:
+                async for line in response.aiter_lines():
+                    if line.startswith('data:'):
+                        received += len(line)
+                        sse_events += 1
+            response_bytes.append(received)
+        events = _queue_events((await client.get(f'{url}metrics')).text) - events_before
+    result = {
+        'events_per_task': round(events / requests, 2),
+        'response_bytes': round(statistics.mean(response_bytes)),
+    }
+    if method == 'message/send':
+        result['history_messages'] = round(statistics.mean(history), 2)
+    else:
+        result['sse_events_per_task'] = round(sse_events / requests, 2)
+    return result
+
+
+@cli.command('events')
+@click.option('--requests', 'requests', default=50)
+@click.option('--latency', 'latency', default=0.2,
+              help='Seconds the stub model takes per call')
+@click.option('--working-interval', 'working_interval', default=1.0,
+              help='Coalescing interval of the streaming run with coalescing')
+def events(requests, latency, working_interval):
+    """Events and bytes per task with and without intermediate updates"""
+    rates_port = free_port()
+    serve_in_thread(rates_stub_app(), rates_port)
+    runs = (
+        ('message/send', 'send_progress', ['--send-progress']),
+        ('message/send', 'lean', []),
+        ('message/stream', 'every_update', ['--stream-tokens']),
+        ('message/stream', f'coalesced_{working_interval}s',
+         ['--stream-tokens', '--working-interval', str(working_interval)]),
+    )
+    for method, label, args in runs:
+        port = free_port()
+        process = start_agent_server(
+            port,
+            '--model', f'fake:{latency}',
+            '--rates-api', f'http://127.0.0.1:{rates_port}/',
+            '--response-cache-size', '0',
+            *args
+        )
+        try:
+            print({'method': method, 'run': label, **asyncio.run(
+                _drive_events(f'http://127.0.0.1:{port}/', requests, method)
+            )})
+        finally:
+            process.terminate()
+            process.wait()
+
+async def _drive_profiled(
+    url: str,
+    requests: int,
+    concurrency: int,
+    text: str,
+    profile: bool
+) -> dict:
+    """message/send latency, every request profiled or none"""
+    headers = {'X-Profile': '1'} if profile else None
+    limits = httpx.Limits(max_connections=concurrency)
+    latencies = []
+    async with httpx.AsyncClient(limits=limits, timeout=60) as client:
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def run(index: int):
+            async with semaphore:
+                body = send_message_body(text.format(index=index + 1))
+                started = time.perf_counter()
+                response = await client.post(url, json=body, headers=headers)
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - started)
+
+        # Warm-up, not profiled or timed
+        await client.post(url, json=send_message_body(text.format(index=0)))
+        await asyncio.gather(*(run(i) for i in range(requests)))
+        report = (await client.get(f'{url}profile?top=10')).json() if profile else {}
+    return {
+        'profiled': profile,
+        'latency_ms': percentiles(latencies),
+        'mean_ms': round(statistics.mean(latencies) * 1000, 3),
+        **report,
+    }
+
+
+@cli.command('profile')
+@click.option('--agent', 'agents', default='hello-world,currency',
+              help='Comma separated agents to profile: hello-world, currency')
+@click.option('--requests', 'requests', default=500)
+@click.option('--concurrency', 'concurrency', default=8)
+def profile(agents, requests, concurrency):
+    """Per-request CPU profiles of message/send: the hello world agent
+    gives the framework's own overhead, the currency agent (stub model,
+    no latency) adds the agent's. Also times the requests unprofiled."""
+    rates_port = free_port()
+    serve_in_thread(rates_stub_app(), rates_port)
+    directory = tempfile.mkdtemp()
+    for agent in agents.split(','):
+        if agent == 'hello-world':
+            args, server_dir, text = (), HELLO_WORLD, 'hi'
+        elif agent == 'currency':
+            args = (
+                '--model', 'fake',
+                '--rates-api', f'http://127.0.0.1:{rates_port}/',
+                '--response-cache-size', '0'
+            )
+            # Not matched by the fast path, so every request runs the graph.
+            server_dir, text = HERE, 'Please convert {index} USD to INR'
+        else:
+            raise click.BadParameter(f'Unknown agent {agent}')
+        profile_dir = os.path.join(directory, agent)
+        port = free_port()
+        process = start_agent_server(
+            port, *args, '--profile-header', '--profile-dir', profile_dir,
+            directory=server_dir
+        )
+        try:
+            for profiled in (False, True):
+                print({'agent': agent, **asyncio.run(_drive_profiled(
+                    f'http://127.0.0.1:{port}/', requests, concurrency, text, profiled
+                ))})
+            print({'agent': agent, 'profile_files': len(os.listdir(profile_dir))})
+        finally:
+            process.terminate()
+            process.wait()
+
+def _health_pid(url: str) -> int | None:
+    try:
+        return httpx.get(f'{url}health', timeout=1).json()['pid']
+    except (httpx.HTTPError, ValueError, KeyError):
+        return None
+
+
+async def _drive_restart(url: str, restart, workers: int, conversations: int) -> dict:
+    """Steady message/send load while `restart()` (run in a thread)
+    replaces the server; counts failed requests and the conversations
+    that can be continued afterwards"""
+    async with httpx.AsyncClient(timeout=60) as client:
+        async def send(text: str, task: dict | None = None) -> dict:
+            body = send_message_body(text)
+            if task:
+                body['params']['message'].update(
+                    taskId=task['id'], contextId=task['contextId']
+                )
+            response = (await client.post(url, json=body)).json()
+            if 'error' in response:
+                raise RuntimeError(response['error'])
+            return response['result']
+
+        # Conversations waiting for the target currency across the restart
+        waiting = [await send(f'How much is {index + 1} USD?') for index in range(conversations)]
+        old_pid = _health_pid(url)
+        outcomes = []
+        stop = False
+
+        async def worker(index: int):
+            count = 0
+            while not stop:
+                count += 1
+                started = time.monotonic()
+                try:
+                    # Not matched by the fast path, so the model runs.
+                    await send(f'Please convert {index * 1000 + count} USD to INR')
+                    outcomes.append((started, time.monotonic(), None))
+                except (httpx.HTTPError, RuntimeError, ValueError) as e:
+                    outcomes.append((started, time.monotonic(), type(e).__name__))
+                    await asyncio.sleep(0.05)
+
+        tasks = [asyncio.create_task(worker(index)) for index in range(workers)]
+        await asyncio.sleep(2)
+        triggered = time.monotonic()
+        await asyncio.to_thread(restart)
+        # Until the new process has answered a request
+        while _health_pid(url) in (None, old_pid):
+            await asyncio.sleep(0.05)
+        replaced = time.monotonic()
+        await asyncio.sleep(2)
+        stop = True
+        await asyncio.gather(*tasks)
+
+        resumed = 0
+        for task in waiting:
+            try:
+                resumed += (await send('CAD', task))['status']['state'] == 'completed'
+            except (httpx.HTTPError, RuntimeError, ValueError):
+                pass
+
+    served = sorted(end for _, end, error in outcomes if error is None)
+    gaps = [later - earlier for earlier, later in zip(served, served[1:])]
+    errors = collections.Counter(error for _, _, error in outcomes if error)
+    return {
+        'requests': len(outcomes),
+        'failed': sum(errors.values()),
+        'errors': dict(errors),
+        # Trigger to the new process answering its health check
+        'restart_s': round(replaced - triggered, 3),
+        # Longest time without a successful answer
+        'max_gap_s': round(max(gaps, default=0), 3),
+        'conversations_resumed': f'{resumed}/{conversations}',
+    }
+
+
+@cli.command('restart')
+@click.option('--mode', 'modes', default='kill,term,handoff',
+              help='Comma separated: kill (kill -9 and start again), term '
+                   '(SIGTERM, drain and start again), handoff (SIGHUP)')
+@click.option('--workers', 'workers', default=8,
+              help='Clients sending messages back to back')
+@click.option('--conversations', 'conversations', default=10,
+              help='Conversations waiting for user input across the restart')
+@click.option('--latency', 'latency', default=0.2,
+              help='Seconds the stub model takes per call')
+def restart(modes, workers, conversations, latency):
+    """Failed requests, restart time and lost conversations when the
+    server is replaced under load"""
+    rates_port = free_port()
+    serve_in_thread(rates_stub_app(), rates_port)
+    for mode in modes.split(','):
+        state_dir = tempfile.mkdtemp()
+        port = free_port()
+        args = (
+            '--model', f'fake:{latency}',
+            '--rates-api', f'http://127.0.0.1:{rates_port}/',
+            '--response-cache-size', '0',
+            '--state-dir', state_dir,
+        )
+        processes = [start_agent_server(port, *args)]
+
+        def replace():
+            old = processes[0]
+            if mode == 'handoff':
+                # The successor is started by the old process itself.
+                old.send_signal(signal.SIGHUP)
+                old.wait()
+                return
+            if mode == 'kill':
+                old.kill()
+            elif mode == 'term':
+                old.terminate()
+            else:
+                raise click.BadParameter(f'Unknown mode {mode}')
+            old.wait()
+            processes.append(start_agent_server(port, *args))
+
+        url = f'http://127.0.0.1:{port}/'
+        try:
+            print({'mode': mode, **asyncio.run(
+                _drive_restart(url, replace, workers, conversations)
+            )})
+        finally:
+            pid = _health_pid(url)
+            for process in processes:
+                process.terminate()
+                process.wait()
+            if mode == 'handoff' and pid is not None:
+                os.kill(pid, signal.SIGTERM)
+                while _health_pid(url) is not None:
+                    time.sleep(0.1)
+
+async def _drive_cards(url: str, lookups: int) -> dict:
+    from common.agent_client import AgentConnections
+
+    async def per_lookup(lookup) -> float:
+        started = time.perf_counter()
+        for _ in range(lookups):
+            await lookup()
+        return round((time.perf_counter() - started) / lookups * 1000, 3)
+
+    async def resolve_fresh():
+        # What the client scripts did: a new client and resolver each time.
+        async with httpx.AsyncClient() as http:
+            await A2ACardResolver(http, url).get_agent_card()
+
+    async with httpx.AsyncClient() as http:
+        resolver = A2ACardResolver(http, url)
+        shared_ms = await per_lookup(resolver.get_agent_card)
+
+    connections = AgentConnections()
+    revalidating = AgentConnections(card_ttl=0)
+    try:
+        await connections.prewarm([url])
+        await revalidating.prewarm([url])
+        return {
+            'fresh_client_ms': await per_lookup(resolve_fresh),
+            'shared_client_ms': shared_ms,
+            'revalidated_ms': await per_lookup(lambda: revalidating.card(url)),
+            'cached_ms': await per_lookup(lambda: connections.card(url)),
+            'revalidation_stats': revalidating.cards.stats(),
+        }
+    finally:
+        await connections.aclose()
+        await revalidating.aclose()
+
+
+@cli.command('cards')
+@click.option('--agent', 'agents', default='currency,hello-world',
+              help='Comma separated agents: currency, hello-world')
+@click.option('--lookups', 'lookups', default=500)
+def cards(agents, lookups):
+    """Agent card lookups: resolver per call, shared client, 304
+    revalidation and the client-side card cache"""
+    rates_port = free_port()
+    serve_in_thread(rates_stub_app(), rates_port)
+    for agent in agents.split(','):
+        port = free_port()
+        if agent == 'currency':
+            process = start_agent_server(
+                port,
+                '--model', 'fake',
+                '--rates-api', f'http://127.0.0.1:{rates_port}/'
+            )
+        else:
+            process = start_agent_server(port, directory=HELLO_WORLD)
+        try:
+            result = asyncio.run(_drive_cards(f'http://127.0.0.1:{port}', lookups))
+            print({'agent': agent, **result})
+        finally:
+            process.terminate()
+            process.wait()
+
+
+def import_seconds(module: str) -> float:
+    """Wall time of importing `module` in a fresh interpreter"""
+    code = (
+        'import time; started = time.perf_counter(); '
+        f'import {module}; print(time.perf_counter() - started)'
+    )
+    output = subprocess.run(
+        [sys.executable, '-W', 'ignore', '-c', code],
+        cwd=HERE, capture_output=True, text=True, check=True
+    ).stdout
+    return float(output.split()[-1])
+
+
+def _time_startup(mode: str, rates_port: int, probe_interval: float) -> dict:
+    port = free_port()
+    base = f'http://127.0.0.1:{port}'
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [
+            sys.executable, '-W', 'ignore', 'server.py',
+            '--host', '127.0.0.1', '--port', str(port),
+            '--model', 'fake',
+            '--rates-api', f'http://127.0.0.1:{rates_port}/',
+            '--startup', mode
+        ],
+        cwd=HERE,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
+    result = {'startup': mode}
+    try:
+        deadline = time.monotonic() + 60
+        while 'ready_s' not in result and time.monotonic() < deadline:
+            try:
+                if 'card_s' not in result:
+                    httpx.get(f'{base}/.well-known/agent.json').raise_for_status()
+                    result['card_s'] = round(time.perf_counter() - started, 3)
+                if httpx.get(f'{base}/ready').status_code == 200:
+                    result['ready_s'] = round(time.perf_counter() - started, 3)
+            except httpx.HTTPError:
+                pass
+            time.sleep(probe_interval)
+        request_started = time.perf_counter()
+        httpx.post(
+            base, json=send_message_body('Please convert 5 USD to INR'), timeout=30
+        ).raise_for_status()
+        result['first_request_ms'] = round(
+            (time.perf_counter() - request_started) * 1000, 1
+        )
+        result['timings'] = httpx.get(f'{base}/ready').json()['timings']
+    finally:
+        process.terminate()
+        process.wait()
+    return result
+
+
+@cli.command('startup')
+@click.option('--runs', 'runs', default=3)
+@click.option('--probe-interval', 'probe_interval', default=0.05,
+              help='Seconds between card and readiness probes')
+@click.option('--output', 'output', default=None, help='Write results as JSON')
+def startup(runs, probe_interval, output):
+    """Import times and time to card, to ready and to the first answer for
+    --startup eager and lazy"""
+    imports = {
+        module: round(statistics.median(import_seconds(module) for _ in range(runs)), 3)
+        for module in ('server', 'agent')
+    }
+    print({'import_s': imports})
+    rates_port = free_port()
+    serve_in_thread(rates_stub_app(), rates_port)
+    results = []
+    for mode in ('eager', 'lazy'):
+        samples = [_time_startup(mode, rates_port, probe_interval) for _ in range(runs)]
+        results.append({
+            'startup': mode,
+            **{
+                key: round(statistics.median(sample[key] for sample in samples), 3)
+                for key in ('card_s', 'ready_s', 'first_request_ms')
+            },
+            'timings': samples[-1]['timings'],
+        })
+        print(results[-1])
+    if output:
+        with open(output, 'w') as f:
+            json.dump({
+                'benchmark': 'startup',
+                'commit': git_commit(),
+                'import_s': imports,
+                'results': results
+            }, f, indent=2)
+
+
+@cli.command('metrics-overhead')
+@click.option('--iterations', 'iterations', default=1_000_000)
+def metrics_overhead(iterations):
+    """Cost of the per-stage instrumentation on the hot path"""
+    metrics = Metrics()
+    timer = ModelTimer(metrics)
+    run_id = uuid.uuid4()
+
+    def per_call(body) -> float:
+        started = time.perf_counter()
+        for _ in range(iterations):
+            body()
+        return (time.perf_counter() - started) / iterations * 1e9
+
+    def timed():
+        with metrics.time('stage'):
+            pass
+
+    def model_call():
+        timer.on_chat_model_start(None, None, run_id=run_id)
+        timer.on_llm_end(None, run_id=run_id)
+
+    baseline = per_call(lambda: None)
+    results = {
+        'observe_ns': round(per_call(lambda: metrics.observe('stage', 0.01)) - baseline),
+        'timed_block_ns': round(per_call(timed) - baseline),
+        'model_timer_ns': round(per_call(model_call) - baseline),
+    }
+    # A graph turn records roughly 30 samples (2-3 model calls, a tool call,
+    # a dozen checkpoint operations, queue, parse and encode stages).
+    results['per_turn_us'] = round(results['timed_block_ns'] * 30 / 1000, 1)
+    started = time.perf_counter()
+    metrics.render()
+    results['render_ms'] = round((time.perf_counter() - started) * 1000, 3)
+    print(results)
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,585 @@
+import asyncio
+import contextlib
+import pickle
+import random
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import AsyncIterator, Iterator, Sequence
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Optional
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+from langgraph.checkpoint.serde.types import TASKS, ChannelProtocol
+
+from metrics import METRICS
+
+# `_load` argument: the cold tier was not read yet.
+NOT_READ = object()
+
+
+class _Thread:
+    """Checkpoints of one thread: checkpoint_ns -> checkpoint_id -> entry
+
+    An entry is `[checkpoint, metadata, parent_id, writes, sends]` where
+    `checkpoint` and `metadata` are serialized with the saver's serde,
+    `writes` maps (task_id, idx) to (task_id, channel, value, task_path) and
+    `sends` holds the parent's pending sends, so the parent can be dropped.
+    """
+    __slots__ = ('namespaces', 'nbytes', 'touched', 'dirty')
+
+    def __init__(self, namespaces: dict | None = None):
+        self.namespaces: dict[str, OrderedDict[str, list]] = namespaces or {}
+        self.nbytes = 0
+        self.touched = time.monotonic()
+        self.dirty = False
+
+    def measure(self) -> int:
+        total = 0
+        for checkpoints in self.namespaces.values():
+            for checkpoint, metadata, _, writes, sends in checkpoints.values():
+                total += len(checkpoint[1]) + len(metadata[1])
+                total += sum(len(w[2][1]) for w in writes.values())
+                total += sum(len(s[1]) for s in sends)
+        self.nbytes = total
+        return total
+
+
+class BoundedCheckpointSaver(BaseCheckpointSaver[str]):
+    """Checkpointer with a bounded in-memory tier and a SQLite cold tier
+
+    Threads live in an LRU of at most `max_threads` threads and `max_bytes`
+    serialized bytes, and are evicted after `ttl` idle seconds. Evicted
+    threads are written to the SQLite database at `path` and loaded back on
+    their next access. Without a `path` evicted threads are dropped. Only
+    the `keep_last` newest checkpoints of each thread are kept.
+
+    `flush` writes every modified hot thread to disk, so conversations
+    survive a restart. `max_threads=0` keeps nothing in memory, which lets
+    several processes share one database.
+
+    The async methods never touch the database on the event loop: cold
+    reads and the writes of evicted threads run on one I/O thread with
+    the connection, and the in-memory tier is only locked around the
+    in-memory work. A write finishes before the call that evicted the
+    thread returns, so other processes read what this one just wrote.
+    """
+    def __init__(
+        self,
+        *,
+        max_threads: int = 10_000,
+        max_bytes: int = 256 * 1024 * 1024,
+        ttl: float | None = None,
+        keep_last: int = 1,
+        path: str | None = None,
+        serde=None
+    ):
+        super().__init__(serde=serde)
+        self.max_threads = max_threads
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.keep_last = max(keep_last, 1)
+        self.path = path
+        self.evictions = 0
+        self._hot: OrderedDict[str, _Thread] = OrderedDict()
+        # Evicted threads with changes the I/O thread has not written yet,
+        # or kept in memory for `_reading`
+        self._pending: dict[str, _Thread] = {}
+        # Async calls that may use each thread as read from disk
+        self._readers: dict[str, int] = {}
+        self._nbytes = 0
+        # Guards the in-memory tier; `_db_lock` guards the connection.
+        self._lock = threading.RLock()
+        self._db_lock = threading.Lock()
+        self._db: sqlite3.Connection | None = None
+        self._io: ThreadPoolExecutor | None = None
+        if path:
+            self._io = ThreadPoolExecutor(max_workers=1, thread_name_prefix='checkpoints')
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute('PRAGMA synchronous=NORMAL')
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS threads ('
+                'thread_id TEXT PRIMARY KEY, data BLOB NOT NULL, '
+                'updated_at REAL NOT NULL)'
+            )
+            self._db.commit()
+
+    # Storage tiers
+
+    def _load(
+        self,
+        thread_id: str,
+        create: bool = False,
+        cold: _Thread | None | object = NOT_READ
+    ) -> _Thread | None:
+        """The thread, admitted to the hot tier. `cold` is what `_read`
+        returned for it, if it was already called."""
+        thread = self._hot.get(thread_id)
+        if thread is not None:
+            self._hot.move_to_end(thread_id)
+        else:
+            # Newer than its copy on disk, if it has not been written yet
+            thread = self._pending.pop(thread_id, None)
+            if thread is None:
+                thread = self._read(thread_id) if cold is NOT_READ else cold
+            if thread is None and create:
+                thread = _Thread()
+            if thread is not None:
+                self._admit(thread_id, thread)
+        if thread is not None:
+            thread.touched = time.monotonic()
+        return thread
+
+    def _read(self, thread_id: str) -> _Thread | None:
+        if self._db is None:
+            return None
+        with self._db_lock:
+            row = self._db.execute(
+                'SELECT data FROM threads WHERE thread_id = ?', (thread_id,)
+            ).fetchone()
+        return _Thread(pickle.loads(row[0])) if row else None
+
+    def _admit(self, thread_id: str, thread: _Thread) -> None:
+        self._hot[thread_id] = thread
+        self._nbytes += thread.measure()
+
+    def _updated(self, thread_id: str, thread: _Thread) -> None:
+        self._nbytes -= thread.nbytes
+        self._nbytes += thread.measure()
+        thread.dirty = True
+        self._enforce_limits()
+
+    def _enforce_limits(self) -> None:
+        expired_before = time.monotonic() - self.ttl if self.ttl else None
+        while self._hot:
+            thread_id, thread = next(iter(self._hot.items()))
+            if not (
+                len(self._hot) > self.max_threads
+                or self._nbytes > self.max_bytes
+                or (expired_before and thread.touched < expired_before)
+            ):
+                break
+            self._evict(thread_id)
+
+    def _evict(self, thread_id: str) -> None:
+        thread = self._hot.pop(thread_id)
+        self._nbytes -= thread.nbytes
+        self.evictions += 1
+        if self._db is not None and (thread.dirty or thread_id in self._readers):
+            # Written by `_save_pending`, outside the in-memory work.
+            self._pending[thread_id] = thread
+
+    def _save_pending(self) -> None:
+        """Writes the evicted threads' changes to the cold tier"""
+        if not self._pending:
+            return
+        with self._lock:
+            saving = dict(self._pending)
+            rows = []
+            for thread_id, thread in saving.items():
+                rows.append(self._row(thread_id, thread))
+                thread.dirty = False
+        self._write(rows)
+        with self._lock:
+            for thread_id, thread in saving.items():
+                # Unless it was loaded or changed again meanwhile, or a read
+                # from disk made before this write has yet to be used
+                if (
+                    self._pending.get(thread_id) is thread
+                    and not thread.dirty
+                    and thread_id not in self._readers
+                ):
+                    del self._pending[thread_id]
+
+    @staticmethod
+    def _row(thread_id: str, thread: _Thread) -> tuple:
+        return thread_id, pickle.dumps(thread.namespaces), time.time()
+
+    def _write(self, rows: list[tuple]) -> None:
+        if self._db is None or not rows:
+            return
+        with self._db_lock:
+            self._db.executemany(
+                'INSERT OR REPLACE INTO threads (thread_id, data, updated_at) '
+                'VALUES (?, ?, ?)',
+                rows
+            )
+            self._db.commit()
+
+    async def _in_io_thread(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._io, function, *args)
+
+    @contextlib.asynccontextmanager
+    async def _reading(self, thread_id: str) -> AsyncIterator[_Thread | None | object]:
+        """Yields `_read` run on the I/O thread, or NOT_READ if the thread
+        is in memory, for `_load` to use inside the block
+
+        Until the block ends the thread stays in memory: once evicted it
+        is kept in `_pending` even after it is written, and `_load` prefers
+        that copy to one read before the write.
+        """
+        if self._db is None:
+            yield NOT_READ
+            return
+        with self._lock:
+            self._readers[thread_id] = self._readers.get(thread_id, 0) + 1
+            in_memory = thread_id in self._hot or thread_id in self._pending
+        try:
+            yield NOT_READ if in_memory else await self._in_io_thread(self._read, thread_id)
+        finally:
+            with self._lock:
+                self._readers[thread_id] -= 1
+                if not self._readers[thread_id]:
+                    del self._readers[thread_id]
+
+    async def _asave_pending(self) -> None:
+        if self._pending:
+            await self._in_io_thread(self._save_pending)
+
+    def flush(self) -> None:
+        """Writes every modified in-memory thread to the cold tier"""
+        if self._db is None:
+            return
+        with self._lock:
+            rows = []
+            for thread_id, thread in self._hot.items():
+                if thread.dirty:
+                    rows.append(self._row(thread_id, thread))
+                    thread.dirty = False
+        self._write(rows)
+        self._save_pending()
+
+    def purge(self, older_than: float) -> int:
+        """Deletes cold threads not updated for `older_than` seconds"""
+        if self._db is None:
+            return 0
+        with self._db_lock:
+            cursor = self._db.execute(
+                'DELETE FROM threads WHERE updated_at < ?',
+                (time.time() - older_than,)
+            )
+            self._db.commit()
+            return cursor.rowcount
+
+    def close(self) -> None:
+        self.flush()
+        if self._io is not None:
+            self._io.shutdown()
+            self._io = None
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def stats(self) -> dict:
+        cold_threads = 0
+        if self._db is not None:
+            with self._db_lock:
+                cold_threads = self._db.execute('SELECT COUNT(*) FROM threads').fetchone()[0]
+        return {
+            'hot_threads': len(self._hot),
+            'hot_bytes': self._nbytes,
+            'pending_threads': len(self._pending),
+            'evictions': self.evictions,
+            'cold_threads': cold_threads
+        }
+
+    # BaseCheckpointSaver
+
+    def _to_tuple(
+        self,
+        thread_id: str,
+        checkpoint_ns: str,
+        checkpoint_id: str,
+        entry: list
+    ) -> CheckpointTuple:
+        checkpoint, metadata, parent_id, writes, sends = entry
+        return CheckpointTuple(
+            config={
+                'configurable': {
+                    'thread_id': thread_id,
+                    'checkpoint_ns': checkpoint_ns,
+                    'checkpoint_id': checkpoint_id,
+                }
+            },
+            checkpoint={
+                **self.serde.loads_typed(checkpoint),
+                'pending_sends': [self.serde.loads_typed(s) for s in sends],
+            },
+            metadata=self.serde.loads_typed(metadata),
+            parent_config=(
+                {
+                    'configurable': {
+                        'thread_id': thread_id,
+                        'checkpoint_ns': checkpoint_ns,
+                        'checkpoint_id': parent_id,
+                    }
+                }
+                if parent_id
+                else None
+            ),
+            pending_writes=[
+                (task_id, channel, self.serde.loads_typed(value))
+                for task_id, channel, value, _ in writes.values()
+            ],
+        )
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        result = self._get_tuple(config)
+        self._save_pending()
+        return result
+
+    def _get_tuple(
+        self,
+        config: RunnableConfig,
+        cold: _Thread | None | object = NOT_READ
+    ) -> Optional[CheckpointTuple]:
+        thread_id: str = config['configurable']['thread_id']
+        checkpoint_ns: str = config['configurable'].get('checkpoint_ns', '')
+        with self._lock:
+            thread = self._load(thread_id, cold=cold)
+            checkpoints = thread.namespaces.get(checkpoint_ns) if thread else None
+            if not checkpoints:
+                return None
+            checkpoint_id = get_checkpoint_id(config) or next(reversed(checkpoints))
+            entry = checkpoints.get(checkpoint_id)
+            if entry is None:
+                return None
+            result = self._to_tuple(thread_id, checkpoint_ns, checkpoint_id, entry)
+            self._enforce_limits()
+            return result
+
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        if config:
+            thread_ids = [config['configurable']['thread_id']]
+        else:
+            with self._lock:
+                thread_ids = list(self._hot) + list(self._pending)
+            if self._db is not None:
+                with self._db_lock:
+                    rows = self._db.execute('SELECT thread_id FROM threads').fetchall()
+                listed = set(thread_ids)
+                thread_ids += [row[0] for row in rows if row[0] not in listed]
+        config_checkpoint_ns = (
+            config['configurable'].get('checkpoint_ns') if config else None
+        )
+        config_checkpoint_id = get_checkpoint_id(config) if config else None
+        before_checkpoint_id = get_checkpoint_id(before) if before else None
+        results = []
+        with self._lock:
+            for thread_id in thread_ids:
+                thread = self._load(thread_id)
+                if thread is None:
+                    continue
+                for checkpoint_ns, checkpoints in thread.namespaces.items():
+                    if (
+                        config_checkpoint_ns is not None
+                        and checkpoint_ns != config_checkpoint_ns
+                    ):
+                        continue
+                    for checkpoint_id in reversed(checkpoints):
+                        if limit is not None and len(results) >= limit:
+                            break
+                        if (
+                            config_checkpoint_id
+                            and checkpoint_id != config_checkpoint_id
+                        ) or (
+                            before_checkpoint_id
+                            and checkpoint_id >= before_checkpoint_id
+                        ):
+                            continue
+                        entry = checkpoints[checkpoint_id]
+                        metadata = self.serde.loads_typed(entry[1])
+                        if filter and not all(
+                            metadata.get(key) == value
+                            for key, value in filter.items()
+                        ):
+                            continue
+                        results.append(self._to_tuple(
+                            thread_id, checkpoint_ns, checkpoint_id, entry
+                        ))
+            self._enforce_limits()
+        self._save_pending()
+        yield from results
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        result = self._put(config, checkpoint, metadata)
+        self._save_pending()
+        return result
+
+    def _put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        cold: _Thread | None | object = NOT_READ
+    ) -> RunnableConfig:
+        thread_id = config['configurable']['thread_id']
+        checkpoint_ns = config['configurable'].get('checkpoint_ns', '')
+        parent_id = config['configurable'].get('checkpoint_id')
+        c = checkpoint.copy()
+        c.pop('pending_sends', None)
+        with self._lock:
+            thread = self._load(thread_id, create=True, cold=cold)
+            checkpoints = thread.namespaces.setdefault(checkpoint_ns, OrderedDict())
+            parent = checkpoints.get(parent_id) if parent_id else None
+            sends = sorted(
+                (w for w in parent[3].items() if w[1][1] == TASKS),
+                key=lambda w: (w[1][3], w[1][0], w[0][1]),
+            ) if parent else []
+            checkpoints[checkpoint['id']] = [
+                self.serde.dumps_typed(c),
+                self.serde.dumps_typed(get_checkpoint_metadata(config, metadata)),
+                parent_id,
+                {},
+                [w[1][2] for w in sends],
+            ]
+            while len(checkpoints) > self.keep_last:
+                checkpoints.popitem(last=False)
+            self._updated(thread_id, thread)
+        return {
+            'configurable': {
+                'thread_id': thread_id,
+                'checkpoint_ns': checkpoint_ns,
+                'checkpoint_id': checkpoint['id'],
+            }
+        }
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = '',
+    ) -> None:
+        self._put_writes(config, writes, task_id, task_path)
+        self._save_pending()
+
+    def _put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = '',
+        cold: _Thread | None | object = NOT_READ
+    ) -> None:
+        thread_id = config['configurable']['thread_id']
+        checkpoint_ns = config['configurable'].get('checkpoint_ns', '')
+        checkpoint_id = config['configurable']['checkpoint_id']
+        with self._lock:
+            thread = self._load(thread_id, cold=cold)
+            checkpoints = thread.namespaces.get(checkpoint_ns) if thread else None
+            entry = checkpoints.get(checkpoint_id) if checkpoints else None
+            if entry is None:
+                return
+            saved = entry[3]
+            for idx, (channel, value) in enumerate(writes):
+                key = (task_id, WRITES_IDX_MAP.get(channel, idx))
+                if key[1] >= 0 and key in saved:
+                    continue
+                saved[key] = (
+                    task_id,
+                    channel,
+                    self.serde.dumps_typed(value),
+                    task_path
+                )
+            self._updated(thread_id, thread)
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._lock:
+            thread = self._hot.pop(thread_id, None)
+            if thread is not None:
+                self._nbytes -= thread.nbytes
+            self._pending.pop(thread_id, None)
+        if self._db is not None:
+            with self._db_lock:
+                self._db.execute(
+                    'DELETE FROM threads WHERE thread_id = ?', (thread_id,)
+                )
+                self._db.commit()
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        with METRICS.time('checkpoint'):
+            async with self._reading(config['configurable']['thread_id']) as cold:
+                result = self._get_tuple(config, cold)
+            await self._asave_pending()
+            return result
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        def collect() -> list[CheckpointTuple]:
+            return [*self.list(config, filter=filter, before=before, limit=limit)]
+
+        # Listing may read any number of threads from disk.
+        items = collect() if self._db is None else await self._in_io_thread(collect)
+        for item in items:
+            yield item
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        with METRICS.time('checkpoint'):
+            async with self._reading(config['configurable']['thread_id']) as cold:
+                result = self._put(config, checkpoint, metadata, cold)
+            await self._asave_pending()
+            return result
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = '',
+    ) -> None:
+        with METRICS.time('checkpoint'):
+            async with self._reading(config['configurable']['thread_id']) as cold:
+                self._put_writes(config, writes, task_id, task_path, cold)
+            await self._asave_pending()
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        if self._db is None:
+            return self.delete_thread(thread_id)
+        return await self._in_io_thread(self.delete_thread, thread_id)
+
+    def get_next_version(self, current: Optional[str], channel: ChannelProtocol) -> str:
+        if current is None:
+            current_v = 0
+        elif isinstance(current, int):
+            current_v = current
+        else:
+            current_v = int(current.split('.')[0])
+        return f'{current_v + 1:032}.{random.random():016}'
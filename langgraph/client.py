@@ -1,8 +1,7 @@
 import asyncio
-import httpx
 import uuid
 from typing import Any
-from a2a.client import A2AClient, A2ACardResolver
+from a2a.client import A2AClient
 from a2a.types import (
     AgentCard,
     MessageSendParams,
@@ -11,30 +10,29 @@ from a2a.types import (
 )
 from rich import print
 
-PUBLIC_AGENT_CARD_PATH = '/.well-known/agent.json'
-EXTENDED_AGENT_CARD_PATH = 'agent/authenticatedExtendedCard'
+from common.agent_client import AgentConnections
+
 BASE_URL = 'http://0.0.0.0:9999'
 
 async def main():
-    async with httpx.AsyncClient() as httpx_client:
-        # Step 1: Agent resolver
-        resolver = A2ACardResolver(
-            httpx_client=httpx_client,
-            base_url=BASE_URL
-        )
+    connections = AgentConnections()
+    try:
+        # Step 1: Pooled connections, opened ahead of the first request
+        await connections.prewarm([BASE_URL])
         final_agent_card_to_use : AgentCard | None = None
 
         try:
             # Step 2: Public agent
-            _public_agent = await resolver.get_agent_card()
+            _public_agent = await connections.card(BASE_URL)
             final_agent_card_to_use = _public_agent
 
             if _public_agent.supportsAuthenticatedExtendedCard:
                 try:
                     # Step 3: Extended agent
-                    _extended_card = await resolver.get_agent_card(
-                        relative_card_path=EXTENDED_AGENT_CARD_PATH,
-                        http_kwargs = {'headers': {'Authorization': 'dummy-token-for-extended-card'}}
+                    _extended_card = await connections.card(
+                        BASE_URL,
+                        extended=True,
+                        headers={'Authorization': 'dummy-token-for-extended-card'}
                     )
                     final_agent_card_to_use = _extended_card
                 except Exception as e:
@@ -53,7 +51,7 @@ async def main():
         
         # Step 4: Client
         client = A2AClient(
-            httpx_client=httpx_client,
+            httpx_client=connections.http(BASE_URL),
             agent_card=final_agent_card_to_use
         )
 
@@ -118,7 +116,9 @@ async def main():
         second_response = await client.send_message(second_request)
         print(f"-----------2nd RESPONSE-----------") 
         print(second_response.model_dump(mode='json', exclude_none=True))
-        
+    finally:
+        await connections.aclose()
+
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
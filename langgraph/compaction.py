@@ -0,0 +1,191 @@
+import json
+import time
+
+from langchain_core.messages import (
+    AIMessage,
+    BaseMessage,
+    HumanMessage,
+    RemoveMessage,
+    SystemMessage,
+    ToolMessage,
+)
+from langchain_core.messages.utils import count_tokens_approximately
+from langgraph.graph.message import REMOVE_ALL_MESSAGES
+
+from metrics import METRICS, Metrics
+
+SUMMARY_NAME = 'history_summary'
+SUMMARY_HEADER = 'Summary of the earlier conversation with the user:'
+# Earlier turns kept in the summary, each cut to SUMMARY_LINE_CHARS.
+SUMMARY_MAX_LINES = 20
+SUMMARY_LINE_CHARS = 240
+# Tool results shorter than this are kept as they are.
+TOOL_RESULT_MIN_CHARS = 200
+
+
+def prompt_tokens(messages: list[BaseMessage]) -> int:
+    """Approximate token count of a prompt (about 4 characters per token)"""
+    return count_tokens_approximately(messages)
+
+
+def _split_turns(
+    messages: list[BaseMessage]
+) -> tuple[SystemMessage | None, list[list[BaseMessage]]]:
+    """The summary of dropped turns, if any, and the turns after it
+
+    A turn starts at a user message and holds the tool calls, tool results
+    and answers that follow it, so dropping whole turns never separates a
+    function call from its response.
+    """
+    summary = None
+    turns: list[list[BaseMessage]] = []
+    for message in messages:
+        if isinstance(message, SystemMessage) and message.name == SUMMARY_NAME:
+            summary = message
+        elif isinstance(message, HumanMessage) or not turns:
+            turns.append([message])
+        else:
+            turns[-1].append(message)
+    return summary, turns
+
+
+def _answer(turn: list[BaseMessage]) -> str:
+    for message in reversed(turn):
+        if not isinstance(message, AIMessage):
+            continue
+        for call in message.tool_calls:
+            if call['name'] == 'respond':
+                return str(call['args'].get('message', ''))
+        if message.text():
+            return message.text()
+    return ''
+
+
+def _summary_line(turn: list[BaseMessage]) -> str:
+    query = turn[0].text() if isinstance(turn[0], HumanMessage) else ''
+    line = ' '.join(f'- User: {query} Agent: {_answer(turn)}'.split())
+    if len(line) > SUMMARY_LINE_CHARS:
+        line = line[:SUMMARY_LINE_CHARS - 3] + '...'
+    return line
+
+
+def _reduce_result(data: dict, args: dict) -> dict | None:
+    """The rates a tool result was used for, or None to keep it whole"""
+    if isinstance(data.get('conversions'), list):
+        # get_exchange_rates: one rate per currency and date instead of
+        # one row per amount, currency and date.
+        rates: dict[str, dict[str, float]] = {}
+        for row in data['conversions']:
+            rates.setdefault(row['date'], {})[row['currency_to']] = row['rate']
+        reduced = {'base': data['conversions'][0]['currency_from'], 'rates': rates}
+        if data.get('errors'):
+            reduced['errors'] = data['errors']
+        return reduced
+    if isinstance(data.get('rates'), dict):
+        # A full rate table: only the currencies that were asked for.
+        wanted = {
+            code.upper() for code in [
+                args.get('currency_to'), *(args.get('currencies_to') or ())
+            ]
+            if isinstance(code, str)
+        }
+        if not wanted:
+            return None
+        return {
+            **{key: value for key, value in data.items() if key != 'rates'},
+            'rates': {
+                code: rate for code, rate in data['rates'].items() if code in wanted
+            },
+        }
+    return None
+
+
+def _reduce_tool_results(turn: list[BaseMessage]) -> list[BaseMessage]:
+    args = {
+        call['id']: call['args']
+        for message in turn if isinstance(message, AIMessage)
+        for call in message.tool_calls
+    }
+    reduced = []
+    for message in turn:
+        if (
+            isinstance(message, ToolMessage)
+            and isinstance(message.content, str)
+            and len(message.content) >= TOOL_RESULT_MIN_CHARS
+        ):
+            try:
+                data = _reduce_result(
+                    json.loads(message.content), args.get(message.tool_call_id, {})
+                )
+            except (ValueError, KeyError, TypeError, IndexError):
+                data = None
+            if data is not None:
+                content = json.dumps(data, separators=(',', ':'))
+                if len(content) < len(message.content):
+                    message = message.model_copy(update={'content': content})
+        reduced.append(message)
+    return reduced
+
+
+class HistoryCompactor:
+    """Keeps a conversation's message history within a budget
+
+    Runs as the agent's pre-model hook. Once the thread holds more than
+    `max_tokens` (approximate) or `max_messages`, the tool results of
+    earlier turns are reduced to the rates they were used for, then the
+    oldest turns are dropped until the history is back under half the
+    budget. Dropped turns are kept as one line each, question and answer,
+    in a summary system message. The current turn is never changed.
+
+    The compacted history replaces the thread's messages rather than only
+    the prompt, so the checkpoint shrinks too and the structured response
+    call, which reads the thread's messages, sees the same history.
+    """
+    def __init__(
+        self,
+        max_tokens: int = 4000,
+        max_messages: int = 60,
+        metrics: Metrics = METRICS
+    ):
+        self.max_tokens = max_tokens
+        self.max_messages = max_messages
+        self.metrics = metrics
+        self.compactions = 0
+        self.tokens_saved = 0
+
+    def __call__(self, state) -> dict:
+        compacted = self.compact(state['messages'])
+        if compacted is None:
+            return {'messages': []}
+        return {'messages': [RemoveMessage(id=REMOVE_ALL_MESSAGES), *compacted]}
+
+    def _fits(self, messages: list[BaseMessage], share: float = 1.0) -> bool:
+        return (
+            (not self.max_messages or len(messages) <= self.max_messages * share)
+            and (not self.max_tokens or prompt_tokens(messages) <= self.max_tokens * share)
+        )
+
+    def compact(self, messages: list[BaseMessage]) -> list[BaseMessage] | None:
+        """The compacted history, or None if it is within the budget"""
+        if self._fits(messages):
+            return None
+        started = time.perf_counter()
+        summary, turns = _split_turns(messages)
+        turns = [_reduce_tool_results(turn) for turn in turns[:-1]] + turns[-1:]
+        lines = summary.text().splitlines()[1:] if summary is not None else []
+        while len(turns) > 1:
+            candidate = [summary] if summary is not None else []
+            candidate += [message for turn in turns for message in turn]
+            if self._fits(candidate, 0.5):
+                break
+            lines.append(_summary_line(turns.pop(0)))
+            summary = SystemMessage(
+                '\n'.join([SUMMARY_HEADER, *lines[-SUMMARY_MAX_LINES:]]),
+                name=SUMMARY_NAME
+            )
+        compacted = [summary] if summary is not None else []
+        compacted += [message for turn in turns for message in turn]
+        self.compactions += 1
+        self.tokens_saved += prompt_tokens(messages) - prompt_tokens(compacted)
+        self.metrics.observe('compaction', time.perf_counter() - started)
+        return compacted
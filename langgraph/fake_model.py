@@ -0,0 +1,185 @@
+import asyncio
+import json
+import re
+import uuid
+from typing import Any
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import (
+    AIMessage,
+    AIMessageChunk,
+    BaseMessage,
+    HumanMessage,
+    ToolMessage,
+)
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+AMOUNT_PATTERN = re.compile(r'\d+(?:\.\d+)?')
+CODE_PATTERN = re.compile(r'\b[A-Z]{3}\b')
+
+
+def _tool_call(name: str, args: dict) -> AIMessage:
+    return AIMessage(
+        content='',
+        tool_calls=[{'name': name, 'args': args, 'id': uuid.uuid4().hex}]
+    )
+
+
+class FakeCurrencyModel(BaseChatModel):
+    """Deterministic stand-in for Gemini used by the benchmarks
+
+    Reads the amount and ISO currency codes from the user's messages, calls
+    the `get_exchange_rate` tool once per target currency (or
+    `get_exchange_rates` once for several, when bound), asks for
+    the missing currency otherwise, and fills structured responses from its
+    previous answer. Given a `respond` tool, it answers through that tool.
+
+    Every call waits `latency` seconds to mimic a model round trip without
+    using CPU. When streamed, text answers arrive one word at a time,
+    spread evenly over `latency`.
+    """
+    latency: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return 'fake-currency'
+
+    def bind_tools(self, tools, *, tool_choice=None, **kwargs):
+        return self.bind(
+            tools=[convert_to_openai_tool(tool) for tool in tools],
+            tool_choice=tool_choice,
+            **kwargs
+        )
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        return ChatResult(generations=[
+            ChatGeneration(message=self._respond(messages, **kwargs))
+        ])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self._generate(messages, stop, **kwargs)
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        message = self._respond(messages, **kwargs)
+        if message.tool_calls or not message.content:
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            yield ChatGenerationChunk(message=AIMessageChunk(
+                content=message.content,
+                tool_call_chunks=[
+                    {
+                        'name': call['name'],
+                        'args': json.dumps(call['args']),
+                        'id': call['id'],
+                        'index': index
+                    }
+                    for index, call in enumerate(message.tool_calls)
+                ]
+            ))
+            return
+        words = message.content.split(' ')
+        for index, word in enumerate(words):
+            if self.latency:
+                await asyncio.sleep(self.latency / len(words))
+            text = word if index == 0 else f' {word}'
+            if run_manager:
+                await run_manager.on_llm_new_token(text)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=text))
+
+    def _respond(
+        self,
+        messages: list[BaseMessage],
+        tools: list[dict] | None = None,
+        tool_choice: Any = None,
+        **kwargs
+    ) -> AIMessage:
+        names = [tool['function']['name'] for tool in tools or ()]
+        if names and 'get_exchange_rate' not in names:
+            # Structured output: summarise the last answer in the schema.
+            answer = next(
+                m.content for m in reversed(messages)
+                if isinstance(m, AIMessage) and m.content
+            )
+            return _tool_call(names[0], self._summary(answer))
+        message = self._answer(messages, names)
+        if 'respond' in names and not message.tool_calls:
+            # Single-pass mode: the answer goes through the respond tool.
+            return _tool_call('respond', self._summary(message.content))
+        return message
+
+    def _answer(
+        self,
+        messages: list[BaseMessage],
+        names: list[str]
+    ) -> AIMessage:
+        amount, codes = self._read_request(messages)
+        results = []
+        for message in reversed(messages):
+            if isinstance(message, HumanMessage):
+                break
+            if isinstance(message, ToolMessage):
+                results.insert(0, message)
+        if len(codes) < 2:
+            if results:
+                return AIMessage(content='I could not get the exchange rate.')
+            currency_from = codes[0] if codes else 'USD'
+            return AIMessage(content=(
+                'Could you please specify which currency you would like to '
+                f'convert {amount:g} {currency_from} to?'
+            ))
+        currency_from, targets = codes[0], codes[1:]
+        if not results and len(targets) > 1 and 'get_exchange_rates' in names:
+            return _tool_call('get_exchange_rates', {
+                'currency_from': currency_from,
+                'currencies_to': targets,
+                'amounts': [amount]
+            })
+        if len(results) < len(targets) and not any(
+            m.name == 'get_exchange_rates' for m in results
+        ):
+            # One pair per call, as without the batch tool.
+            return _tool_call('get_exchange_rate', {
+                'currency_from': currency_from,
+                'currency_to': targets[len(results)],
+                'currency_date': 'latest'
+            })
+        converted = []
+        for message in results:
+            try:
+                data = json.loads(message.content)
+                if 'conversions' in data:
+                    rates = {c['currency_to']: c['rate'] for c in data['conversions']}
+                else:
+                    rates = data['rates']
+            except (ValueError, KeyError, TypeError):
+                return AIMessage(content='I could not get the exchange rate.')
+            converted += [
+                f'{round(amount * rate, 2):g} {code}' for code, rate in rates.items()
+            ]
+        if not converted:
+            return AIMessage(content='I could not get the exchange rate.')
+        return AIMessage(
+            content=f'{amount:g} {currency_from} is {", ".join(converted)}.'
+        )
+
+    @staticmethod
+    def _summary(answer: str) -> dict:
+        status = 'input_required' if answer.endswith('?') else 'complete'
+        return {'status': status, 'message': answer}
+
+    @staticmethod
+    def _read_request(messages: list[BaseMessage]) -> tuple[float, list[str]]:
+        """Amount and currency codes mentioned by the user, oldest first"""
+        amount = 1.0
+        codes: list[str] = []
+        for message in messages:
+            if not isinstance(message, HumanMessage):
+                continue
+            if match := AMOUNT_PATTERN.search(message.content):
+                amount = float(match.group())
+                codes = []
+            codes.extend(CODE_PATTERN.findall(message.content))
+        return amount, codes
@@ -0,0 +1,140 @@
+import math
+import re
+from collections.abc import AsyncIterable
+from dataclasses import dataclass
+
+from agent import get_exchange_rate
+from metrics import METRICS, Metrics
+
+# Currencies quoted by the rates API. Anything else goes to the LLM.
+CURRENCY_CODES = frozenset((
+    'AUD', 'BGN', 'BRL', 'CAD', 'CHF', 'CNY', 'CZK', 'DKK', 'EUR', 'GBP',
+    'HKD', 'HUF', 'IDR', 'ILS', 'INR', 'ISK', 'JPY', 'KRW', 'MXN', 'MYR',
+    'NOK', 'NZD', 'PHP', 'PLN', 'RON', 'SEK', 'SGD', 'THB', 'TRY', 'USD',
+    'ZAR'
+))
+QUERY_PATTERN = re.compile(
+    r'^\s*(?:(?:how much|what)\s+(?:is|are)\s+|convert\s+)?'
+    r'(?P<amount>\d{1,3}(?:,\d{3})+(?:\.\d+)?|\d+(?:\.\d+)?)\s*'
+    r'(?P<from>[a-z]{3})\s+(?:in|to|into)\s+(?P<to>[a-z]{3})'
+    r'(?:\s+(?:on|as of)\s+(?P<date>\d{4}-\d{2}-\d{2}))?'
+    r'\s*[?.!]?\s*$',
+    re.IGNORECASE
+)
+
+
+@dataclass(frozen=True)
+class ConversionQuery:
+    amount: float
+    currency_from: str
+    currency_to: str
+    currency_date: str = 'latest'
+
+
+def parse_conversion_query(query: str) -> ConversionQuery | None:
+    """Parses "<amount> <from> in <to> [on <date>]" style questions
+
+    Returns None unless the whole query matches and both currencies are
+    supported, so anything ambiguous is left to the LLM.
+    """
+    match = QUERY_PATTERN.match(query)
+    if not match:
+        return None
+    currency_from = match['from'].upper()
+    currency_to = match['to'].upper()
+    if (
+        currency_from not in CURRENCY_CODES
+        or currency_to not in CURRENCY_CODES
+    ):
+        return None
+    return ConversionQuery(
+        amount=float(match['amount'].replace(',', '')),
+        currency_from=currency_from,
+        currency_to=currency_to,
+        currency_date=match['date'] or 'latest'
+    )
+
+
+def format_amount(value: float) -> str:
+    """Two decimals, or four significant digits below 1, so that 1 JPY in
+    GBP is 0.00491 rather than 0"""
+    if value == 0 or abs(value) >= 1:
+        decimals = 2
+    else:
+        decimals = 3 - math.floor(math.log10(abs(value)))
+    return f'{value:,.{decimals}f}'.rstrip('0').rstrip('.')
+
+
+class FastPath:
+    """Answers well-formed conversion queries without calling the LLM
+
+    The answer is computed through the `get_exchange_rate` tool and replayed
+    as the same items `CurrencyAgent.stream` yields, so the executor emits
+    identical A2A events for both paths.
+    """
+    def __init__(self, metrics: Metrics = METRICS):
+        self.seen = 0
+        self.handled = 0
+        metrics.gauge('fast_path_seen', lambda: self.seen,
+                      'Requests offered to the fast path.')
+        metrics.gauge('fast_path_handled', lambda: self.handled,
+                      'Requests answered by the fast path, without the model.')
+        metrics.gauge('fast_path_handled_ratio', lambda: self.handled_ratio,
+                      'Share of requests answered by the fast path.')
+
+    @property
+    def handled_ratio(self) -> float:
+        return self.handled / self.seen if self.seen else 0.0
+
+    async def answer(self, query: str, eligible: bool = True) -> str | None:
+        """Returns the final answer, or None to fall through to the LLM
+
+        Requests that are not `eligible` (follow-up turns, which need the
+        conversation history) are only counted.
+        """
+        self.seen += 1
+        if not eligible:
+            return None
+        conversion = parse_conversion_query(query)
+        if conversion is None:
+            return None
+        data = await get_exchange_rate.ainvoke({
+            'currency_from': conversion.currency_from,
+            'currency_to': conversion.currency_to,
+            'currency_date': conversion.currency_date
+        })
+        rate = data.get('rates', {}).get(conversion.currency_to)
+        if rate is None:
+            return None
+        self.handled += 1
+        answer = (
+            f'{format_amount(conversion.amount)} {conversion.currency_from} is '
+            f'{format_amount(conversion.amount * rate)} {conversion.currency_to}'
+        )
+        if conversion.currency_date != 'latest':
+            answer += f' on {data.get("date", conversion.currency_date)}'
+        return answer + '.'
+
+    async def stream(self, answer: str) -> AsyncIterable:
+        yield {
+            'is_task_complete': False,
+            'require_user_input': False,
+            'content': 'Looking up the exchange rates...'
+        }
+        yield {
+            'is_task_complete': False,
+            'require_user_input': False,
+            'content': 'Processing the exchange rates...'
+        }
+        yield {
+            'is_task_complete': True,
+            'require_user_input': False,
+            'content': answer
+        }
+
+    def stats(self) -> dict:
+        return {
+            'seen': self.seen,
+            'handled': self.handled,
+            'handled_ratio': self.handled_ratio
+        }
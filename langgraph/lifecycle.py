@@ -0,0 +1,208 @@
+import asyncio
+import logging
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+from a2a.server.tasks import InMemoryTaskStore
+from a2a.types import Task, TaskState, TaskStatus
+
+from startup import AgentLoader
+
+logger = logging.getLogger(__name__)
+
+TASKS_SNAPSHOT = 'tasks.jsonl'
+CHECKPOINTS_SNAPSHOT = 'checkpoints.db'
+# Command line options that only apply to the process they were given to.
+HANDOFF_OPTIONS = ('--listen-fd', '--handoff-fd')
+# States of tasks that were still running when the snapshot was taken.
+INTERRUPTED_STATES = (TaskState.submitted, TaskState.working)
+
+
+def listen_socket(host: str, port: int, fd: int | None = None) -> socket.socket:
+    """The server's listening socket: inherited as `fd`, or newly bound"""
+    if fd is not None:
+        return socket.socket(fileno=fd)
+    family = socket.AF_INET6 if ':' in host else socket.AF_INET
+    return socket.create_server((host, port), family=family, backlog=2048)
+
+
+def successor_argv(listen_fd: int, handoff_fd: int) -> list[str]:
+    """This process's command line, for a successor taking over its socket"""
+    args = []
+    skip = False
+    for arg in sys.argv[1:]:
+        if skip:
+            skip = False
+        elif arg in HANDOFF_OPTIONS:
+            skip = True
+        elif not arg.startswith(tuple(f'{option}=' for option in HANDOFF_OPTIONS)):
+            args.append(arg)
+    return [
+        sys.executable, os.path.abspath(sys.argv[0]), *args,
+        '--listen-fd', str(listen_fd), '--handoff-fd', str(handoff_fd)
+    ]
+
+
+def save_tasks(store: InMemoryTaskStore, path: str) -> int:
+    """Writes the store's tasks to `path`, one JSON document per line
+
+    Tasks still submitted or working are saved as canceled: the process
+    that ran them is gone.
+    """
+    temporary = f'{path}.tmp'
+    with open(temporary, 'w') as file:
+        for task in store.tasks.values():
+            if task.status.state in INTERRUPTED_STATES:
+                task = task.model_copy(update={
+                    'status': TaskStatus(state=TaskState.canceled)
+                })
+            file.write(task.model_dump_json(exclude_none=True) + '\n')
+    # Readers never see a partial snapshot.
+    os.replace(temporary, path)
+    return len(store.tasks)
+
+
+def restore_tasks(store: InMemoryTaskStore, path: str) -> int:
+    """Loads a snapshot written by `save_tasks`, then removes it"""
+    if not os.path.exists(path):
+        return 0
+    with open(path) as file:
+        for line in file:
+            task = Task.model_validate_json(line)
+            store.tasks[task.id] = task
+    os.remove(path)
+    return len(store.tasks)
+
+
+class Lifecycle:
+    """Graceful shutdown, state snapshots and zero-downtime restarts
+
+    On SIGTERM or SIGINT /ready reports draining, uvicorn stops accepting
+    connections and waits up to `drain_timeout` seconds for the open
+    ones. Requests that made it in are served, not rejected: uvicorn only
+    notices the signal on its next 0.1s tick. `drain` then waits
+    for agent tasks still running within the same deadline and cancels
+    the rest, which marks them canceled and repairs their conversations.
+
+    With a `state_dir`, in-memory tasks are written there on shutdown and
+    read back on startup; conversations are kept in its checkpoint
+    database (see server.py).
+
+    On SIGHUP the process starts a successor that inherits the listening
+    socket (`listen_fd`) and a pipe. The successor loads the agent while
+    this process keeps serving, then sends it SIGTERM. This process
+    drains and snapshots, then closes the pipe; only then does the
+    successor restore the snapshot and start accepting. Connections
+    arriving in between wait in the socket's backlog rather than being
+    refused.
+    """
+    def __init__(
+        self,
+        loader: AgentLoader,
+        task_store,
+        state_dir: str | None = None,
+        drain_timeout: float = 30.0,
+        listen_fd: int | None = None,
+        handoff_fd: int | None = None
+    ):
+        self.loader = loader
+        self.task_store = task_store
+        self.state_dir = state_dir
+        self.drain_timeout = drain_timeout
+        self.listen_fd = listen_fd
+        self.handoff_fd = handoff_fd
+        self.draining_since: float | None = None
+        self.successor: subprocess.Popen | None = None
+        # Write end of the pipe to the successor, closed once our state is saved.
+        self._successor_pipe: int | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        if state_dir:
+            os.makedirs(state_dir, exist_ok=True)
+
+    @property
+    def tasks_path(self) -> str | None:
+        if self.state_dir and isinstance(self.task_store, InMemoryTaskStore):
+            return os.path.join(self.state_dir, TASKS_SNAPSHOT)
+        return None
+
+    def install(self) -> None:
+        """Wraps uvicorn's exit signal handlers. Call from the lifespan,
+        after uvicorn installed them."""
+        self._loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            previous = signal.getsignal(sig)
+            if callable(previous):
+                signal.signal(sig, self._on_exit_signal(previous))
+        if self.listen_fd is not None:
+            signal.signal(signal.SIGHUP, self._on_handoff_signal)
+
+    def _on_exit_signal(self, previous):
+        def handler(sig, frame):
+            self.begin_drain()
+            previous(sig, frame)
+        return handler
+
+    def _on_handoff_signal(self, sig, frame) -> None:
+        self._loop.call_soon_threadsafe(self.hand_off)
+
+    def begin_drain(self) -> None:
+        if self.draining_since is None:
+            self.draining_since = time.monotonic()
+            self.loader.draining = True
+            logger.info('Draining')
+
+    async def restore(self) -> None:
+        """Takes over from the process that handed us its socket, if any,
+        then loads the snapshot"""
+        if self.handoff_fd is not None:
+            started = time.perf_counter()
+            with os.fdopen(self.handoff_fd, 'rb') as pipe:
+                self.handoff_fd = None
+                predecessor = int(pipe.readline())
+                os.kill(predecessor, signal.SIGTERM)
+                # EOF once the predecessor has saved its state.
+                await asyncio.to_thread(pipe.read)
+            logger.info(f'Took over after {time.perf_counter() - started:.3f}s')
+        if self.tasks_path:
+            restored = restore_tasks(self.task_store, self.tasks_path)
+            logger.info(f'Restored {restored} tasks')
+
+    def hand_off(self) -> None:
+        """Starts a successor on our listening socket"""
+        if self.successor is not None or self.draining_since is not None:
+            return
+        read_fd, self._successor_pipe = os.pipe()
+        # The successor sends SIGTERM to this pid once it is ready.
+        os.write(self._successor_pipe, f'{os.getpid()}\n'.encode())
+        self.successor = subprocess.Popen(
+            successor_argv(self.listen_fd, read_fd),
+            pass_fds=(self.listen_fd, read_fd)
+        )
+        os.close(read_fd)
+        logger.info(f'Handing off to process {self.successor.pid}')
+
+    async def drain(self) -> int:
+        """Waits for running agent tasks until the drain deadline, then
+        cancels them; returns how many were cancelled"""
+        self.begin_drain()
+        executor = self.loader.executor
+        if executor is None:
+            return 0
+        remaining = self.draining_since + self.drain_timeout - time.monotonic()
+        cancelled = await executor.drain(max(remaining, 0))
+        if cancelled:
+            logger.warning(f'Cancelled {cancelled} running tasks')
+        return cancelled
+
+    def snapshot(self) -> None:
+        """Saves in-memory tasks and releases a waiting successor"""
+        if self.tasks_path:
+            saved = save_tasks(self.task_store, self.tasks_path)
+            logger.info(f'Saved {saved} tasks')
+        if self._successor_pipe is not None:
+            os.close(self._successor_pipe)
+            self._successor_pipe = None
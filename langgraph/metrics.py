@@ -0,0 +1,243 @@
+import bisect
+import collections
+import time
+from collections.abc import AsyncGenerator, Callable
+
+from a2a.server.apps import A2AStarletteApplication
+from a2a.server.apps.starlette_app import CallContextBuilder, DefaultCallContextBuilder
+from a2a.server.context import ServerCallContext
+from a2a.server.events import EventQueue, InMemoryQueueManager
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages.utils import count_tokens_approximately
+from sse_starlette.sse import EventSourceResponse
+from starlette.requests import Request
+from starlette.responses import Response
+
+# Upper bounds in seconds, from sub-millisecond bookkeeping to model calls.
+BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+)
+
+
+class Histogram:
+    """Fixed-bucket latency histogram"""
+    __slots__ = ('counts', 'sum', 'count')
+
+    def __init__(self):
+        # One slot per bucket plus +Inf, not cumulative.
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds: float) -> None:
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+
+
+class Metrics:
+    """Per-stage latency histograms and task counters of one process
+
+    Stages: parse (JSON-RPC body), context_wait and slot_wait (admission),
+    execute (agent executor), queue (event queue wait), llm, tool,
+    rates_api (one HTTP attempt), push (one webhook attempt), checkpoint,
+    compaction (history) and sse_encode. Gauges are read when rendered.
+    """
+    def __init__(self, namespace: str = 'currency_agent'):
+        self.namespace = namespace
+        self.stages: dict[str, Histogram] = {}
+        self.tasks: dict[str, int] = {}
+        self.gauges: dict[str, tuple[Callable[[], float], str]] = {}
+
+    def observe(self, stage: str, seconds: float) -> None:
+        histogram = self.stages.get(stage)
+        if histogram is None:
+            histogram = self.stages[stage] = Histogram()
+        histogram.observe(seconds)
+
+    def time(self, stage: str) -> 'StageTimer':
+        """Context manager recording the duration of its block"""
+        return StageTimer(self, stage)
+
+    def count_task(self, state: str) -> None:
+        self.tasks[state] = self.tasks.get(state, 0) + 1
+
+    def gauge(self, name: str, read: Callable[[], float], help: str) -> None:
+        self.gauges[name] = (read, help)
+
+    def render(self) -> str:
+        """Prometheus text exposition format"""
+        name = f'{self.namespace}_stage_seconds'
+        lines = [
+            f'# HELP {name} Time spent per request stage.',
+            f'# TYPE {name} histogram',
+        ]
+        for stage, histogram in sorted(self.stages.items()):
+            cumulative = 0
+            for bound, count in zip(BUCKETS, histogram.counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+            lines.append(f'{name}_bucket{{stage="{stage}",le="+Inf"}} {histogram.count}')
+            lines.append(f'{name}_sum{{stage="{stage}"}} {histogram.sum}')
+            lines.append(f'{name}_count{{stage="{stage}"}} {histogram.count}')
+        name = f'{self.namespace}_tasks_total'
+        lines.append(f'# HELP {name} Tasks by final TaskState.')
+        lines.append(f'# TYPE {name} counter')
+        for state, count in sorted(self.tasks.items()):
+            lines.append(f'{name}{{state="{state}"}} {count}')
+        for gauge, (read, help) in sorted(self.gauges.items()):
+            name = f'{self.namespace}_{gauge}'
+            lines.append(f'# HELP {name} {help}')
+            lines.append(f'# TYPE {name} gauge')
+            lines.append(f'{name} {read()}')
+        return '\n'.join(lines) + '\n'
+
+
+class StageTimer:
+    # A plain class: cheaper to enter than a generator context manager.
+    __slots__ = ('metrics', 'stage', 'started')
+
+    def __init__(self, metrics: Metrics, stage: str):
+        self.metrics = metrics
+        self.stage = stage
+
+    def __enter__(self) -> None:
+        self.started = time.perf_counter()
+
+    def __exit__(self, *exc_info) -> None:
+        self.metrics.observe(self.stage, time.perf_counter() - self.started)
+
+
+METRICS = Metrics()
+
+
+async def metrics_endpoint(request: Request) -> Response:
+    return Response(
+        METRICS.render(),
+        media_type='text/plain; version=0.0.4; charset=utf-8'
+    )
+
+
+class ModelTimer(BaseCallbackHandler):
+    """Records the duration of every chat model call as the llm stage"""
+    run_inline = True
+    ignore_chain = True
+    ignore_agent = True
+    ignore_retriever = True
+    ignore_retry = True
+    ignore_custom_event = True
+
+    def __init__(self, metrics: Metrics = METRICS):
+        self.metrics = metrics
+        self._started: dict = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs) -> None:
+        self._started[run_id] = time.perf_counter()
+
+    def on_llm_end(self, response, *, run_id, **kwargs) -> None:
+        self._finish(run_id)
+
+    def on_llm_error(self, error, *, run_id, **kwargs) -> None:
+        self._finish(run_id)
+
+    def _finish(self, run_id) -> None:
+        started = self._started.pop(run_id, None)
+        if started is not None:
+            self.metrics.observe('llm', time.perf_counter() - started)
+
+
+class ModelCallCounter(BaseCallbackHandler):
+    """Counts the chat model calls of one request and their prompt tokens"""
+    run_inline = True
+    ignore_chain = True
+    ignore_agent = True
+    ignore_retriever = True
+    ignore_retry = True
+    ignore_custom_event = True
+
+    def __init__(self):
+        self.calls = 0
+        self.prompt_tokens = 0
+
+    def on_chat_model_start(self, serialized, messages, **kwargs) -> None:
+        self.calls += 1
+        # Approximate: about 4 characters per token, tools not included.
+        self.prompt_tokens += sum(count_tokens_approximately(m) for m in messages)
+
+
+class TimedEventQueue(EventQueue):
+    """EventQueue that records how long each event waits to be dequeued"""
+    def __init__(self, metrics: Metrics = METRICS):
+        super().__init__()
+        self.metrics = metrics
+        # Enqueue times, in the same FIFO order as the events.
+        self._enqueued_at: collections.deque[float] = collections.deque()
+
+    def enqueue_event(self, event) -> None:
+        if not self.is_closed():
+            self._enqueued_at.append(time.perf_counter())
+        super().enqueue_event(event)
+
+    async def dequeue_event(self, no_wait: bool = False):
+        event = await super().dequeue_event(no_wait)
+        if self._enqueued_at:
+            self.metrics.observe(
+                'queue', time.perf_counter() - self._enqueued_at.popleft()
+            )
+        return event
+
+    def tap(self) -> EventQueue:
+        queue = TimedEventQueue(self.metrics)
+        self._children.append(queue)
+        return queue
+
+
+class TimedQueueManager(InMemoryQueueManager):
+    """InMemoryQueueManager handing out TimedEventQueues"""
+    async def create_or_tap(self, task_id: str) -> EventQueue:
+        async with self._lock:
+            if task_id not in self._task_queue:
+                queue = TimedEventQueue()
+                self._task_queue[task_id] = queue
+                return queue
+            return self._task_queue[task_id].tap()
+
+
+class TimedCallContextBuilder(CallContextBuilder):
+    """Records the parse stage: the SDK builds the call context right after
+    reading and validating the JSON-RPC body"""
+    def __init__(self, builder: CallContextBuilder | None = None):
+        self.builder = builder or DefaultCallContextBuilder()
+
+    def build(self, request: Request) -> ServerCallContext:
+        started = getattr(request.state, 'started', None)
+        if started is not None:
+            METRICS.observe('parse', time.perf_counter() - started)
+        return self.builder.build(request)
+
+
+class InstrumentedA2AApplication(A2AStarletteApplication):
+    """A2AStarletteApplication timing request parsing and SSE encoding"""
+    def __init__(self, *args, **kwargs):
+        kwargs['context_builder'] = TimedCallContextBuilder(
+            kwargs.get('context_builder')
+        )
+        super().__init__(*args, **kwargs)
+
+    async def _handle_requests(self, request: Request) -> Response:
+        request.state.started = time.perf_counter()
+        return await super()._handle_requests(request)
+
+    def _create_response(self, handler_result) -> Response:
+        if not isinstance(handler_result, AsyncGenerator):
+            return super()._create_response(handler_result)
+
+        async def event_generator(stream):
+            async for item in stream:
+                started = time.perf_counter()
+                data = item.root.model_dump_json(exclude_none=True)
+                METRICS.observe('sse_encode', time.perf_counter() - started)
+                yield {'data': data}
+
+        return EventSourceResponse(event_generator(handler_result))
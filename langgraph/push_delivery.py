@@ -0,0 +1,235 @@
+import asyncio
+import collections
+import contextlib
+import logging
+import random
+import time
+
+import httpx
+from a2a.server.tasks import InMemoryPushNotifier
+from a2a.types import PushNotificationConfig, Task
+
+from metrics import METRICS, Metrics
+
+logger = logging.getLogger(__name__)
+
+# Answers worth retrying; other 4xx mean the request itself is refused.
+RETRY_STATUSES = {408, 425, 429}
+TOKEN_HEADER = 'X-A2A-Notification-Token'
+
+
+class Delivery:
+    """The latest state of one task waiting to be pushed"""
+    __slots__ = ('task_id', 'config', 'payload', 'attempts', 'busy', 'dirty')
+
+    def __init__(self, task_id: str, config: PushNotificationConfig, payload: dict):
+        self.task_id = task_id
+        self.config = config
+        self.payload = payload
+        self.attempts = 0
+        # Being sent or waiting to be retried; queued otherwise.
+        self.busy = False
+        # Superseded by a newer state while busy.
+        self.dirty = False
+
+
+class Endpoint:
+    """Deliveries in flight to one webhook URL, and those waiting for it"""
+    __slots__ = ('active', 'backlog')
+
+    def __init__(self):
+        self.active = 0
+        self.backlog: collections.deque[Delivery] = collections.deque()
+
+
+class QueuedPushNotifier(InMemoryPushNotifier):
+    """Push notifier that delivers from a queue, off the request path
+
+    `send_notification` only records the task's latest state and returns;
+    `workers` tasks post it to the webhook. Updates of a task that arrive
+    before its previous one was sent replace it, so a subscriber gets the
+    latest state rather than every intermediate one, and a task's states
+    are never delivered out of order. At most `per_endpoint` deliveries
+    are in flight to one URL, the others wait without holding a worker.
+
+    Failed deliveries are retried with exponential backoff, up to
+    `max_attempts` in total; then, or when more than `max_pending` tasks
+    wait, the notification is recorded as a dead letter and dropped.
+    """
+    def __init__(
+        self,
+        httpx_client: httpx.AsyncClient,
+        workers: int = 4,
+        max_pending: int = 1000,
+        per_endpoint: int = 2,
+        max_attempts: int = 4,
+        backoff: float = 0.5,
+        max_backoff: float = 10.0,
+        dead_letters: int = 100,
+        metrics: Metrics = METRICS
+    ):
+        super().__init__(httpx_client)
+        self.workers = workers
+        self.max_pending = max_pending
+        self.per_endpoint = per_endpoint
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.metrics = metrics
+        self.dead_letters: collections.deque[dict] = collections.deque(maxlen=dead_letters)
+        self.delivered = 0
+        self.coalesced = 0
+        self.retried = 0
+        self.failed = 0
+        self._deliveries: dict[str, Delivery] = {}
+        self._endpoints: dict[str, Endpoint] = {}
+        self._queue: asyncio.Queue[Delivery] = asyncio.Queue()
+        self._workers: list[asyncio.Task] = []
+        self._retries: dict[str, asyncio.TimerHandle] = {}
+        metrics.gauge('push_pending', lambda: len(self._deliveries),
+                      'Tasks with a push notification not yet delivered.')
+        metrics.gauge('push_delivered', lambda: self.delivered,
+                      'Push notifications delivered.')
+        metrics.gauge('push_coalesced', lambda: self.coalesced,
+                      'Task updates merged into a pending push notification.')
+        metrics.gauge('push_failed', lambda: self.failed,
+                      'Push notifications given up on (dead letters).')
+
+    def start(self) -> None:
+        self._workers = [
+            asyncio.create_task(self._work()) for _ in range(self.workers)
+        ]
+
+    async def aclose(self, drain_timeout: float = 5.0) -> None:
+        """Waits up to `drain_timeout` seconds for queued deliveries"""
+        deadline = time.monotonic() + drain_timeout
+        while self._deliveries and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        for handle in self._retries.values():
+            handle.cancel()
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        if self._deliveries:
+            logger.warning(f'{len(self._deliveries)} push notifications not delivered')
+
+    async def send_notification(self, task: Task):
+        """Queues the task's current state for delivery; never waits for it"""
+        config = await self.get_info(task.id)
+        if not config:
+            return
+        payload = task.model_dump(mode='json', exclude_none=True)
+        delivery = self._deliveries.get(task.id)
+        if delivery is not None:
+            self.coalesced += 1
+            delivery.config = config
+            delivery.payload = payload
+            if delivery.busy:
+                delivery.dirty = True
+            return
+        if len(self._deliveries) >= self.max_pending:
+            self._dead_letter(Delivery(task.id, config, payload), 'queue full')
+            return
+        delivery = self._deliveries[task.id] = Delivery(task.id, config, payload)
+        self._queue.put_nowait(delivery)
+
+    async def _work(self) -> None:
+        while True:
+            delivery = await self._queue.get()
+            endpoint = self._endpoints.get(delivery.config.url)
+            if endpoint is None:
+                endpoint = self._endpoints[delivery.config.url] = Endpoint()
+            if endpoint.active >= self.per_endpoint:
+                endpoint.backlog.append(delivery)
+                continue
+            endpoint.active += 1
+            try:
+                await self._deliver(delivery)
+            finally:
+                endpoint.active -= 1
+                if endpoint.backlog:
+                    self._queue.put_nowait(endpoint.backlog.popleft())
+                elif not endpoint.active:
+                    del self._endpoints[delivery.config.url]
+
+    async def _deliver(self, delivery: Delivery) -> None:
+        delivery.busy = True
+        delivery.dirty = False
+        delivery.attempts += 1
+        payload = delivery.payload
+        headers = {TOKEN_HEADER: delivery.config.token} if delivery.config.token else None
+        retry_after = None
+        try:
+            with self.metrics.time('push'):
+                response = await self._client.post(
+                    delivery.config.url, json=payload, headers=headers
+                )
+            if response.status_code < 400:
+                self.delivered += 1
+                self._next(delivery)
+                return
+            error = f'HTTP {response.status_code}'
+            retryable = response.status_code >= 500 or response.status_code in RETRY_STATUSES
+            with contextlib.suppress(ValueError):
+                retry_after = float(response.headers.get('Retry-After', ''))
+        except httpx.HTTPError as e:
+            error = f'{type(e).__name__}: {e}'
+            retryable = True
+        except Exception as e:
+            # An unusable URL, say: retrying will not help.
+            error = f'{type(e).__name__}: {e}'
+            retryable = False
+        if not retryable or delivery.attempts >= self.max_attempts:
+            self._dead_letter(delivery, error, payload)
+            self._next(delivery)
+            return
+        self.retried += 1
+        delay = min(
+            retry_after or self.backoff * 2 ** (delivery.attempts - 1) * random.uniform(0.5, 1.0),
+            self.max_backoff
+        )
+        # Stays busy while waiting, so newer states wait for the retry,
+        # which then sends the latest one.
+        self._retries[delivery.task_id] = asyncio.get_running_loop().call_later(
+            delay, self._retry, delivery
+        )
+
+    def _retry(self, delivery: Delivery) -> None:
+        del self._retries[delivery.task_id]
+        delivery.busy = False
+        self._queue.put_nowait(delivery)
+
+    def _next(self, delivery: Delivery) -> None:
+        """Queues the state that arrived while `delivery` was being sent"""
+        delivery.busy = False
+        if delivery.dirty:
+            delivery.dirty = False
+            delivery.attempts = 0
+            self._queue.put_nowait(delivery)
+        else:
+            del self._deliveries[delivery.task_id]
+
+    def _dead_letter(self, delivery: Delivery, error: str, payload: dict | None = None) -> None:
+        payload = payload or delivery.payload
+        self.failed += 1
+        self.dead_letters.append({
+            'task_id': delivery.task_id,
+            'url': delivery.config.url,
+            'state': payload.get('status', {}).get('state'),
+            'attempts': delivery.attempts,
+            'error': error,
+            'at': time.time(),
+        })
+        logger.warning(
+            f'Push notification for task {delivery.task_id} to '
+            f'{delivery.config.url} dropped: {error}'
+        )
+
+    def stats(self) -> dict:
+        return {
+            'pending': len(self._deliveries),
+            'delivered': self.delivered,
+            'coalesced': self.coalesced,
+            'retried': self.retried,
+            'failed': self.failed,
+        }
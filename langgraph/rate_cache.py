@@ -0,0 +1,136 @@
+import asyncio
+import datetime
+import time
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+
+def utc_today() -> datetime.date:
+    """Today in UTC, the day every cache tells closed days by"""
+    return datetime.datetime.now(datetime.timezone.utc).date()
+
+
+class RateCache:
+    """LRU cache for exchange rate lookups
+
+    Keys are tuples whose last element is the rate date. Entries for
+    'latest' (or for a date that has not closed yet) expire after
+    `latest_ttl` seconds. Historical rates never change, so they are kept
+    until LRU eviction. Concurrent misses for the same key are coalesced
+    into a single upstream request.
+    """
+    def __init__(self, max_entries: int = 1024, latest_ttl: float = 300.0):
+        self.max_entries = max_entries
+        self.latest_ttl = latest_ttl
+        self._entries: OrderedDict[tuple, tuple[float | None, Any]] = OrderedDict()
+        self._inflight: dict[tuple, asyncio.Future] = {}
+        self._waiters: dict[tuple, int] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    async def get_or_fetch(
+        self,
+        key: tuple,
+        fetch: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        """Returns the cached value for `key`, calling `fetch` on a miss.
+
+        Exceptions raised by `fetch` are propagated to every waiter and
+        nothing is cached. The fetch is cancelled once all of its waiters
+        have been cancelled.
+        """
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at is None or expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._entries[key]
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.coalesced += 1
+            return await self._wait(key, inflight)
+
+        self.misses += 1
+        inflight = asyncio.ensure_future(self._fetch(key, fetch))
+        # The fetch outlives a cancelled waiter, so make sure a failure
+        # nobody is waiting for does not get reported as unretrieved.
+        inflight.add_done_callback(
+            lambda future: future.cancelled() or future.exception()
+        )
+        self._inflight[key] = inflight
+        return await self._wait(key, inflight)
+
+    async def _wait(self, key: tuple, inflight: asyncio.Future) -> Any:
+        self._waiters[key] = self._waiters.get(key, 0) + 1
+        try:
+            return await asyncio.shield(inflight)
+        finally:
+            self._waiters[key] -= 1
+            if not self._waiters[key]:
+                del self._waiters[key]
+                # Every waiter was cancelled: abort the upstream request.
+                # Unlisted first, so a caller arriving before the
+                # cancellation is delivered starts a new fetch rather than
+                # joining the cancelled one.
+                if not inflight.done():
+                    if self._inflight.get(key) is inflight:
+                        del self._inflight[key]
+                    inflight.cancel()
+
+    async def _fetch(self, key: tuple, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        try:
+            value = await fetch()
+        finally:
+            # Unless `_wait` already replaced it with a newer fetch
+            if self._inflight.get(key) is asyncio.current_task():
+                del self._inflight[key]
+        self.put(key, value)
+        return value
+
+    def put(self, key: tuple, value: Any) -> None:
+        if self.max_entries <= 0:
+            return
+        expires_at = None
+        if not self.is_historical(key[-1]):
+            expires_at = time.monotonic() + self.latest_ttl
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def expires_at(self, key: tuple) -> float | None:
+        """Expiry (time.monotonic) of the live entry for `key`, or None"""
+        entry = self._entries.get(key)
+        if entry is None or entry[0] is None or entry[0] <= time.monotonic():
+            return None
+        return entry[0]
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    @staticmethod
+    def is_historical(currency_date: str) -> bool:
+        """A date is historical once it is strictly before today (UTC)."""
+        try:
+            date = datetime.date.fromisoformat(currency_date)
+        except ValueError:
+            return False
+        return date < utc_today()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'coalesced': self.coalesced,
+            'evictions': self.evictions,
+            'size': len(self._entries),
+            'hit_ratio': (self.hits + self.coalesced) / lookups if lookups else 0.0
+        }
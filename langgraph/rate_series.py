@@ -0,0 +1,190 @@
+import asyncio
+import datetime
+
+import numpy as np
+
+from rate_cache import utc_today
+from rate_table import CURRENCY_INDEX, currency_slot, significant
+from rates_client import RatesClient
+
+# First day of euro reference rates; row 0 of the store.
+EPOCH = datetime.date(1999, 1, 4)
+# Days per range request. Gaps are split into chunks fetched concurrently.
+RANGE_CHUNK_DAYS = 90
+
+
+def parse_date(value: str) -> datetime.date:
+    """Raises ValueError for anything but YYYY-MM-DD"""
+    return datetime.date.fromisoformat(value.strip())
+
+
+class RateSeries:
+    """Daily rates against `base` for every currency, in one NumPy array
+
+    Row `i` holds the rates of day `EPOCH + i`, in the columns of
+    `CURRENCY_INDEX`; days without rates (weekends, holidays) are NaN.
+    Missing date ranges are fetched in bulk from the API's range endpoint
+    and kept, so a summary over any range already seen is computed from
+    memory. Days before today are final once fetched; today's row is
+    fetched again until the day is over.
+    """
+    def __init__(self, client: RatesClient, base: str = 'EUR'):
+        self.client = client
+        self.base = base
+        self.values = np.full((0, 0), np.nan)
+        # Days whose rates, or lack of them, are known.
+        self.known = np.zeros(0, dtype=bool)
+        self.fetches = 0
+        self._lock = asyncio.Lock()
+
+    @property
+    def nbytes(self) -> int:
+        return self.values.nbytes + self.known.nbytes
+
+    def _row(self, day: datetime.date) -> int:
+        return (day - EPOCH).days
+
+    def _grow(self, rows: int) -> None:
+        columns = len(CURRENCY_INDEX)
+        if rows <= self.values.shape[0] and columns <= self.values.shape[1]:
+            return
+        # Doubling rows keeps repeated growth amortised.
+        rows = max(rows, min(2 * self.values.shape[0], self._row(utc_today()) + 1))
+        values = np.full((rows, max(columns, self.values.shape[1])), np.nan)
+        values[:self.values.shape[0], :self.values.shape[1]] = self.values
+        known = np.zeros(rows, dtype=bool)
+        known[:self.known.shape[0]] = self.known
+        self.values, self.known = values, known
+
+    def _gaps(self, start: int, end: int) -> list[tuple[int, int]]:
+        """Unknown row ranges within [start, end], in chunks"""
+        known = np.zeros(end - start + 1, dtype=bool)
+        stored = self.known[start:end + 1]
+        known[:len(stored)] = stored
+        # Edges of runs of unknown days
+        edges = np.flatnonzero(np.diff(np.concatenate(([1], known.astype(np.int8), [1]))))
+        gaps = []
+        for first, stop in zip(edges[::2].tolist(), edges[1::2].tolist()):
+            for chunk in range(first, stop, RANGE_CHUNK_DAYS):
+                gaps.append((start + chunk, start + min(chunk + RANGE_CHUNK_DAYS, stop) - 1))
+        return gaps
+
+    async def ensure(self, start: datetime.date, end: datetime.date) -> None:
+        """Fetches the days of [start, end] that are not stored yet"""
+        first, last = self._row(start), self._row(end)
+        if not self._gaps(first, last):
+            return
+        async with self._lock:
+            self._grow(last + 1)
+            gaps = self._gaps(first, last)
+            results = await asyncio.gather(
+                *(self._fetch(gap_start, gap_end) for gap_start, gap_end in gaps)
+            )
+            today = self._row(utc_today())
+            for (gap_start, gap_end), rates in zip(gaps, results):
+                self._store(rates)
+                # Today's rates may not be published yet.
+                self.known[gap_start:min(gap_end, today - 1) + 1] = True
+
+    async def _fetch(self, first: int, last: int) -> dict[str, dict[str, float]]:
+        start = EPOCH + datetime.timedelta(days=first)
+        end = EPOCH + datetime.timedelta(days=last)
+        self.fetches += 1
+        data = await self.client.get_json(
+            f'{start.isoformat()}..{end.isoformat()}',
+            params={'from': self.base}
+        )
+        if not isinstance(data.get('rates'), dict):
+            raise LookupError('Invalid API response format')
+        return data['rates']
+
+    def _store(self, rates: dict[str, dict[str, float]]) -> None:
+        for day_rates in rates.values():
+            for code in day_rates:
+                currency_slot(code)
+        currency_slot(self.base)
+        last = max((self._row(parse_date(day)) for day in rates), default=-1)
+        self._grow(last + 1)
+        base = CURRENCY_INDEX[self.base]
+        for day, day_rates in rates.items():
+            row = self._row(parse_date(day))
+            columns = [CURRENCY_INDEX[code] for code in day_rates]
+            self.values[row, columns] = list(day_rates.values())
+            self.values[row, base] = 1.0
+
+    def summarize(
+        self,
+        currency_from: str,
+        currencies_to: list[str],
+        start: datetime.date,
+        end: datetime.date
+    ) -> dict:
+        """min, max, mean, first, last and percent change of each pair
+        over [start, end], from the stored rates
+
+        Raises:
+            LookupError: If `currency_from` has no rates in the range.
+        """
+        first, last = self._row(start), self._row(end) + 1
+        block = self.values[first:last]
+        slot_from = CURRENCY_INDEX.get(currency_from)
+        if slot_from is None or slot_from >= block.shape[1]:
+            raise LookupError(f'Unsupported currency: {currency_from}')
+        if np.isnan(block[:, slot_from]).all():
+            raise LookupError(f'No rates for {currency_from} in this range')
+        slots = [CURRENCY_INDEX.get(code, -1) for code in currencies_to]
+        supported = [
+            index for index, slot in enumerate(slots) if 0 <= slot < block.shape[1]
+        ]
+        # Cross rates, one column per target currency, NaN where unquoted
+        cross = (
+            block[:, [slots[index] for index in supported]]
+            / block[:, slot_from, np.newaxis]
+        )
+        valid = ~np.isnan(cross)
+        counts = valid.sum(axis=0)
+        filled_low = np.where(valid, cross, np.inf)
+        filled_high = np.where(valid, cross, -np.inf)
+        low_rows, high_rows = filled_low.argmin(axis=0), filled_high.argmax(axis=0)
+        first_rows = valid.argmax(axis=0)
+        last_rows = len(cross) - 1 - valid[::-1].argmax(axis=0)
+        sums = np.where(valid, cross, 0.0).sum(axis=0)
+
+        def point(row: int, column: int) -> dict:
+            return {
+                'date': (start + datetime.timedelta(days=int(row))).isoformat(),
+                'rate': significant(float(cross[row, column])),
+            }
+
+        series, errors = {}, []
+        for column, index in enumerate(supported):
+            if not counts[column]:
+                errors.append({
+                    'currency_to': currencies_to[index],
+                    'error': 'No rates in this range'
+                })
+                continue
+            opening = cross[first_rows[column], column]
+            closing = cross[last_rows[column], column]
+            series[currencies_to[index]] = {
+                'observations': int(counts[column]),
+                'min': point(low_rows[column], column),
+                'max': point(high_rows[column], column),
+                'mean': significant(float(sums[column] / counts[column])),
+                'first': point(first_rows[column], column),
+                'last': point(last_rows[column], column),
+                'change_pct': round(float((closing / opening - 1) * 100), 3),
+            }
+        for index, slot in enumerate(slots):
+            if not 0 <= slot < block.shape[1]:
+                errors.append({
+                    'currency_to': currencies_to[index],
+                    'error': f'Unsupported currency: {currencies_to[index]}'
+                })
+        return {
+            'base': currency_from,
+            'start_date': start.isoformat(),
+            'end_date': end.isoformat(),
+            'series': series,
+            'errors': errors,
+        }
@@ -0,0 +1,212 @@
+import asyncio
+import contextlib
+import logging
+import math
+from array import array
+
+import httpx
+
+from rate_cache import RateCache
+from rates_client import RatesClient
+
+logger = logging.getLogger(__name__)
+
+# Slot of every currency code seen so far. Shared by all tables so a rate
+# lookup is one dict access and one array index.
+CURRENCY_INDEX: dict[str, int] = {}
+
+
+def significant(rate: float) -> float:
+    """`rate` to six significant digits. Six decimals would leave one or
+    two digits of weak currencies' rates (IDR -> USD is about 6e-05)."""
+    return float(f'{rate:.6g}')
+
+
+def currency_slot(code: str) -> int:
+    slot = CURRENCY_INDEX.get(code)
+    if slot is None:
+        slot = CURRENCY_INDEX[code] = len(CURRENCY_INDEX)
+    return slot
+
+
+class DailyRates:
+    """Every rate for one date against a single base currency
+
+    Rates are stored in an `array('d')` indexed by `CURRENCY_INDEX`, with
+    NaN for currencies the upstream did not quote on that date.
+    """
+    __slots__ = ('date', 'base', 'values')
+
+    def __init__(self, date: str, base: str, rates: dict[str, float]):
+        self.date = date
+        self.base = base
+        rates = {**rates, base: 1.0}
+        for code in rates:
+            currency_slot(code)
+        self.values = array('d', [math.nan]) * len(CURRENCY_INDEX)
+        for code, rate in rates.items():
+            self.values[CURRENCY_INDEX[code]] = rate
+
+    def get(self, code: str) -> float:
+        slot = CURRENCY_INDEX.get(code)
+        if slot is None or slot >= len(self.values):
+            return math.nan
+        return self.values[slot]
+
+    def cross_rate(self, currency_from: str, currency_to: str) -> float:
+        """rate(from -> to) = rate(base -> to) / rate(base -> from)
+
+        Raises:
+            LookupError: If either currency is not quoted on this date.
+        """
+        rate_from = self.get(currency_from)
+        rate_to = self.get(currency_to)
+        for code, rate in ((currency_from, rate_from), (currency_to, rate_to)):
+            if math.isnan(rate):
+                raise LookupError(f'Unsupported currency: {code}')
+        return rate_to / rate_from
+
+    def currencies(self) -> list[str]:
+        return [
+            code for code, slot in CURRENCY_INDEX.items()
+            if slot < len(self.values) and not math.isnan(self.values[slot])
+        ]
+
+
+class RateTable:
+    """Answers any currency pair from one bulk rate table per date
+
+    The full table against `base` is fetched once per date through the
+    shared `RateCache`, so upstream calls grow with the number of distinct
+    dates rather than the number of questions. Once `start` is called the
+    'latest' table is refreshed in the background before it expires.
+    """
+    def __init__(
+        self,
+        client: RatesClient,
+        cache: RateCache,
+        base: str = 'EUR'
+    ):
+        self.client = client
+        self.cache = cache
+        self.base = base
+        self._refresher: asyncio.Task | None = None
+
+    async def get_rates(self, currency_date: str = 'latest') -> DailyRates:
+        return await self.cache.get_or_fetch(
+            (self.base, currency_date),
+            lambda: self._fetch(currency_date)
+        )
+
+    def latest_expiry(self) -> float | None:
+        """When the cached latest table expires, None if there is none"""
+        return self.cache.expires_at((self.base, 'latest'))
+
+    async def get_exchange_rate(
+        self,
+        currency_from: str,
+        currency_to: str,
+        currency_date: str = 'latest'
+    ) -> dict:
+        """Returns the rate in the same shape as the upstream API"""
+        rates = await self.get_rates(currency_date)
+        rate = rates.cross_rate(currency_from, currency_to)
+        return {
+            'amount': 1.0,
+            'base': currency_from,
+            'date': rates.date,
+            'rates': {currency_to: significant(rate)}
+        }
+
+    async def convert_many(
+        self,
+        currency_from: str,
+        currencies_to: list[str],
+        amounts: list[float],
+        currency_dates: list[str]
+    ) -> dict:
+        """Converts every amount into every target currency on every date
+
+        The tables of the distinct dates are fetched concurrently; each one
+        answers all pairs of its date. Failed dates and unsupported
+        currencies are reported in `errors` next to the other conversions.
+        """
+        dates = list(dict.fromkeys(currency_dates))
+        tables = await asyncio.gather(
+            *(self.get_rates(currency_date) for currency_date in dates),
+            return_exceptions=True
+        )
+        conversions = []
+        errors = []
+        for currency_date, rates in zip(dates, tables):
+            if isinstance(rates, BaseException):
+                errors.append({
+                    'date': currency_date,
+                    'error': self._describe(rates)
+                })
+                continue
+            for currency_to in currencies_to:
+                try:
+                    rate = rates.cross_rate(currency_from, currency_to)
+                except LookupError as e:
+                    errors.append({
+                        'date': currency_date,
+                        'currency_to': currency_to,
+                        'error': str(e)
+                    })
+                    continue
+                for amount in amounts:
+                    conversions.append({
+                        'amount': amount,
+                        'currency_from': currency_from,
+                        'currency_to': currency_to,
+                        'date': rates.date,
+                        'rate': significant(rate),
+                        'converted': round(amount * rate, 2)
+                    })
+        return {'conversions': conversions, 'errors': errors}
+
+    @staticmethod
+    def _describe(error: BaseException) -> str:
+        if isinstance(error, httpx.HTTPError):
+            return f'API request failed: {error}'
+        if isinstance(error, LookupError):
+            return str(error)
+        if isinstance(error, ValueError):
+            return 'Invalid JSON response from API'
+        # Cancellation and anything unexpected propagate.
+        raise error
+
+    async def _fetch(self, currency_date: str) -> DailyRates:
+        data = await self.client.get_json(
+            currency_date,
+            params={'from': self.base}
+        )
+        if 'rates' not in data:
+            raise LookupError('Invalid API response format')
+        return DailyRates(
+            data.get('date', currency_date),
+            data.get('base', self.base),
+            data['rates']
+        )
+
+    def start(self) -> None:
+        if self._refresher is None:
+            self._refresher = asyncio.create_task(self._refresh_latest())
+
+    async def _refresh_latest(self) -> None:
+        key = (self.base, 'latest')
+        while True:
+            try:
+                self.cache.put(key, await self._fetch('latest'))
+            except Exception as e:
+                logger.warning(f'Refreshing the latest rate table failed: {e}')
+            # Refresh ahead of expiry so lookups never wait on upstream.
+            await asyncio.sleep(max(self.cache.latest_ttl * 0.9, 1.0))
+
+    async def aclose(self) -> None:
+        if self._refresher is not None:
+            self._refresher.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._refresher
+            self._refresher = None
@@ -0,0 +1,126 @@
+import asyncio
+import random
+from typing import Any
+
+import httpx
+
+from metrics import METRICS
+
+RETRYABLE_STATUS_CODES = {429, 502, 503, 504}
+
+
+class RetryBudget:
+    """Token bucket that caps retries to a fraction of all requests
+
+    Every request deposits `ratio` tokens and every retry withdraws one, so
+    a struggling upstream sees at most `ratio` extra load instead of a
+    retry storm. `max_tokens` is also the initial balance, which lets a
+    quiet client retry occasional failures.
+    """
+    def __init__(self, ratio: float = 0.1, max_tokens: float = 10.0):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self._tokens = max_tokens
+
+    def deposit(self) -> None:
+        self._tokens = min(self.max_tokens, self._tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+
+class RatesClient:
+    """Shared keep-alive HTTP client for the exchange rates API
+
+    The underlying `httpx.AsyncClient` is created on first use and reused by
+    every tool call until `aclose` is called. Transport errors and
+    retryable status codes are retried with full-jitter exponential backoff
+    while the shared `RetryBudget` allows it.
+    """
+    def __init__(
+        self,
+        base_url: str,
+        max_connections: int = 20,
+        max_keepalive_connections: int = 10,
+        keepalive_expiry: float = 30.0,
+        connect_timeout: float = 3.0,
+        read_timeout: float = 5.0,
+        max_retries: int = 2,
+        backoff: float = 0.1,
+        retry_budget: RetryBudget | None = None
+    ):
+        self.base_url = base_url
+        self.max_connections = max_connections
+        self.max_keepalive_connections = max_keepalive_connections
+        self.keepalive_expiry = keepalive_expiry
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.retry_budget = retry_budget or RetryBudget()
+        self._client: httpx.AsyncClient | None = None
+
+    def configure(self, **options) -> None:
+        """Updates client options. Must be called before the first request."""
+        if self._client is not None:
+            raise RuntimeError('RatesClient is already in use')
+        for name, value in options.items():
+            if not hasattr(self, name):
+                raise TypeError(f'Unknown RatesClient option: {name}')
+            setattr(self, name, value)
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_keepalive_connections,
+                    keepalive_expiry=self.keepalive_expiry
+                ),
+                timeout=httpx.Timeout(
+                    self.read_timeout,
+                    connect=self.connect_timeout
+                )
+            )
+        return self._client
+
+    async def get_json(self, path: str, params: dict | None = None) -> Any:
+        """GETs `path` relative to the base URL and decodes the JSON body
+
+        Raises:
+            httpx.HTTPError: If the request still fails after retrying.
+            ValueError: If the response is not valid JSON.
+        """
+        self.retry_budget.deposit()
+        attempt = 0
+        while True:
+            try:
+                with METRICS.time('rates_api'):
+                    response = await self.client.get(path, params=params)
+                response.raise_for_status()
+                return response.json()
+            except httpx.HTTPError as e:
+                if (
+                    not self._is_retryable(e)
+                    or attempt >= self.max_retries
+                    or not self.retry_budget.withdraw()
+                ):
+                    raise
+            attempt += 1
+            await asyncio.sleep(random.uniform(0, self.backoff * 2 ** attempt))
+
+    @staticmethod
+    def _is_retryable(error: httpx.HTTPError) -> bool:
+        if isinstance(error, httpx.HTTPStatusError):
+            return error.response.status_code in RETRYABLE_STATUS_CODES
+        return isinstance(error, httpx.TransportError)
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
@@ -0,0 +1,171 @@
+import asyncio
+import contextlib
+import logging
+import sys
+from collections.abc import AsyncGenerator
+
+from a2a.server.context import ServerCallContext
+from a2a.server.events import Event, NoTaskQueue, event_consumer
+from a2a.server.request_handlers import DefaultRequestHandler
+from a2a.types import (
+    Message,
+    MessageSendParams,
+    Task,
+    TaskIdParams,
+    TaskState,
+    TaskStatusUpdateEvent,
+)
+from a2a.utils.errors import ServerError
+
+from admission import AdmissionController, Overloaded, busy_error
+
+logger = logging.getLogger(__name__)
+
+# ServerCallContext.state key: whether the client receives events as they
+# happen (message/stream) or only the result (message/send).
+STREAMING_KEY = 'streaming'
+
+
+def patch_sdk() -> None:
+    """Works around SDK bugs, some only on this Python version. Call once,
+    before serving. Written against the a2a-sdk pinned in pyproject.toml."""
+    if sys.version_info < (3, 11):
+        # EventConsumer polls its queue with asyncio.wait_for and catches the
+        # builtin TimeoutError, which asyncio only raises from 3.11 on. Before
+        # that, any agent slower than the 0.5s poll kills the consumer and
+        # message/send never returns.
+        event_consumer.TimeoutError = asyncio.TimeoutError
+    # The consumer's done callback calls exception() on the producer task,
+    # which raises once a cancelled `execute` lets the cancellation through.
+    agent_task_callback = event_consumer.EventConsumer.agent_task_callback
+
+    def skip_cancelled(consumer, agent_task: asyncio.Task) -> None:
+        if not agent_task.cancelled():
+            agent_task_callback(consumer, agent_task)
+
+    event_consumer.EventConsumer.agent_task_callback = skip_cancelled
+
+
+def is_final_event(event: Event) -> bool:
+    if isinstance(event, Message):
+        return True
+    if isinstance(event, TaskStatusUpdateEvent):
+        return event.final
+    return isinstance(event, Task) and event.status.state in (
+        TaskState.completed,
+        TaskState.canceled,
+        TaskState.failed,
+        TaskState.rejected,
+    )
+
+
+class CancellingRequestHandler(DefaultRequestHandler):
+    """DefaultRequestHandler that cancels streamed tasks whose client left
+
+    When a message/stream client disconnects, the default handler's
+    cleanup is interrupted: the task is never marked canceled in the task
+    store and its queue and producer stay registered. This one cancels the
+    task the same way tasks/cancel does, so the agent's in-flight work is
+    aborted, the canceled state is saved and the task is cleaned up.
+
+    With an `admission` controller, messages are counted from their
+    arrival and rejected before the agent starts when it is at capacity.
+
+    Marks each message's call context as streaming or not, so the agent
+    executor can leave out events a message/send client never sees.
+    """
+    def __init__(
+        self,
+        *args,
+        admission: AdmissionController | None = None,
+        **kwargs
+    ):
+        super().__init__(*args, **kwargs)
+        self.admission = admission
+        self._abandoned: set[asyncio.Task] = set()
+
+    def _arrive(self) -> None:
+        if self.admission is not None:
+            try:
+                self.admission.arrive()
+            except Overloaded as e:
+                raise ServerError(error=busy_error(e)) from e
+
+    def _depart(self) -> None:
+        if self.admission is not None:
+            self.admission.depart()
+
+    async def on_message_send(
+        self,
+        params: MessageSendParams,
+        context: ServerCallContext | None = None,
+    ) -> Task | Message:
+        context = context or ServerCallContext()
+        context.state[STREAMING_KEY] = False
+        self._arrive()
+        try:
+            return await super().on_message_send(params, context)
+        finally:
+            self._depart()
+
+    async def on_message_send_stream(
+        self,
+        params: MessageSendParams,
+        context: ServerCallContext | None = None,
+    ) -> AsyncGenerator[Event]:
+        context = context or ServerCallContext()
+        context.state[STREAMING_KEY] = True
+        self._arrive()
+        stream = super().on_message_send_stream(params, context)
+        task_id = None
+        finished = False
+        try:
+            async for event in stream:
+                if isinstance(event, Task):
+                    task_id = event.id
+                elif not isinstance(event, Message):
+                    task_id = event.taskId
+                finished = is_final_event(event)
+                yield event
+        finally:
+            self._depart()
+            if task_id and not finished:
+                # The request's own task is being torn down, so cancel from
+                # a separate one that is not interrupted by the disconnect.
+                abandoned = asyncio.create_task(
+                    self._cancel_abandoned(task_id, stream)
+                )
+                self._abandoned.add(abandoned)
+                abandoned.add_done_callback(self._abandoned.discard)
+
+    async def _cancel_abandoned(
+        self,
+        task_id: str,
+        stream: AsyncGenerator[Event]
+    ) -> None:
+        producer_task = self._running_agents.get(task_id)
+        try:
+            await self.on_cancel_task(TaskIdParams(id=task_id))
+        except ServerError as e:
+            logger.info(f'Task {task_id} was not canceled: {e.error}')
+        finally:
+            # Runs the default cleanup, unless the disconnect already
+            # interrupted it, in which case it is finished here.
+            await stream.aclose()
+            if (
+                producer_task is not None
+                and self._running_agents.get(task_id) is producer_task
+            ):
+                await asyncio.wait([producer_task])
+                queue = await self._queue_manager.get(task_id)
+                if queue is not None:
+                    # Before 3.13 closing waits for every event to be
+                    # consumed, and nobody reads this queue any more.
+                    with contextlib.suppress(asyncio.QueueEmpty):
+                        while True:
+                            await queue.dequeue_event(no_wait=True)
+                            queue.task_done()
+                with contextlib.suppress(NoTaskQueue):
+                    await self._queue_manager.close(task_id)
+                async with self._running_agents_lock:
+                    self._running_agents.pop(task_id, None)
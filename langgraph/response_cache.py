@@ -0,0 +1,215 @@
+import json
+import re
+import sys
+import time
+from collections import OrderedDict
+from collections.abc import Callable
+
+from fast_path import CURRENCY_CODES
+from metrics import METRICS, Metrics
+from rate_cache import RateCache
+
+# Currency names and symbols people use instead of ISO codes. Longer
+# names first, so "canadian dollars" is not read as "dollars".
+CURRENCY_NAMES = {
+    'australian dollars': 'AUD', 'australian dollar': 'AUD',
+    'canadian dollars': 'CAD', 'canadian dollar': 'CAD',
+    'hong kong dollars': 'HKD', 'hong kong dollar': 'HKD',
+    'new zealand dollars': 'NZD', 'new zealand dollar': 'NZD',
+    'singapore dollars': 'SGD', 'singapore dollar': 'SGD',
+    'us dollars': 'USD', 'us dollar': 'USD', 'dollars': 'USD', 'dollar': 'USD',
+    'bucks': 'USD', 'euros': 'EUR', 'euro': 'EUR', 'pounds': 'GBP',
+    'pound': 'GBP', 'sterling': 'GBP', 'rupees': 'INR', 'rupee': 'INR',
+    'yen': 'JPY', 'yuan': 'CNY', 'renminbi': 'CNY', 'swiss francs': 'CHF',
+    'swiss franc': 'CHF', 'francs': 'CHF', 'franc': 'CHF', 'pesos': 'MXN',
+    'peso': 'MXN', 'reais': 'BRL', 'rand': 'ZAR', 'zloty': 'PLN',
+    'lira': 'TRY', 'baht': 'THB',
+    '$': 'USD', '€': 'EUR', '£': 'GBP', '₹': 'INR', '¥': 'JPY',
+}
+NAME_PATTERN = re.compile(
+    '|'.join(
+        re.escape(name) if not name.isalpha() and ' ' not in name
+        else rf'\b{re.escape(name)}\b'
+        for name in sorted(CURRENCY_NAMES, key=len, reverse=True)
+    )
+)
+TOKEN_PATTERN = re.compile(r'\d{4}-\d{2}-\d{2}|\d[\d,]*(?:\.\d+)?|[a-z]+')
+DATE_PATTERN = re.compile(r'\d{4}-\d{2}-\d{2}')
+SYMBOL_AMOUNT_PATTERN = re.compile(
+    '([' + ''.join(name for name in CURRENCY_NAMES if len(name) == 1) + r'])'
+    r'\s*(\d[\d,]*(?:\.\d+)?)'
+)
+# Words that do not change what a conversion question asks.
+FILLER_WORDS = frozenset((
+    'a', 'amount', 'an', 'and', 'are', 'as', 'be', 'between', 'can', 'convert',
+    'could', 'current', 'currently', 'equal', 'equals', 'exchange', 'for',
+    'from', 'get', 'give', 'how', 'i', 'in', 'into', 'is', 'kindly', 'me',
+    'much', 'now', 'of', 'on', 'please', 'pls', 'rate', 's', 'tell', 'the',
+    'to', 'today', 'value', 'what', 'whats', 'will', 'worth', 'would', 'you',
+))
+
+
+def query_intent(query: str) -> tuple | None:
+    """A cache key shared by the phrasings of one question
+
+    Conversion questions map to ('convert', amount, from, targets, date),
+    whatever words or currency names they use. The source is the currency
+    written right after the amount or after "from". Conversions naming
+    neither, or two different ones as in "10 EUR from USD", could be read
+    either way and return None: they are never cached. Anything else maps
+    to its lower-cased words, so only the same question matches.
+    """
+    # "$10" is "10 usd": the symbol names the amount's currency.
+    text = SYMBOL_AMOUNT_PATTERN.sub(r'\2 \1', query.lower())
+    text = NAME_PATTERN.sub(
+        lambda match: f' {CURRENCY_NAMES[match.group()].lower()} ',
+        text
+    )
+    tokens = TOKEN_PATTERN.findall(text)
+    amount = None
+    amount_code = None
+    currency_date = 'latest'
+    source = None
+    after_amount = False
+    after_from = False
+    codes: list[str] = []
+    other = []
+    for token in tokens:
+        if token.upper() in CURRENCY_CODES:
+            code = token.upper()
+            if after_amount:
+                amount_code = code
+            if after_from:
+                source = code
+                after_from = False
+            if code not in codes:
+                codes.append(code)
+        elif DATE_PATTERN.fullmatch(token):
+            currency_date = token
+        elif token[0].isdigit():
+            if amount is not None:
+                # Several amounts: leave the question as it is.
+                other.append(token)
+            amount = float(token.replace(',', ''))
+        elif token not in FILLER_WORDS:
+            other.append(token)
+        after_amount = token[0].isdigit() and not DATE_PATTERN.fullmatch(token)
+        after_from = after_from or token == 'from'
+    if other or len(codes) < 2:
+        return ('text', *tokens)
+    if amount_code and source and amount_code != source:
+        return None
+    source = source or amount_code
+    if source is None:
+        return None
+    targets = tuple(code for code in codes if code != source)
+    return ('convert', amount, source, targets, currency_date)
+
+
+def is_historical(intent: tuple) -> bool:
+    """Whether the intent quotes only rates of a closed day"""
+    return intent[0] == 'convert' and RateCache.is_historical(intent[-1])
+
+
+class ResponseCache:
+    """Final answers to first-turn questions, by intent
+
+    An answer is kept only as long as the rates it quotes: `freshness`
+    returns the expiry (time.monotonic) of the latest rate table, or None
+    if none is cached. Answers are stamped with that expiry and dropped
+    once it passes or the table is replaced, so they never outlive it.
+    Answers for past dates never change and stay until LRU eviction.
+    """
+    def __init__(
+        self,
+        freshness: Callable[[], float | None],
+        max_entries: int = 4096,
+        metrics: Metrics = METRICS
+    ):
+        self.freshness = freshness
+        self.max_entries = max_entries
+        # intent -> (rates expiry or None, answer, size in bytes)
+        self._entries: OrderedDict[tuple, tuple[float | None, dict, int]] = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        metrics.gauge('response_cache_entries', lambda: len(self._entries),
+                      'Answers in the response cache.')
+        metrics.gauge('response_cache_bytes', lambda: self.bytes,
+                      'Approximate memory used by the response cache.')
+        metrics.gauge('response_cache_hit_ratio', lambda: self.hit_ratio,
+                      'Share of first-turn questions answered from the cache.')
+
+    @property
+    def hit_ratio(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def window(self, query: str) -> tuple[tuple, float | None] | None:
+        """The query's intent and the expiry of the rates it would quote,
+        None if its answer must not be cached"""
+        intent = query_intent(query)
+        if intent is None:
+            return None
+        return intent, None if is_historical(intent) else self.freshness()
+
+    def get(self, query: str) -> dict | None:
+        window = self.window(query)
+        if window is None:
+            return None
+        intent, expires_at = window
+        entry = self._entries.get(intent)
+        if entry is not None:
+            stamped, answer, _ = entry
+            if stamped is None or (stamped == expires_at and stamped > time.monotonic()):
+                self._entries.move_to_end(intent)
+                self.hits += 1
+                return answer
+            self.expired += 1
+            self._remove(intent)
+        self.misses += 1
+        return None
+
+    def put(self, intent: tuple, expires_at: float | None, answer: dict) -> None:
+        """Keeps `answer`, computed after `window` returned these values
+
+        Dropped if the latest rate table was replaced meanwhile, since the
+        answer may quote either one. An answer computed while no table was
+        cached is stamped with the one fetched for it.
+        """
+        if self.max_entries <= 0:
+            return
+        if not is_historical(intent):
+            current = self.freshness()
+            if current is None or (expires_at is not None and current != expires_at):
+                return
+            expires_at = current
+        size = (
+            sys.getsizeof(intent) + sum(sys.getsizeof(part) for part in intent)
+            + len(answer['content'].encode())
+            + len(json.dumps(answer.get('data') or {}))
+        )
+        if intent in self._entries:
+            self._remove(intent)
+        self._entries[intent] = (expires_at, answer, size)
+        self.bytes += size
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _remove(self, intent: tuple) -> None:
+        _, _, size = self._entries.pop(intent)
+        self.bytes -= size
+
+    def stats(self) -> dict:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'expired': self.expired,
+            'evictions': self.evictions,
+            'size': len(self._entries),
+            'bytes': self.bytes,
+            'hit_ratio': self.hit_ratio,
+        }
@@ -1,74 +1,420 @@
 import os
 import sys
+import json
+import contextlib
 import httpx
 import click
 import uvicorn
 from rich import print
+from starlette.middleware import Middleware
+from starlette.routing import Route
 
-from a2a.server.apps import A2AStarletteApplication
-from a2a.server.request_handlers import DefaultRequestHandler
 from a2a.server.tasks import InMemoryPushNotifier, InMemoryTaskStore
 from a2a.types import (
     AgentCard,
     AgentSkill,
     AgentCapabilities
 )
-from agent import SUPPORTED_CONTENT_TYPES
-from agent_executor import CurrencyAgentExecutor
+from admission import AdmissionController
+from agent_spec import AGENT_MODES, SUPPORTED_CONTENT_TYPES
+from checkpointer import BoundedCheckpointSaver
+from common.agent_card import CachedCardA2AApplication
+from common.profiling import ProfilingMiddleware, RequestProfiler
+from lifecycle import CHECKPOINTS_SNAPSHOT, Lifecycle, listen_socket
+from metrics import InstrumentedA2AApplication, TimedQueueManager, metrics_endpoint
+from push_delivery import QueuedPushNotifier
+from request_handler import CancellingRequestHandler, patch_sdk
+from startup import AgentLoader, LazyAgentExecutor
+from task_store import SQLiteTaskStore
 
-@click.command()
-@click.option('--host', 'host', default='0.0.0.0')
-@click.option('--port', 'port', default=9999)
-def main(host, port):
-    """Start the Currency Agent server"""
-    try:
-        # Step 1: Capabilities
-        capabilities = AgentCapabilities(streaming=True, pushNotifications=True)
-        
-        # Step 2: Agent Skills
-        skill = AgentSkill(
-            id='convert currency',
-            name='Currency exchange rate tool',
-            description='Helps with exchange values between various currencies',
-            tags=['currency conversion', 'currency exchange'],
-            examples=['What is the exchange rate between USD and GBP?']
+# Worker processes receive the command line options through the environment.
+OPTIONS_ENV = 'CURRENCY_AGENT_OPTIONS'
+
+
+class CurrencyAgentApplication(CachedCardA2AApplication, InstrumentedA2AApplication):
+    """Pre-serialized cards and per-stage latency metrics"""
+
+
+def build_agent_executor(options: dict, checkpointer, admission):
+    """Imports the agent and builds its executor: the slow part of startup"""
+    from agent import RATE_CACHE, RATE_TABLE, RATES_CLIENT, load_model
+    from agent_executor import CurrencyAgentExecutor
+    from compaction import HistoryCompactor
+    from response_cache import ResponseCache
+
+    # Exchange rates API
+    RATE_CACHE.latest_ttl = options['rates_ttl']
+    RATE_CACHE.max_entries = options['rates_cache_size']
+    RATES_CLIENT.configure(
+        base_url=options['rates_api'],
+        max_connections=options['rates_max_connections'],
+        max_keepalive_connections=options['rates_max_keepalive'],
+        connect_timeout=options['rates_connect_timeout'],
+        read_timeout=options['rates_read_timeout'],
+        max_retries=options['rates_max_retries']
+    )
+    compactor = None
+    if options['history_max_tokens'] or options['history_max_messages']:
+        compactor = HistoryCompactor(
+            max_tokens=options['history_max_tokens'],
+            max_messages=options['history_max_messages']
+        )
+    response_cache = None
+    if options['response_cache_size']:
+        response_cache = ResponseCache(
+            RATE_TABLE.latest_expiry,
+            max_entries=options['response_cache_size']
         )
-        
-        # Step 3: Agent Card
-        agent_card = AgentCard(
-            name='Currency agent',
-            description='Helps with exchange rate for currencies',
-            url=f'http://{host}:{port}/',
-            version='1.0.0',
-            defaultInputModes=SUPPORTED_CONTENT_TYPES,
-            defaultOutputModes=SUPPORTED_CONTENT_TYPES,
-            capabilities=capabilities,
-            skills=[skill],
+    return CurrencyAgentExecutor(
+        checkpointer,
+        load_model(options['model']),
+        stream_tokens=options['stream_tokens'],
+        agent_mode=options['agent_mode'],
+        admission=admission,
+        compactor=compactor,
+        response_cache=response_cache,
+        working_interval=options['working_interval'],
+        send_progress=options['send_progress']
+    )
+
+
+async def warm_up_agent(executor) -> None:
+    from agent import RATE_TABLE
+
+    await executor.warm_up()
+    RATE_TABLE.start()
+
+
+async def close_agent() -> None:
+    # Not imported if the server stopped before the agent was loaded.
+    agent = sys.modules.get('agent')
+    if agent is not None:
+        await agent.RATE_TABLE.aclose()
+        await agent.RATES_CLIENT.aclose()
+
+
+def create_app(options: dict | None = None):
+    """Builds the Currency Agent app. Runs once per worker process."""
+    if options is None:
+        options = json.loads(os.environ[OPTIONS_ENV])
+    patch_sdk()
+    host = options['host']
+    port = options['port']
+
+    # Step 0: Conversation checkpoints and the agent
+    checkpoint_db = options['checkpoint_db']
+    if checkpoint_db is None and options['state_dir']:
+        # Conversations are flushed there on shutdown and read back as
+        # they are resumed.
+        os.makedirs(options['state_dir'], exist_ok=True)
+        checkpoint_db = os.path.join(options['state_dir'], CHECKPOINTS_SNAPSHOT)
+    checkpointer = BoundedCheckpointSaver(
+        # Workers share conversations through the database only.
+        max_threads=(
+            options['checkpoint_max_threads'] if options['workers'] == 1 else 0
+        ),
+        max_bytes=options['checkpoint_max_mb'] * 1024 * 1024,
+        ttl=options['checkpoint_ttl'],
+        keep_last=options['checkpoint_keep'],
+        path=checkpoint_db
+    )
+    admission = AdmissionController(
+        max_running=options['max_running'],
+        max_queued=options['max_queued'],
+        timeout=options['queue_timeout']
+    )
+    loader = AgentLoader(
+        lambda: build_agent_executor(options, checkpointer, admission),
+        warm_up_agent,
+        close_agent
+    )
+    if options['startup'] == 'eager':
+        agent_executor = loader.build_now()
+    else:
+        # Serve the card and health checks while the agent loads.
+        agent_executor = LazyAgentExecutor(loader)
+
+    # Step 1: Capabilities
+    capabilities = AgentCapabilities(streaming=True, pushNotifications=True)
+
+    # Step 2: Agent Skills
+    skill = AgentSkill(
+        id='convert currency',
+        name='Currency exchange rate tool',
+        description='Helps with exchange values between various currencies',
+        tags=['currency conversion', 'currency exchange'],
+        examples=['What is the exchange rate between USD and GBP?']
+    )
+    batch_skill = AgentSkill(
+        id='batch convert currency',
+        name='Batch currency conversion',
+        description='Converts several amounts into several currencies, on one '
+                    'or more dates, in a single request. The conversions are '
+                    'also returned as a structured data part',
+        tags=['currency conversion', 'batch conversion'],
+        examples=['Convert 100 USD to EUR, GBP, JPY and INR'],
+        outputModes=['text', 'text/plain', 'application/json']
+    )
+    history_skill = AgentSkill(
+        id='rate history',
+        name='Exchange rate history',
+        description='Summarises how exchange rates moved over a period: '
+                    'lowest, highest and average rate and the percent change',
+        tags=['exchange rate history', 'currency trends'],
+        examples=[
+            'How did EUR/INR move over the last 90 days?',
+            'What was the average USD/JPY rate in Q1 2024?'
+        ]
+    )
+
+    # Step 3: Agent Card
+    agent_card = AgentCard(
+        name='Currency agent',
+        description='Helps with exchange rate for currencies',
+        url=f'http://{host}:{port}/',
+        version='1.0.0',
+        defaultInputModes=SUPPORTED_CONTENT_TYPES,
+        defaultOutputModes=SUPPORTED_CONTENT_TYPES,
+        capabilities=capabilities,
+        skills=[skill, batch_skill, history_skill],
+    )
+
+    # Step 4: Client
+    httpx_client = httpx.AsyncClient(timeout=options['push_timeout'])
+    if options['push_workers']:
+        push_notifier = QueuedPushNotifier(
+            httpx_client,
+            workers=options['push_workers'],
+            max_pending=options['push_max_pending'],
+            per_endpoint=options['push_per_endpoint'],
+            max_attempts=options['push_max_attempts']
         )
-        
-        # Step 4: Client
-        httpx_client = httpx.AsyncClient()
-        
-        # Step 5: Request handler
-        request_handler = DefaultRequestHandler(
-            agent_executor=CurrencyAgentExecutor(),
-            task_store=InMemoryTaskStore(),
-            push_notifier=InMemoryPushNotifier(httpx_client)
+    else:
+        # Delivered inline, before the stream moves on to the next event.
+        push_notifier = InMemoryPushNotifier(httpx_client)
+
+    # Step 5: Request handler
+    if options['task_store'] == 'sqlite':
+        task_store = SQLiteTaskStore(
+            options['task_store_db'],
+            retention=options['task_retention']
         )
-        
-        # Step 6:Server
-        server = A2AStarletteApplication(
-            agent_card=agent_card,
-            http_handler=request_handler
+    else:
+        task_store = InMemoryTaskStore()
+    request_handler = CancellingRequestHandler(
+        agent_executor=agent_executor,
+        task_store=task_store,
+        queue_manager=TimedQueueManager(),
+        push_notifier=push_notifier,
+        admission=admission
+    )
+    lifecycle = Lifecycle(
+        loader,
+        task_store,
+        state_dir=options['state_dir'],
+        drain_timeout=options['drain_timeout'],
+        listen_fd=options.get('listen_fd'),
+        handoff_fd=options.get('handoff_fd')
+    )
+
+    # Step 6:Server
+    server = CurrencyAgentApplication(
+        agent_card=agent_card,
+        http_handler=request_handler,
+        card_max_age=options['card_max_age']
+    )
+
+    @contextlib.asynccontextmanager
+    async def lifespan(app):
+        lifecycle.install()
+        if isinstance(task_store, SQLiteTaskStore):
+            task_store.start()
+        if isinstance(push_notifier, QueuedPushNotifier):
+            push_notifier.start()
+        if options['startup'] == 'eager':
+            await loader.load()
+        else:
+            loader.start()
+        # After a handoff, waits for the previous process to save its state.
+        await lifecycle.restore()
+        yield
+        await lifecycle.drain()
+        await loader.aclose()
+        if isinstance(push_notifier, QueuedPushNotifier):
+            await push_notifier.aclose()
+        await httpx_client.aclose()
+        checkpointer.close()
+        if isinstance(task_store, SQLiteTaskStore):
+            await task_store.aclose()
+        # Last: a successor starts serving once this returns.
+        lifecycle.snapshot()
+
+    routes = [
+        # Per-stage latency histograms and task counters of this process
+        Route('/metrics', metrics_endpoint, methods=['GET']),
+        Route('/health', loader.health, methods=['GET']),
+        Route('/ready', loader.ready, methods=['GET']),
+    ]
+    middleware = []
+    if options['profile_rate'] or options['profile_header']:
+        # Sampled per-request CPU profiles of this process
+        profiler = RequestProfiler(
+            rate=options['profile_rate'],
+            header=options['profile_header'],
+            directory=options['profile_dir'],
+            interval=options['profile_interval']
         )
+        routes.append(Route('/profile', profiler.endpoint, methods=['GET', 'DELETE']))
+        middleware.append(Middleware(ProfilingMiddleware, profiler=profiler))
+    return server.build(routes=routes, middleware=middleware, lifespan=lifespan)
 
+
+@click.command()
+@click.option('--host', 'host', default='0.0.0.0')
+@click.option('--port', 'port', default=9999)
+@click.option('--workers', 'workers', default=1,
+              help='Server processes sharing the port. More than one requires '
+                   '--task-store sqlite and --checkpoint-db; streams, resubscribe '
+                   'and cancel are served by the worker that runs the task')
+@click.option('--startup', 'startup', default='eager',
+              type=click.Choice(['eager', 'lazy']),
+              help='eager: load and warm up the agent before binding; lazy: bind '
+                   'first and serve the card, /health and /ready (503 until warm) '
+                   'while the agent loads in the background')
+@click.option('--model', 'model', default='gemini-2.0-flash',
+              help='Gemini model name, or "fake[:<latency seconds>]" for the '
+                   'benchmark stub model')
+@click.option('--agent-mode', 'agent_mode', default='structured',
+              type=click.Choice(AGENT_MODES),
+              help='structured: extra model call formats the answer; '
+                   'single-pass: the model answers through a respond tool')
+@click.option('--stream-tokens', 'stream_tokens', is_flag=True, default=False,
+              help='Stream answer tokens over message/stream as artifact chunks')
+@click.option('--working-interval', 'working_interval', default=0.0,
+              help='Minimum seconds between working updates over message/stream; '
+                   'updates in between are coalesced')
+@click.option('--send-progress', 'send_progress', is_flag=True, default=False,
+              help='Keep working updates in the task history of message/send')
+@click.option('--response-cache-size', 'response_cache_size', default=0,
+              help='First-turn answers kept for repeated questions, until the '
+                   'rates they quote expire; 0 (the default) disables the cache')
+@click.option('--history-max-tokens', 'history_max_tokens', default=0,
+              help='Approximate tokens of conversation history before older '
+                   'turns are replaced by a summary in the stored checkpoint; '
+                   '0 (the default) for no token limit')
+@click.option('--history-max-messages', 'history_max_messages', default=0,
+              help='Messages of conversation history before older turns are '
+                   'replaced by a summary in the stored checkpoint; 0 (the '
+                   'default) for no message limit. Compaction is off unless '
+                   'one of the limits is set')
+@click.option('--card-max-age', 'card_max_age', default=300,
+              help='Seconds clients may cache the agent card before revalidating')
+@click.option('--max-running', 'max_running', default=32,
+              help='Requests calling the model at once, per worker')
+@click.option('--max-queued', 'max_queued', default=128,
+              help='Requests waiting for their turn before new ones are '
+                   'rejected, per worker')
+@click.option('--queue-timeout', 'queue_timeout', default=30.0,
+              help='Seconds a request may wait for its turn before it is rejected')
+@click.option('--push-workers', 'push_workers', default=4,
+              help='Tasks delivering push notifications; 0 delivers them inline '
+                   'with the stream that produced them')
+@click.option('--push-per-endpoint', 'push_per_endpoint', default=2,
+              help='Push notifications in flight to one webhook URL')
+@click.option('--push-max-pending', 'push_max_pending', default=1000,
+              help='Tasks with an undelivered push notification before new '
+                   'ones are dropped')
+@click.option('--push-max-attempts', 'push_max_attempts', default=4,
+              help='Attempts per push notification before it is dropped')
+@click.option('--push-timeout', 'push_timeout', default=5.0,
+              help='Timeout in seconds of one push notification request')
+@click.option('--rates-api', 'rates_api', default='https://api.frankfurter.app/',
+              help='Base URL of the exchange rates API')
+@click.option('--rates-ttl', 'rates_ttl', default=300.0,
+              help='Seconds before the "latest" rate table is refreshed')
+@click.option('--rates-cache-size', 'rates_cache_size', default=1024,
+              help='Maximum number of daily rate tables kept in memory')
+@click.option('--rates-max-connections', 'rates_max_connections', default=20,
+              help='Connection pool size for the exchange rates API')
+@click.option('--rates-max-keepalive', 'rates_max_keepalive', default=10,
+              help='Idle keep-alive connections kept for the exchange rates API')
+@click.option('--rates-connect-timeout', 'rates_connect_timeout', default=3.0,
+              help='Connect timeout in seconds for the exchange rates API')
+@click.option('--rates-read-timeout', 'rates_read_timeout', default=5.0,
+              help='Read timeout in seconds for the exchange rates API')
+@click.option('--rates-max-retries', 'rates_max_retries', default=2,
+              help='Retries per exchange rates API request')
+@click.option('--checkpoint-db', 'checkpoint_db', default=None,
+              help='SQLite file for evicted and persisted conversations')
+@click.option('--checkpoint-max-threads', 'checkpoint_max_threads', default=10_000,
+              help='Conversations kept in memory')
+@click.option('--checkpoint-max-mb', 'checkpoint_max_mb', default=256,
+              help='Memory budget in MB for in-memory conversations')
+@click.option('--checkpoint-ttl', 'checkpoint_ttl', default=None, type=float,
+              help='Idle seconds before a conversation is moved out of memory')
+@click.option('--checkpoint-keep', 'checkpoint_keep', default=1,
+              help='Checkpoints kept per conversation')
+@click.option('--task-store', 'task_store', default='memory',
+              type=click.Choice(['memory', 'sqlite']),
+              help='Where tasks are kept')
+@click.option('--task-store-db', 'task_store_db', default='tasks.db',
+              help='SQLite file for --task-store sqlite')
+@click.option('--task-retention', 'task_retention', default=24 * 60 * 60.0,
+              help='Seconds finished tasks are kept by --task-store sqlite')
+@click.option('--profile-rate', 'profile_rate', default=0.0,
+              help='Share of requests profiled, served on /profile')
+@click.option('--profile-header', 'profile_header', is_flag=True, default=False,
+              help='Profile requests sent with "X-Profile: 1"')
+@click.option('--profile-dir', 'profile_dir', default=None,
+              help='Directory for the collapsed stacks of each profiled request')
+@click.option('--profile-interval', 'profile_interval', default=0.001,
+              help='CPU seconds between stack samples of profiled requests')
+@click.option('--state-dir', 'state_dir', default=None,
+              help='Directory where in-memory tasks and conversations are saved '
+                   'on shutdown and restored from on startup')
+@click.option('--drain-timeout', 'drain_timeout', default=30.0,
+              help='Seconds in-flight requests get to finish on SIGTERM before '
+                   'they are cancelled')
+@click.option('--listen-fd', 'listen_fd', default=None, type=int, hidden=True,
+              help='Listening socket inherited from the previous process (SIGHUP)')
+@click.option('--handoff-fd', 'handoff_fd', default=None, type=int, hidden=True,
+              help='Pipe closed by the previous process once its state is saved')
+def main(**options):
+    """Start the Currency Agent server"""
+    if options['workers'] > 1 and (
+        options['task_store'] != 'sqlite' or not options['checkpoint_db']
+    ):
+        raise click.UsageError(
+            '--workers > 1 requires --task-store sqlite and --checkpoint-db'
+        )
+    try:
         # Step 7: Run the server
-        uvicorn.run(server.build(), host=host, port=port)
+        if options['workers'] == 1:
+            # Bound here, so SIGHUP can hand it to a successor process.
+            sock = listen_socket(options['host'], options['port'], options['listen_fd'])
+            options['listen_fd'] = sock.fileno()
+            config = uvicorn.Config(
+                create_app(options),
+                host=options['host'],
+                port=options['port'],
+                timeout_graceful_shutdown=options['drain_timeout']
+            )
+            uvicorn.Server(config).run(sockets=[sock])
+        else:
+            os.environ[OPTIONS_ENV] = json.dumps(options)
+            uvicorn.run(
+                'server:create_app',
+                host=options['host'],
+                port=options['port'],
+                workers=options['workers'],
+                factory=True,
+                app_dir=os.path.dirname(os.path.abspath(__file__)),
+                timeout_graceful_shutdown=options['drain_timeout']
+            )
 
     except Exception as e:
         print("Error occured:")
         print(e)
-        
+
 if __name__ == "__main__":
     main()
-
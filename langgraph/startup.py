@@ -0,0 +1,115 @@
+import asyncio
+import logging
+import os
+import time
+from collections.abc import Awaitable, Callable
+
+from a2a.server.agent_execution import AgentExecutor, RequestContext
+from a2a.server.events import EventQueue
+from a2a.types import InternalError
+from a2a.utils.errors import ServerError
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+
+logger = logging.getLogger(__name__)
+
+
+class AgentLoader:
+    """Builds the agent executor and warms it up before reporting ready
+
+    `build` is blocking (imports and graph construction) and runs in a
+    worker thread when loaded in the background, so the server keeps
+    answering card and health requests meanwhile. `warm_up` then primes
+    the executor on the event loop. The state goes from starting through
+    warming to ready, or failed.
+    """
+    def __init__(
+        self,
+        build: Callable[[], AgentExecutor],
+        warm_up: Callable[[AgentExecutor], Awaitable[None]],
+        close: Callable[[], Awaitable[None]]
+    ):
+        self._build = build
+        self._warm_up = warm_up
+        self._close = close
+        self.state = 'starting'
+        # Set when the server shuts down, so it is taken out of rotation.
+        self.draining = False
+        self.executor: AgentExecutor | None = None
+        self.error: str | None = None
+        self.timings: dict[str, float] = {}
+        self._started = time.perf_counter()
+        self._loaded: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+
+    def build_now(self) -> AgentExecutor:
+        started = time.perf_counter()
+        self.executor = self._build()
+        self.timings['build'] = round(time.perf_counter() - started, 3)
+        return self.executor
+
+    def start(self) -> None:
+        """Loads in the background; `wait` blocks until it is done"""
+        self._loaded = asyncio.Event()
+        self._task = asyncio.create_task(self.load())
+
+    async def load(self) -> None:
+        try:
+            if self.executor is None:
+                await asyncio.to_thread(self.build_now)
+            self.state = 'warming'
+            started = time.perf_counter()
+            await self._warm_up(self.executor)
+            self.timings['warm_up'] = round(time.perf_counter() - started, 3)
+            self.state = 'ready'
+            self.timings['ready'] = round(time.perf_counter() - self._started, 3)
+            logger.info(f'Agent ready: {self.timings}')
+        except Exception as e:
+            self.state = 'failed'
+            self.error = f'{type(e).__name__}: {e}'
+            logger.exception('Loading the agent failed')
+        finally:
+            if self._loaded is not None:
+                self._loaded.set()
+
+    async def wait(self) -> AgentExecutor:
+        if self.state != 'ready' and self._loaded is not None:
+            await self._loaded.wait()
+        if self.state != 'ready':
+            raise ServerError(error=InternalError(message='Agent failed to load'))
+        return self.executor
+
+    async def aclose(self) -> None:
+        if self._task is not None and not self._task.done():
+            # A build running in its thread finishes on its own.
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        await self._close()
+
+    async def health(self, request: Request) -> JSONResponse:
+        """Liveness: the process serves requests. Its pid tells which
+        process answered across a socket handoff."""
+        return JSONResponse({'status': 'ok', 'pid': os.getpid()})
+
+    async def ready(self, request: Request) -> JSONResponse:
+        """Readiness: the agent is built and warmed up, and the server
+        is not shutting down"""
+        status = 'draining' if self.draining else self.state
+        body = {'status': status, 'timings': self.timings}
+        if self.error:
+            body['error'] = self.error
+        return JSONResponse(body, status_code=200 if status == 'ready' else 503)
+
+
+class LazyAgentExecutor(AgentExecutor):
+    """Hands requests to the loader's executor once it is ready"""
+    def __init__(self, loader: AgentLoader):
+        self.loader = loader
+
+    async def execute(self, context: RequestContext, event_queue: EventQueue) -> None:
+        executor = await self.loader.wait()
+        await executor.execute(context, event_queue)
+
+    async def cancel(self, context: RequestContext, event_queue: EventQueue) -> None:
+        executor = await self.loader.wait()
+        await executor.cancel(context, event_queue)
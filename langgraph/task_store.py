@@ -0,0 +1,187 @@
+import asyncio
+import contextlib
+import logging
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from a2a.server.tasks import TaskStore
+from a2a.types import Task, TaskState
+
+logger = logging.getLogger(__name__)
+
+RETAINED_STATES = (
+    TaskState.completed,
+    TaskState.canceled,
+    TaskState.failed,
+    TaskState.rejected,
+    TaskState.input_required,
+)
+# Rows one compaction step deletes; saves are written between steps.
+COMPACTION_BATCH = 1000
+
+
+class SQLiteTaskStore(TaskStore):
+    """TaskStore backed by a local SQLite database
+
+    Saves made during one event-loop tick are written in a single
+    transaction. Tasks in a completed, canceled, failed, rejected or
+    input-required state are deleted once they have not been updated for
+    `retention` seconds by a background compaction started with `start`.
+
+    The connection is used by one I/O thread only: writes, reads and
+    compaction steps queue there in order, and the event loop never waits
+    on SQLite.
+    """
+    def __init__(
+        self,
+        path: str,
+        retention: float | None = 24 * 60 * 60,
+        compaction_interval: float = 60.0
+    ):
+        self.path = path
+        self.retention = retention
+        self.compaction_interval = compaction_interval
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS tasks ('
+            'id TEXT PRIMARY KEY, context_id TEXT NOT NULL, '
+            'state TEXT NOT NULL, updated_at REAL NOT NULL, data TEXT NOT NULL)'
+        )
+        self._db.execute(
+            'CREATE INDEX IF NOT EXISTS tasks_context_id ON tasks (context_id)'
+        )
+        self._db.execute(
+            'CREATE INDEX IF NOT EXISTS tasks_state_updated_at '
+            'ON tasks (state, updated_at)'
+        )
+        self._db.commit()
+        self._io = ThreadPoolExecutor(max_workers=1, thread_name_prefix='task-store')
+        self._pending: dict[str, Task] = {}
+        self._batch: asyncio.Task | None = None
+        self._compactor: asyncio.Task | None = None
+
+    async def _in_io_thread(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._io, function, *args)
+
+    async def save(self, task: Task) -> None:
+        self._pending[task.id] = task
+        if self._batch is None:
+            # Runs on the next tick, with every save made during this one.
+            self._batch = asyncio.ensure_future(self._flush())
+        await asyncio.shield(self._batch)
+
+    async def _flush(self) -> None:
+        self._batch = None
+        pending, self._pending = self._pending, {}
+        now = time.time()
+        # Serialized here: the SDK keeps updating the task objects.
+        rows = [
+            (
+                task.id,
+                task.contextId,
+                task.status.state.value,
+                now,
+                task.model_dump_json(exclude_none=True)
+            )
+            for task in pending.values()
+        ]
+        await self._in_io_thread(self._write, rows)
+
+    def _write(self, rows: list[tuple]) -> None:
+        with self._db:
+            self._db.executemany(
+                'INSERT OR REPLACE INTO tasks '
+                '(id, context_id, state, updated_at, data) '
+                'VALUES (?, ?, ?, ?, ?)',
+                rows
+            )
+
+    async def get(self, task_id: str) -> Task | None:
+        task = self._pending.get(task_id)
+        if task is not None:
+            return task
+        # Queued behind the writes of earlier saves, so it sees them.
+        return await self._in_io_thread(self._get, task_id)
+
+    def _get(self, task_id: str) -> Task | None:
+        row = self._db.execute(
+            'SELECT data FROM tasks WHERE id = ?', (task_id,)
+        ).fetchone()
+        return Task.model_validate_json(row[0]) if row else None
+
+    async def get_by_context(self, context_id: str) -> list[Task]:
+        return await self._in_io_thread(self._get_by_context, context_id)
+
+    def _get_by_context(self, context_id: str) -> list[Task]:
+        rows = self._db.execute(
+            'SELECT data FROM tasks WHERE context_id = ? ORDER BY updated_at',
+            (context_id,)
+        ).fetchall()
+        return [Task.model_validate_json(row[0]) for row in rows]
+
+    async def delete(self, task_id: str) -> None:
+        self._pending.pop(task_id, None)
+        await self._in_io_thread(self._delete, task_id)
+
+    def _delete(self, task_id: str) -> None:
+        with self._db:
+            self._db.execute('DELETE FROM tasks WHERE id = ?', (task_id,))
+
+    async def compact(self) -> int:
+        """Deletes expired tasks and truncates the write-ahead log
+
+        Runs on the I/O thread in steps of `COMPACTION_BATCH` rows, so
+        saves made meanwhile wait for one step, not the whole compaction.
+        """
+        if self.retention is None:
+            return 0
+        expired_before = time.time() - self.retention
+        deleted = 0
+        for state in RETAINED_STATES:
+            while True:
+                count = await self._in_io_thread(
+                    self._delete_expired, state.value, expired_before
+                )
+                deleted += count
+                if count < COMPACTION_BATCH:
+                    break
+        await self._in_io_thread(self._db.execute, 'PRAGMA wal_checkpoint(TRUNCATE)')
+        return deleted
+
+    def _delete_expired(self, state: str, expired_before: float) -> int:
+        with self._db:
+            return self._db.execute(
+                'DELETE FROM tasks WHERE id IN ('
+                'SELECT id FROM tasks WHERE state = ? AND updated_at < ? LIMIT ?)',
+                (state, expired_before, COMPACTION_BATCH)
+            ).rowcount
+
+    def start(self) -> None:
+        if self._compactor is None:
+            self._compactor = asyncio.create_task(self._compact_periodically())
+
+    async def _compact_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.compaction_interval)
+            try:
+                deleted = await self.compact()
+                if deleted:
+                    logger.info(f'Compaction removed {deleted} expired tasks')
+            except sqlite3.Error as e:
+                logger.warning(f'Task store compaction failed: {e}')
+
+    async def aclose(self) -> None:
+        if self._compactor is not None:
+            self._compactor.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._compactor
+            self._compactor = None
+        if self._batch is not None:
+            await asyncio.shield(self._batch)
+        if self._pending:
+            await self._flush()
+        self._io.shutdown()
+        self._db.close()
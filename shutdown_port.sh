@@ -1,3 +1,28 @@
-ps -ef | grep server.py | awk '{print $3}' | xargs kill -9 
-# uv run langgraph/server.py
-# uv run langgraph/client.py
\ No newline at end of file
+#!/bin/sh
+# Stops the agent servers gracefully. SIGTERM lets them finish in-flight
+# requests (--drain-timeout) and save conversations and tasks (--state-dir);
+# anything still running after DEADLINE seconds is killed.
+#   ./shutdown_port.sh          stop every server.py
+#   ./shutdown_port.sh restart  SIGHUP: the currency agent hands its socket
+#                               to a new process, dropping no connections
+DEADLINE=${DEADLINE:-40}
+if [ "$1" = "restart" ]; then
+    # Python processes only: `uv run` wrappers would die of SIGHUP.
+    PIDS=$(pgrep -f "^[^ ]*python[^ ]* [^ ]*${PATTERN:-langgraph/server\.py}")
+    [ -n "$PIDS" ] && kill -HUP $PIDS
+    exit 0
+fi
+PIDS=$(pgrep -f "^[^ ]*python[^ ]* [^ ]*${PATTERN:-server\.py}")
+[ -z "$PIDS" ] && exit 0
+kill -TERM $PIDS
+for _ in $(seq "$DEADLINE"); do
+    ALIVE=""
+    for PID in $PIDS; do
+        kill -0 "$PID" 2>/dev/null && ALIVE="$ALIVE $PID"
+    done
+    [ -z "$ALIVE" ] && exit 0
+    sleep 1
+done
+kill -9 $ALIVE
+# uv run langgraph/server.py --state-dir state
+# uv run langgraph/client.py